@@ -0,0 +1,503 @@
+"""
+A minimal asyncio IRC server for exercising clients end-to-end without a
+network.
+
+It speaks enough of the protocol for a client to register and join
+channels: CAP negotiation, 005, JOIN/NAMES, PRIVMSG, WHO/WHOX, BATCH,
+labeled-response and CHATHISTORY. Traffic is generated on demand from a `Connection`::
+
+    >>> server = Server(names_members=50000)
+    >>> await server.start()
+    >>> await client.connect('127.0.0.1', server.port)
+    >>> await server.connections[0].flood('#load', 100000)
+"""
+
+import asyncio
+import itertools
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+from irctk.message import Message, MessageTag
+
+SERVER_NAME = 'irc.example.com'
+
+CAPABILITIES = [
+    'batch',
+    'labeled-response',
+    'message-tags',
+    'multi-prefix',
+    'server-time',
+]
+
+ISUPPORT = [
+    'CASEMAPPING=ascii',
+    'CHANLIMIT=#:250',
+    'CHANMODES=beI,k,l,imnst',
+    'CHANTYPES=#',
+    'NETWORK=Example',
+    'NICKLEN=30',
+    'PREFIX=(ov)@+',
+    'WHOX',
+]
+
+
+class Channel:
+    def __init__(self, name: str, generated_members: int = 0):
+        self.name = name
+        self.connections: Set['Connection'] = set()
+
+        # Members which only exist in NAMES and generated traffic
+        self.generated_members = generated_members
+
+    def generated_nick(self, index: int) -> str:
+        return 'user{}'.format(index)
+
+    def generated_prefix(self, index: int) -> str:
+        nick = self.generated_nick(index)
+        return '{}!{}@users.example.com'.format(nick, nick)
+
+
+class Connection:
+    """
+    A client connected to the server.
+    """
+
+    def __init__(
+        self,
+        server: 'Server',
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ):
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+
+        self.nick = '*'
+        self.user: Optional[str] = None
+        self.caps: Set[str] = set()
+        self.is_negotiating = False
+        self.is_registered = False
+        self.references = itertools.count(1)
+
+        # Number of lines written to the client
+        self.lines_sent = 0
+
+    @property
+    def prefix(self) -> str:
+        return '{}!{}@localhost'.format(self.nick, self.user or self.nick)
+
+    def write_lines(self, lines: List[str]) -> None:
+        self.lines_sent += len(lines)
+        self.writer.write(''.join(line + '\r\n' for line in lines).encode('utf-8'))
+
+    def write(self, *messages: Message) -> None:
+        self.write_lines([str(message) for message in messages])
+
+    def numeric(self, numeric: str, *parameters: str) -> Message:
+        return Message(
+            prefix=SERVER_NAME,
+            command=numeric,
+            parameters=[self.nick] + list(parameters),
+        )
+
+    def tags(self, **tags: str) -> List[MessageTag]:
+        if 'server-time' in self.caps:
+            tags['time'] = time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime())
+
+        if 'message-tags' not in self.caps:
+            tags.pop('msgid', None)
+
+        return [MessageTag(name=name, value=value) for name, value in tags.items()]
+
+    def reference(self) -> str:
+        return 'ref{}'.format(next(self.references))
+
+    def batch(
+        self,
+        batch_type: str,
+        messages: Iterable[Message],
+        parameters: Optional[List[str]] = None,
+        label: Optional[str] = None,
+    ) -> List[Message]:
+        """
+        Wraps the messages in a batch, when the client supports batches.
+        """
+
+        if 'batch' not in self.caps:
+            return list(messages)
+
+        reference = self.reference()
+        start = Message(
+            prefix=SERVER_NAME,
+            command='BATCH',
+            parameters=['+' + reference, batch_type] + (parameters or []),
+        )
+        if label:
+            start.tags.append(MessageTag(name='label', value=label))
+
+        batch = [start]
+        for message in messages:
+            message.tags.append(MessageTag(name='batch', value=reference))
+            batch.append(message)
+
+        batch.append(
+            Message(prefix=SERVER_NAME, command='BATCH', parameters=['-' + reference])
+        )
+        return batch
+
+    def reply(self, request: Message, messages: List[Message]) -> None:
+        """
+        Sends the response to a request, labeling it when the client
+        supports labeled-response.
+        """
+
+        label = request.label if 'labeled-response' in self.caps else None
+
+        if label is None:
+            self.write(*messages)
+        elif len(messages) == 0:
+            ack = Message(prefix=SERVER_NAME, command='ACK')
+            ack.tags.append(MessageTag(name='label', value=label))
+            self.write(ack)
+        elif len(messages) == 1:
+            messages[0].tags.append(MessageTag(name='label', value=label))
+            self.write(*messages)
+        else:
+            self.write(*self.batch('labeled-response', messages, label=label))
+
+    async def run(self) -> None:
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+
+                message = Message.parse(line.decode('utf-8').strip())
+                handler = getattr(self, 'handle_' + message.command.lower(), None)
+                if handler:
+                    handler(message)
+                elif self.is_registered:
+                    self.reply(
+                        message,
+                        [self.numeric('421', message.command, 'Unknown command')],
+                    )
+
+                await self.writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.server.disconnected(self)
+            self.writer.close()
+
+    # Registration
+
+    def handle_cap(self, message: Message) -> None:
+        subcommand = (message.get(0) or '').upper()
+
+        if subcommand == 'LS':
+            self.is_negotiating = True
+            self.write(
+                Message(
+                    prefix=SERVER_NAME,
+                    command='CAP',
+                    parameters=['*', 'LS', ' '.join(self.server.caps)],
+                )
+            )
+        elif subcommand == 'REQ':
+            requested = (message.get(1) or '').split()
+            if all(cap.lstrip('-') in self.server.caps for cap in requested):
+                for cap in requested:
+                    if cap.startswith('-'):
+                        self.caps.discard(cap[1:])
+                    else:
+                        self.caps.add(cap)
+                response = 'ACK'
+            else:
+                response = 'NAK'
+
+            self.write(
+                Message(
+                    prefix=SERVER_NAME,
+                    command='CAP',
+                    parameters=[self.nick, response, ' '.join(requested)],
+                )
+            )
+        elif subcommand == 'END':
+            self.is_negotiating = False
+            self.register()
+
+    def handle_nick(self, message: Message) -> None:
+        nick = message.get(0)
+        if not nick:
+            return
+
+        if self.is_registered:
+            self.write(Message(prefix=self.prefix, command='NICK', parameters=[nick]))
+
+        self.nick = nick
+        self.register()
+
+    def handle_user(self, message: Message) -> None:
+        self.user = message.get(0)
+        self.register()
+
+    def register(self) -> None:
+        if self.is_registered or self.is_negotiating or self.nick == '*':
+            return
+
+        if self.user is None:
+            return
+
+        self.is_registered = True
+        self.write(
+            self.numeric('001', 'Welcome to the load testing network'),
+            self.numeric('005', ' '.join(self.server.isupport), 'are supported'),
+            self.numeric('422', 'MOTD File is missing'),
+        )
+
+    def handle_ping(self, message: Message) -> None:
+        self.write(
+            Message(
+                prefix=SERVER_NAME,
+                command='PONG',
+                parameters=[SERVER_NAME] + message.parameters[-1:],
+            )
+        )
+
+    def handle_quit(self, message: Message) -> None:
+        self.write(Message(command='ERROR', parameters=['Closing link']))
+        self.writer.close()
+
+    # Channels
+
+    def handle_join(self, message: Message) -> None:
+        for name in (message.get(0) or '').split(','):
+            channel = self.server.find_channel(name)
+            channel.connections.add(self)
+
+            join = Message(prefix=self.prefix, command='JOIN', parameters=[name])
+            for connection in channel.connections:
+                connection.write(join)
+
+            self.names(channel)
+
+    def names(self, channel: Channel) -> None:
+        nicks = ['@' + self.nick] + [
+            connection.nick
+            for connection in channel.connections
+            if connection is not self
+        ]
+
+        lines = []
+        for start in range(0, channel.generated_members, 50):
+            end = min(start + 50, channel.generated_members)
+            nicks.extend(channel.generated_nick(index) for index in range(start, end))
+
+            if len(nicks) >= 50:
+                lines.append(self.names_line(channel, nicks))
+                nicks = []
+
+        if nicks:
+            lines.append(self.names_line(channel, nicks))
+
+        lines.append(str(self.numeric('366', channel.name, 'End of /NAMES list.')))
+        self.write_lines(lines)
+
+    def names_line(self, channel: Channel, nicks: List[str]) -> str:
+        return str(self.numeric('353', '=', channel.name, ' '.join(nicks)))
+
+    def handle_part(self, message: Message) -> None:
+        for name in (message.get(0) or '').split(','):
+            channel = self.server.find_channel(name)
+            part = Message(prefix=self.prefix, command='PART', parameters=[name])
+            for connection in channel.connections:
+                connection.write(part)
+
+            channel.connections.discard(self)
+
+    def handle_privmsg(self, message: Message) -> None:
+        target = message.get(0) or ''
+        relay = Message(
+            prefix=self.prefix, command='PRIVMSG', parameters=message.parameters[:2]
+        )
+
+        if target.startswith('#'):
+            recipients = self.server.find_channel(target).connections - {self}
+        else:
+            recipients = {
+                connection
+                for connection in self.server.connections
+                if connection.nick.lower() == target.lower()
+            }
+
+        for connection in recipients:
+            connection.write(relay)
+
+        self.reply(message, [])
+
+    def handle_who(self, message: Message) -> None:
+        mask = message.get(0) or '*'
+        fields = message.get(1) or ''
+
+        replies = []
+        if fields.startswith('%') and mask.startswith('#'):
+            # Only the `%tcuhnfar,<token>` fields requested by irctk
+            token = fields.partition(',')[2]
+            channel = self.server.find_channel(mask)
+            for index in range(channel.generated_members):
+                nick = channel.generated_nick(index)
+                replies.append(
+                    self.numeric(
+                        '354',
+                        token,
+                        mask,
+                        nick,
+                        'users.example.com',
+                        nick,
+                        'G' if index % 10 == 0 else 'H',
+                        nick if index % 2 == 0 else '0',
+                        'Generated user {}'.format(index),
+                    )
+                )
+
+        replies.append(self.numeric('315', mask, 'End of /WHO list.'))
+        self.reply(message, replies)
+
+    def handle_chathistory(self, message: Message) -> None:
+        # CHATHISTORY LATEST <target> * <limit>
+        target = message.get(1) or ''
+        limit = int(message.get(3) or 0)
+        channel = self.server.find_channel(target)
+
+        messages = []
+        for index in range(limit):
+            history = Message(
+                prefix=channel.generated_prefix(
+                    index % max(channel.generated_members, 1)
+                ),
+                command='PRIVMSG',
+                parameters=[target, 'load {}'.format(time.perf_counter())],
+            )
+            history.tags = self.tags(msgid='history{}'.format(index))
+            messages.append(history)
+
+        label = message.label if 'labeled-response' in self.caps else None
+        self.write(*self.batch('chathistory', messages, [target], label=label))
+
+    # Traffic
+
+    async def flood(self, channel: str, count: int, chunk: int = 1000) -> None:
+        """
+        Sends `count` messages to a channel from its generated members, each
+        containing the `time.perf_counter()` at which it was sent.
+        """
+
+        senders = max(self.server.find_channel(channel).generated_members, 1)
+
+        for start in range(0, count, chunk):
+            now = time.perf_counter()
+            self.write_lines(
+                [
+                    ':user{}!user@users.example.com PRIVMSG {} :load {}'.format(
+                        index % senders, channel, now
+                    )
+                    for index in range(start, min(start + chunk, count))
+                ]
+            )
+            await self.writer.drain()
+
+    async def netsplit(self, count: Optional[int] = None) -> None:
+        """
+        Sends a netsplit quitting `count` generated members from every
+        channel, within a netsplit batch when the client supports batches.
+        """
+
+        servers = ['hub.example.com', 'leaf.example.com']
+        quitting: Dict[int, Channel] = {}
+
+        for channel in self.server.channels.values():
+            if self not in channel.connections:
+                continue
+
+            remaining = max(channel.generated_members - (count or 0), 0)
+            if count is None:
+                remaining = 0
+
+            # Generated members are shared between channels, each quits once
+            for index in range(remaining, channel.generated_members):
+                quitting.setdefault(index, channel)
+
+            channel.generated_members = remaining
+
+        quits = [
+            Message(
+                prefix=channel.generated_prefix(index),
+                command='QUIT',
+                parameters=[' '.join(servers)],
+            )
+            for index, channel in quitting.items()
+        ]
+
+        self.write(*self.batch('netsplit', quits, servers))
+        await self.writer.drain()
+
+
+class Server:
+    """
+    A local IRC server accepting connections on a random port.
+    """
+
+    def __init__(
+        self,
+        host: str = '127.0.0.1',
+        port: int = 0,
+        caps: Optional[List[str]] = None,
+        isupport: Optional[List[str]] = None,
+        names_members: int = 0,
+    ):
+        self.host = host
+        self.port = port
+        self.caps = CAPABILITIES if caps is None else caps
+        self.isupport = ISUPPORT if isupport is None else isupport
+
+        # Number of generated members in channels created by the server
+        self.names_members = names_members
+
+        self.channels: Dict[str, Channel] = {}
+        self.connections: List[Connection] = []
+        self.connected = asyncio.Event()
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        self.server = await asyncio.start_server(self.accept, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        for connection in list(self.connections):
+            connection.writer.close()
+
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def accept(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        connection = Connection(self, reader, writer)
+        self.connections.append(connection)
+        self.connected.set()
+        await connection.run()
+
+    def disconnected(self, connection: Connection) -> None:
+        if connection in self.connections:
+            self.connections.remove(connection)
+
+        for channel in self.channels.values():
+            channel.connections.discard(connection)
+
+    def find_channel(self, name: str) -> Channel:
+        key = name.lower()
+        if key not in self.channels:
+            self.channels[key] = Channel(name, self.names_members)
+
+        return self.channels[key]
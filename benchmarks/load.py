@@ -0,0 +1,229 @@
+"""
+End-to-end load tests of the client against the local server in
+`benchmarks.ircd`.
+
+Run from the root of the repository::
+
+    $ python -m benchmarks.load flood names --count 100000
+
+Each scenario reports the messages per second the client processed, the
+latency between the server sending a message and a module receiving it, and
+the memory allocated while it ran.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+import tracemalloc
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from benchmarks.ircd import Server
+from irctk.client import Client
+
+LOAD_CHANNEL = '#load'
+
+
+class LoadModule:
+    """
+    Records the latency of messages sent by the load server, which contain
+    the time they were sent.
+    """
+
+    def __init__(self) -> None:
+        self.registered = asyncio.Event()
+        self.latencies: List[float] = []
+        self.expected = 0
+        self.received = asyncio.Event()
+
+    def reset(self, expected: int) -> None:
+        self.latencies = []
+        self.expected = expected
+        self.received.clear()
+
+    def record(self, text: str) -> None:
+        if text.startswith('load '):
+            self.latencies.append(time.perf_counter() - float(text[5:]))
+            if len(self.latencies) >= self.expected:
+                self.received.set()
+
+    def irc_registered(self, client: Client) -> None:
+        self.registered.set()
+
+    def irc_channel_message(self, client: Client, nick, channel, message: str) -> None:
+        self.record(message)
+
+
+class Scenario:
+    def __init__(self, server: Server, client: Client, module: LoadModule, count: int):
+        self.server = server
+        self.client = client
+        self.module = module
+        self.count = count
+
+    @property
+    def connection(self):
+        return self.server.connections[0]
+
+    async def flood(self) -> None:
+        self.module.reset(self.count)
+        await self.connection.flood(LOAD_CHANNEL, self.count)
+        await self.module.received.wait()
+
+    async def wait_for_whox(self) -> None:
+        while self.client.whox_channel or self.client.whox_queue:
+            await asyncio.sleep(0.001)
+
+    async def names(self) -> None:
+        # Joining includes enriching the members with WHOX
+        await self.client.join_many(['#names'])['#names']
+        await self.wait_for_whox()
+
+    async def netsplit(self) -> None:
+        channel = self.client.find_channel(LOAD_CHANNEL)
+        assert channel
+        remaining = len(channel.members) - self.count
+        await self.connection.netsplit(self.count)
+
+        while len(channel.members) > remaining:
+            await asyncio.sleep(0.001)
+
+    async def chathistory(self) -> None:
+        self.module.reset(self.count)
+        stream = self.client.send(
+            'CHATHISTORY', 'LATEST', LOAD_CHANNEL, '*', self.count, stream=True
+        )
+        async for message in stream:
+            if message.command == 'PRIVMSG':
+                self.module.record(message.parameters[-1])
+
+    async def whox(self) -> None:
+        channel = self.client.find_channel('#names')
+        if not channel:
+            channel = await self.client.join_many(['#names'])['#names']
+
+        self.client.enrich_channel(channel)
+        await self.wait_for_whox()
+
+
+SCENARIOS: Dict[str, Callable[[Scenario], Awaitable[None]]] = {
+    'flood': Scenario.flood,
+    'names': Scenario.names,
+    'netsplit': Scenario.netsplit,
+    'chathistory': Scenario.chathistory,
+    'whox': Scenario.whox,
+}
+
+
+def percentile(values: List[float], percentile: float) -> Optional[float]:
+    if not values:
+        return None
+
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percentile / 100))]
+
+
+async def run(
+    names: List[str], count: int, members: int, trace_memory: bool = False
+) -> Dict[str, Dict[str, Any]]:
+    server = Server(names_members=members)
+    await server.start()
+
+    module = LoadModule()
+    client = Client(nickname='load')
+
+    # Netsplit batches are buffered for their handler, and WHOX queries are
+    # not paced so that joining measures the client rather than the pacing
+    client.max_batch_messages = count + 2
+    client.whox_interval = 0
+    client.modules.append(module)
+    task = asyncio.ensure_future(client.connect(server.host, server.port))
+
+    results = {}
+
+    try:
+        await asyncio.wait_for(module.registered.wait(), 10)
+        await client.join_many([LOAD_CHANNEL])[LOAD_CHANNEL]
+        await Scenario(server, client, module, count).wait_for_whox()
+
+        for name in names:
+            connection = server.connections[0]
+            lines_sent = connection.lines_sent
+
+            if trace_memory:
+                tracemalloc.start()
+
+            started = time.perf_counter()
+            await SCENARIOS[name](Scenario(server, client, module, count))
+            elapsed = time.perf_counter() - started
+
+            memory = None
+            if trace_memory:
+                _, memory = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+            lines = connection.lines_sent - lines_sent
+            latencies = module.latencies if name in ('flood', 'chathistory') else []
+            p50 = percentile(latencies, 50)
+            p99 = percentile(latencies, 99)
+            module.latencies = []
+
+            results[name] = {
+                'messages': lines,
+                'seconds': round(elapsed, 4),
+                'messages_per_sec': round(lines / elapsed),
+                'latency_p50_ms': None if p50 is None else round(p50 * 1000, 3),
+                'latency_p99_ms': None if p99 is None else round(p99 * 1000, 3),
+                'memory_peak_kb': None if memory is None else memory // 1024,
+            }
+    finally:
+        client.quit()
+        await asyncio.wait([task], timeout=5)
+        await server.stop()
+
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('scenarios', nargs='*', help=', '.join(SCENARIOS))
+    parser.add_argument('--count', type=int, default=50000)
+    parser.add_argument(
+        '--members', type=int, default=50000, help='members of each channel'
+    )
+    parser.add_argument('--no-memory', action='store_true')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    options = parser.parse_args(argv)
+
+    names = options.scenarios or list(SCENARIOS)
+    for name in names:
+        if name not in SCENARIOS:
+            parser.error('unknown scenario {}'.format(name))
+
+    results = asyncio.run(
+        run(names, options.count, options.members, not options.no_memory)
+    )
+
+    for name, result in results.items():
+        print(
+            '{:<12} {:>9} messages {:>10,} msg/s  p50 {} ms  p99 {} ms  '
+            'peak {} KiB'.format(
+                name,
+                result['messages'],
+                result['messages_per_sec'],
+                result['latency_p50_ms'],
+                result['latency_p99_ms'],
+                result['memory_peak_kb'],
+            )
+        )
+
+    if options.output:
+        with open(options.output, 'w') as fp:
+            json.dump(results, fp, indent=2, sort_keys=True)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,44 @@
+"""
+Replays captured traffic through a client as fast as possible, reporting the
+throughput on real traffic.
+
+Run from the root of the repository with a capture written by
+`irctk.trace.WireTrace` or a journal directory::
+
+    $ python -m benchmarks.replay irc.jsonl
+"""
+
+import argparse
+import asyncio
+import sys
+from typing import List, Optional
+
+from irctk.client import Client
+from irctk.replay import Replay, load_records
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('path', help='capture file or journal directory')
+    parser.add_argument('--speed', type=float, help='pace to the capture timestamps')
+    options = parser.parse_args(argv)
+
+    replay = Replay(Client(), speed=options.speed)
+    stats = asyncio.run(replay.run(load_records(options.path)))
+
+    print(
+        '{} lines ({} bytes) in {:.3f}s, {:,.0f} lines/s, '
+        '{:.1f}s of traffic, {} lines suppressed'.format(
+            stats.lines,
+            stats.bytes,
+            stats.elapsed,
+            stats.lines_per_second,
+            stats.duration,
+            stats.suppressed_lines,
+        )
+    )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,307 @@
+"""
+Microbenchmarks for the parsing, serialisation and dispatch hot paths.
+
+Run from the root of the repository::
+
+    $ python -m benchmarks.run --output results.json
+
+Results are compared against `benchmarks/baseline.json`, exiting with a
+failure status when any benchmark is slower than the baseline by more than
+the threshold. The baseline is only meaningful on the machine it was recorded
+on, record a new one with `--update-baseline`.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import timeit
+from typing import Any, Callable, Dict, List, Optional
+
+from irctk.channel import Membership
+from irctk.client import Client
+from irctk.isupport import ISupport
+from irctk.message import Message, MessageTag
+from irctk.nick import Nick
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+Benchmark = Callable[[], Callable[[], Any]]
+BENCHMARKS: Dict[str, Benchmark] = {}
+
+
+def benchmark(name: str) -> Callable[[Benchmark], Benchmark]:
+    """
+    Registers a benchmark, the decorated function performs any setup and
+    returns the function to be timed.
+    """
+
+    def decorator(setup: Benchmark) -> Benchmark:
+        BENCHMARKS[name] = setup
+        return setup
+
+    return decorator
+
+
+class BenchmarkClient(Client):
+    def send_line(self, line: str) -> None:
+        pass
+
+
+def create_client(channels: int = 1, members: int = 1) -> BenchmarkClient:
+    client = BenchmarkClient(nickname='kylef')
+    client.nick = Nick.parse('kylef!kyle@example.com')
+    client.isupport.parse(
+        'PREFIX=(ov)@+ CHANTYPES=# CHANMODES=beI,k,l,imnst CASEMAPPING=rfc1459'
+    )
+
+    for index in range(channels):
+        channel = client.add_channel('#channel{}'.format(index))
+        channel.is_attached = True
+        for member in range(members):
+            channel.members.append(
+                Membership(Nick('nick{}'.format(member), 'user', 'example.com'))
+            )
+
+    return client
+
+
+# Message
+
+
+LINE = ':kylef!kyle@example.com PRIVMSG #irctk :Hello World, how are you?'
+TAGGED_LINE = (
+    '@time=2021-06-01T12:00:00.000Z;account=kylef;msgid=6a7b8c9d;'
+    '+draft/reply=5e6f\\sa\\:b ' + LINE
+)
+
+
+@benchmark('message.parse')
+def bench_message_parse() -> Callable[[], Any]:
+    return lambda: Message.parse(LINE)
+
+
+@benchmark('message.parse_tags')
+def bench_message_parse_tags() -> Callable[[], Any]:
+    return lambda: Message.parse(TAGGED_LINE)
+
+
+@benchmark('message.str')
+def bench_message_str() -> Callable[[], Any]:
+    message = Message.parse(TAGGED_LINE)
+    return lambda: str(message)
+
+
+@benchmark('message.bytes')
+def bench_message_bytes() -> Callable[[], Any]:
+    message = Message.parse(TAGGED_LINE)
+    return lambda: bytes(message)
+
+
+@benchmark('message_tag.escape')
+def bench_message_tag_escape() -> Callable[[], Any]:
+    tag = MessageTag(name='reply', vendor='draft', value='a b;c\\d\r\n')
+    return lambda: str(tag)
+
+
+@benchmark('message_tag.unescape')
+def bench_message_tag_unescape() -> Callable[[], Any]:
+    return lambda: MessageTag.parse('+draft/reply=a\\sb\\:c\\\\d\\r\\n')
+
+
+# Client
+
+
+def bench_process_line(*lines: str) -> Callable[[], Callable[[], Any]]:
+    def setup() -> Callable[[], Any]:
+        client = create_client(channels=10, members=100)
+
+        def process() -> None:
+            for line in lines:
+                client.process_line(line)
+
+        return process
+
+    return setup
+
+
+PROCESS_LINES = {
+    'privmsg_channel': [':doe!d@example.com PRIVMSG #channel5 :Hello World'],
+    'privmsg_private': [':doe!d@example.com PRIVMSG kylef :Hello World'],
+    'ping': ['PING :irc.example.com'],
+    'join_part': [
+        ':doe!d@example.com JOIN #channel5',
+        ':doe!d@example.com PART #channel5 :Bye',
+    ],
+    'nick': [
+        ':nick50!user@example.com NICK other',
+        ':other!user@example.com NICK nick50',
+    ],
+    'mode': [
+        ':kylef!kyle@example.com MODE #channel5 +o nick50',
+        ':kylef!kyle@example.com MODE #channel5 -o nick50',
+    ],
+    'topic': [':doe!d@example.com TOPIC #channel5 :New topic'],
+    'numeric': [':irc.example.com 372 kylef :- Message of the day'],
+}
+
+for command, lines in PROCESS_LINES.items():
+    benchmark('client.process_line.{}'.format(command))(bench_process_line(*lines))
+
+
+@benchmark('client.irc_equal')
+def bench_irc_equal() -> Callable[[], Any]:
+    client = create_client()
+    return lambda: client.irc_equal('#IRCTK[]', '#irctk{}')
+
+
+for count in (10, 100, 1000):
+
+    def bench_find_channel(count: int = count) -> Callable[[], Any]:
+        client = create_client(channels=count, members=0)
+        name = '#CHANNEL{}'.format(count - 1)
+        return lambda: client.find_channel(name)
+
+    benchmark('client.find_channel.{}'.format(count))(bench_find_channel)
+
+for count in (10, 1000, 10000):
+
+    def bench_find_membership(count: int = count) -> Callable[[], Any]:
+        client = create_client(channels=1, members=count)
+        channel = client.channels[0]
+        nick = Nick('NICK{}'.format(count - 1))
+        return lambda: client.channel_find_membership(channel, nick)
+
+    benchmark('client.channel_find_membership.{}'.format(count))(bench_find_membership)
+
+
+# ISupport
+
+
+@benchmark('isupport.parse')
+def bench_isupport_parse() -> Callable[[], Any]:
+    line = (
+        'AWAYLEN=200 CASEMAPPING=rfc1459 CHANLIMIT=#:250 CHANMODES=IXZbew,k,FHJLdfjl,'
+        'ABCDKMNOPQRSTcimnprstuz CHANNELLEN=64 CHANTYPES=# ELIST=CMNTU EXCEPTS=e '
+        'INVEX=I KICKLEN=255 MAXLIST=IXZbew:100 MODES=4 NETWORK=Libera.Chat '
+        'NICKLEN=16 PREFIX=(ov)@+ SAFELIST STATUSMSG=@+ TOPICLEN=390'
+    )
+    return lambda: ISupport().parse(line)
+
+
+# Runner
+
+
+def measure(func: Callable[[], Any], repeat: int, min_time: float) -> float:
+    """
+    Returns the fastest time of a single call in nanoseconds.
+    """
+
+    timer = timeit.Timer(func)
+    number, elapsed = timer.autorange()
+    if elapsed < min_time:
+        number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+
+    best = min(timer.repeat(repeat=repeat, number=number))
+    return best / number * 1e9
+
+
+def run(
+    names: List[str], repeat: int = 5, min_time: float = 0.2
+) -> Dict[str, Dict[str, float]]:
+    results = {}
+
+    for name in names:
+        ns = measure(BENCHMARKS[name](), repeat, min_time)
+        results[name] = {'ns_per_op': round(ns, 1), 'ops_per_sec': round(1e9 / ns)}
+
+    return results
+
+
+def compare(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    threshold: float,
+) -> List[str]:
+    """
+    Returns a description of every benchmark which is slower than its
+    baseline by more than the threshold (a ratio, 0.25 is 25% slower).
+
+    >>> compare({'a': {'ns_per_op': 130}}, {'a': {'ns_per_op': 100}}, 0.25)
+    ['a: 130.0ns, baseline 100.0ns (+30%)']
+    """
+
+    regressions = []
+
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+
+        current = result['ns_per_op']
+        previous = baseline[name]['ns_per_op']
+        if current > previous * (1 + threshold):
+            regressions.append(
+                '{}: {:.1f}ns, baseline {:.1f}ns (+{:.0%})'.format(
+                    name, current, previous, current / previous - 1
+                )
+            )
+
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('filter', nargs='*', help='run benchmarks containing these')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--threshold', type=float, default=0.25)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.2)
+    parser.add_argument('--update-baseline', action='store_true')
+    options = parser.parse_args(argv)
+
+    names = [
+        name
+        for name in BENCHMARKS
+        if not options.filter or any(part in name for part in options.filter)
+    ]
+    results = run(names, options.repeat, options.min_time)
+
+    for name, result in results.items():
+        print(
+            '{:<45} {:>12.1f} ns {:>12,} ops/s'.format(
+                name, result['ns_per_op'], result['ops_per_sec']
+            )
+        )
+
+    document = {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'benchmarks': results,
+    }
+
+    if options.output:
+        with open(options.output, 'w') as fp:
+            json.dump(document, fp, indent=2, sort_keys=True)
+
+    if options.update_baseline:
+        with open(options.baseline, 'w') as fp:
+            json.dump(document, fp, indent=2, sort_keys=True)
+        return 0
+
+    if not os.path.exists(options.baseline):
+        return 0
+
+    with open(options.baseline) as fp:
+        baseline = json.load(fp)['benchmarks']
+
+    regressions = compare(results, baseline, options.threshold)
+    for regression in regressions:
+        print('Regression {}'.format(regression), file=sys.stderr)
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,130 @@
+import time
+from typing import Iterator, List, Optional
+
+from irctk.message import Message
+
+
+class Batch:
+    """
+    Represents an IRCv3 batch (https://ircv3.net/specs/extensions/batch)
+    that is being received or has been completed.
+
+    >>> batch = Batch(Message.parse('BATCH +yXNAbvnRHTRBv netsplit a.net b.net'))
+    >>> batch.type
+    'netsplit'
+    >>> batch.parameters
+    ['a.net', 'b.net']
+    """
+
+    def __init__(
+        self,
+        message: Message,
+        parent: Optional['Batch'] = None,
+        created_at: Optional[float] = None,
+    ):
+        self.reference_tag = message.parameters[0][1:]
+        self.type = message.get(1)
+        self.parameters = message.parameters[2:]
+
+        self.parent = parent
+        self.children: List['Batch'] = []
+        if parent:
+            parent.children.append(self)
+
+        self.messages: List[Message] = [message]
+        self.message_count = 1
+        self.size = message_size(message)
+
+        self.created_at = time.monotonic() if created_at is None else created_at
+        self.is_complete = False
+
+        # Whether the batch has ended or been discarded, handlers are called
+        # once the batch is closed
+        self.is_closed = False
+
+        # Whether messages are kept, only the count is kept otherwise
+        self.is_buffered = True
+
+    def __repr__(self) -> str:
+        return '<Batch {} {}>'.format(self.reference_tag, self.type)
+
+    def __iter__(self) -> Iterator[Message]:
+        """
+        Iterates over the messages of the batch including the messages of
+        any nested batches in the order they were received.
+        """
+
+        children = {id(child.messages[0]): child for child in self.children}
+
+        for message in self.messages:
+            child = children.get(id(message))
+            if child and child.messages:
+                yield from child
+            else:
+                yield message
+
+    @property
+    def root(self) -> 'Batch':
+        """
+        Returns the outermost batch this batch is nested in.
+        """
+
+        batch = self
+        while batch.parent:
+            batch = batch.parent
+
+        return batch
+
+    @property
+    def start(self) -> Message:
+        return self.messages[0]
+
+    @property
+    def label(self) -> Optional[str]:
+        return self.start.label
+
+    def append(self, message: Message, buffer: bool = True) -> None:
+        self.message_count += 1
+
+        if buffer:
+            self.messages.append(message)
+            self.size += message_size(message)
+
+    def walk(self) -> Iterator['Batch']:
+        """
+        Iterates over this batch and every batch nested within it.
+        """
+
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+
+def message_size(message: Message) -> int:
+    """
+    Returns an estimate of the size of a message in bytes without
+    serialising the message.
+    """
+
+    return (
+        len(message.command)
+        + len(message.prefix or '')
+        + sum(map(len, message.parameters))
+        + sum(len(tag.name) + len(tag.value or '') for tag in message.tags)
+    )
+
+
+class BatchHandler:
+    """
+    A handler for batches of a given type registered with
+    `Client.add_batch_handler`.
+    """
+
+    def __init__(self, batch_type: str, on_message=None, on_complete=None):
+        self.batch_type = batch_type
+        self.on_message = on_message
+        self.on_complete = on_complete
+
+    @property
+    def is_streaming(self) -> bool:
+        return self.on_message is not None
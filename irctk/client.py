@@ -1,25 +1,180 @@
 import asyncio
+import base64
+import binascii
+import contextlib
 import datetime
+import functools
+import itertools
 import logging
+import random
+import re
 import string
-from typing import Any, Dict, List, NamedTuple, Optional, Union
-
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from enum import Enum
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from irctk.batch import Batch, BatchHandler
 from irctk.channel import Channel, Membership
 from irctk.command import Command
 from irctk.isupport import ISupport
-from irctk.message import Message
+from irctk.journal import JournalWriter
+from irctk.message import Message, MessageTag
+from irctk.metrics import Metrics, RollingHistogram
 from irctk.nick import Nick
+from irctk.profiling import Profiler
+from irctk.sasl import Mechanism, SASLError
+from irctk.trace import RECEIVED, SENT, WireTrace
+
+
+class MessageStream:
+    """
+    Asynchronous iterator over the messages received in response to a
+    labeled request, including any messages inside of nested batches.
+
+    >>> async for message in client.send('WHO', '#example', stream=True):
+    ...     print(message)
+
+    At most `max_size` messages wait to be consumed. A consumer which falls
+    further behind has the stream closed, the waiting messages are dropped
+    and iterating raises a `BufferError`.
+    """
+
+    def __init__(self, label: str, future: asyncio.Future, max_size: int = 0):
+        self.label = label
+        self.future = future
+        self.max_size = max_size
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.batch: Optional[str] = None
+
+        future.add_done_callback(self.finish)
+
+    def put(self, message: Message) -> None:
+        if self.future.done():
+            # Closed, messages which follow are dropped
+            return
+
+        if self.max_size and self.queue.qsize() >= self.max_size:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+
+            self.future.set_exception(
+                BufferError(
+                    'Stream exceeded {} unconsumed messages'.format(self.max_size)
+                )
+            )
+            return
+
+        self.queue.put_nowait(message)
+
+    def finish(self, future: asyncio.Future) -> None:
+        if future.cancelled():
+            self.queue.put_nowait(asyncio.CancelledError())
+        elif future.exception():
+            self.queue.put_nowait(future.exception())
+        else:
+            self.queue.put_nowait(StopAsyncIteration())
+
+    def __aiter__(self) -> 'MessageStream':
+        return self
+
+    async def __anext__(self) -> Message:
+        item = await self.queue.get()
+
+        if isinstance(item, BaseException):
+            # Keep the stream finished for any further iteration
+            self.queue.put_nowait(item)
+            raise item
+
+        return item
 
 
 class Request(NamedTuple):
     message: Message
     future: asyncio.Future
+    timeout: Optional[asyncio.TimerHandle] = None
+    stream: Optional[MessageStream] = None
+    buffer: bool = False
+
+
+def offload(executor: Optional[str] = None) -> Callable:
+    """
+    Decorator for module handlers doing CPU heavy work. The handler is run
+    in the thread pool of the given name from `Client.executors` (or the
+    event loops default executor) instead of on the event loop. Handlers
+    are passed the client, which cannot be sent to a process pool, so they
+    are run on the event loop when the executor is a process pool or there
+    is no executor of the given name.
+
+    A callable returned by the handler is called back on the event loop,
+    in order of the events for each channel or nick.
+
+    >>> class Titles:
+    ...     @offload()
+    ...     def irc_channel_message(self, client, nick, channel, message):
+    ...         title = parse_title(message)
+    ...         return lambda: client.send_privmsg(channel, title)
+    """
+
+    def decorator(func: Callable) -> Callable:
+        func.is_offloaded = True  # type: ignore
+        func.offload_executor = executor  # type: ignore
+        return func
+
+    return decorator
+
+
+class Registration(Enum):
+    DISCONNECTED = 'disconnected'
+
+    # Negotiating capabilities and authenticating with SASL
+    NEGOTIATING = 'negotiating'
+    AUTHENTICATING = 'authenticating'
+
+    # Capability negotiation has ended, awaiting RPL_WELCOME
+    REGISTERING = 'registering'
+
+    # RPL_WELCOME has been received, ready once the MOTD has been received
+    REGISTERED = 'registered'
+    READY = 'ready'
+
+
+class Server(NamedTuple):
+    host: str
+    port: int = 6697
+    use_tls: bool = True
 
 
 class IRCIgnoreLine(Exception):
     pass
 
 
+# Maximum length of an IRC line excluding message tags, including CR-LF
+MAXIMUM_LINE_LENGTH = 512
+
+# Translation tables applied after lowercasing for each case mapping, shared
+# between every client
+CASE_MAPPING_TABLES = {
+    'rfc1459': str.maketrans('[]\\', '{}|'),
+    'rfc1459-strict': str.maketrans('[]\\^', '{}|~'),
+}
+
+# Quit reason of users lost in a netsplit, the names of the two servers
+NETSPLIT_REASON_REGEX = re.compile(r'^[^\s.]+(\.[^\s.]+)+ [^\s.]+(\.[^\s.]+)+$')
+
+
 class Client:
     """
     >>> client = Client(nickname='example')
@@ -28,12 +183,42 @@ class Client:
     channel_class = Channel
     nick_class = Nick
 
+    # Limits for buffered batches, batches exceeding these are discarded
+    max_batch_messages = 10000
+    max_batch_age = 300.0
+
+    # Maximum number of messages of a streamed response waiting to be
+    # consumed, the stream fails once exceeded
+    max_stream_messages = 10000
+
+    # Maximum number of coroutine handlers running at once, and whether
+    # handlers for the same channel or nick run in the order of the events
+    max_concurrent_handlers = 100
+    ordered_handlers = True
+
+    # Seconds between PINGs measuring the lag to the server, and seconds
+    # without receiving any data after which the connection is considered
+    # dead. Keepalive is disabled when the interval is None.
+    keepalive_interval: Optional[float] = 60.0
+    keepalive_timeout = 240.0
+
+    # Minimum seconds between the WHOX queries enriching the members of
+    # joined channels
+    whox_interval = 1.0
+
+    # Returns the time in seconds used for the age of batches, keepalive,
+    # lag and reconnection statistics, may be replaced by a virtual clock
+    clock = staticmethod(time.monotonic)
+
     def __init__(
         self,
         nickname: str = 'irctk',
         ident: str = 'irctk',
         realname: str = 'irctk',
         password: Optional[str] = None,
+        write_high_water: int = 64 * 1024,
+        write_low_water: Optional[int] = None,
+        request_timeout: Optional[float] = 60,
     ):
         super(Client, self).__init__()
 
@@ -44,22 +229,148 @@ class Client:
         self.realname = realname
         self.password = password
 
+        # Outbound buffer limits in bytes, `send_async` waits for the
+        # buffer to drain once it grows beyond the high-water mark.
+        self.write_high_water = write_high_water
+        self.write_low_water = write_low_water
+
+        # Seconds to wait for a response to a request before failing it
+        self.request_timeout = request_timeout
+
         self.is_connected = False
         self.is_registered = False
         self.secure = False
+
+        # Progress of registering the connection, along with the seconds
+        # from starting registration until RPL_WELCOME and the end of MOTD
+        self.registration = Registration.DISCONNECTED
+        self.registration_started_at: Optional[float] = None
+        self.time_to_registered: Optional[float] = None
+        self.time_to_ready: Optional[float] = None
+
+        # Nicknames to try while registering once the nickname is in use
+        self.alt_nicknames: List[str] = []
+
+        # Authenticates while registering once assigned a SASL mechanism
+        # such as `Plain()`, along with the account logged in to
+        self.sasl: Optional[Mechanism] = None
+        self.sasl_buffer = ''
+        self.account: Optional[str] = None
+
+        # Bytes to read from the connection at once, and any partial line
+        # which has been read
+        self.read_size = 64 * 1024
+        self.read_buffer = b''
+        self.last_received: Optional[float] = None
         self.nick = self.nick_class()
 
+        # Lag PINGs awaiting a PONG keyed by token, along with the time they
+        # were sent and the recently measured lag in seconds
+        self.lag_probes: Dict[str, float] = {}
+        self.lag = RollingHistogram()
+        self.keepalive_timer: Optional[asyncio.TimerHandle] = None
+
         self.channels: List[Channel] = []
         self.isupport = ISupport()
 
+        # Capabilities advertised by the server along with their values, and
+        # those which have been requested and acknowledged
+        self.caps: Dict[str, Optional[str]] = {}
         self.cap_accepted: List[str] = []
         self.cap_pending: List[str] = []
 
-        self.modules: List = [Any]
+        # Capabilities to request once every page of a multiline LS has
+        # been received
+        self.cap_wanted: List[str] = []
 
-        self.requests: List[Request] = []
+        self.modules: List = [Any]
 
-        self.batches: Dict[str, List[Message]] = {}
+        # Pending requests keyed by label
+        self.requests: Dict[str, Request] = {}
+        self.labels = itertools.count(1)
+
+        # Streamed requests keyed by the batch reference tags they receive
+        self.streams: Dict[str, MessageStream] = {}
+
+        # Pending unlabeled NICK requests keyed by lowercased nickname
+        self.nick_requests: Dict[str, Request] = {}
+
+        # Open batches keyed by reference tag
+        self.batches: Dict[str, Batch] = {}
+        self.batch_handlers: Dict[str, BatchHandler] = {}
+        self.add_batch_handler('netsplit', on_complete=self.netsplit_batch_complete)
+        self.add_batch_handler('netjoin', on_complete=self.netjoin_batch_complete)
+
+        # Quits of a netsplit without a netsplit batch, the quit reason along
+        # with the nicks which have quit so far.
+        self.pending_netsplit: Optional[Tuple[str, List[Nick]]] = None
+
+        # Pending JOIN requests keyed by lowercased channel name
+        self.joins: Dict[str, Request] = {}
+
+        # Members seen in NAMES replies which have not yet ended, along with
+        # an index of the existing members keyed by lowercased channel name
+        self.names: Dict[str, Tuple[Dict[str, Membership], Set[str]]] = {}
+
+        # Channels which were joined when the connection was lost
+        self.channels_to_rejoin: List[Channel] = []
+
+        # Channels awaiting a WHOX query to enrich their members, along with
+        # the token and channel of the query awaiting its replies, and an
+        # index of the channels members keyed by lowercased nick
+        self.whox_queue: List[Channel] = []
+        self.whox_tokens = itertools.count(1)
+        self.whox_requests: Dict[str, Request] = {}
+        self.whox_token: Optional[str] = None
+        self.whox_channel: Optional[Channel] = None
+        self.whox_members: Optional[Dict[str, Membership]] = None
+        self.whox_sent_at: Optional[float] = None
+        self.whox_timer: Optional[asyncio.TimerHandle] = None
+
+        # Running coroutine handlers, along with the most recent handler
+        # for each channel or nick so the next one may wait for it
+        self.handler_tasks: Set[asyncio.Task] = set()
+        self.ordered_handler_tasks: Dict[str, asyncio.Task] = {}
+        self.handler_semaphore: Optional[asyncio.Semaphore] = None
+
+        # Held while waiting for the outbound buffer to drain
+        self.drain_lock: Optional[asyncio.Lock] = None
+
+        # Executors for offloaded handlers by name, along with the most
+        # recent offloaded call for each channel or nick, statistics for
+        # each executor and the handlers warned that their executor cannot
+        # be used
+        self.executors: Dict[str, Executor] = {}
+        self.offload_tails: Dict[str, asyncio.Future] = {}
+        self.offload_stats: Dict[str, Dict[str, float]] = {}
+        self.inline_handlers: Set[str] = set()
+
+        # Number of calls and total and maximum time in seconds for each
+        # module handler
+        self.handler_stats: Dict[str, Dict[str, float]] = {}
+
+        # Traffic counters and latency histograms, only recorded once
+        # metrics have been enabled by assigning `Metrics()`
+        self.metrics: Optional[Metrics] = None
+
+        # Profiles parsing and handling messages once assigned a `Profiler()`
+        self.profiler: Optional[Profiler] = None
+
+        # Records the lines received and sent once assigned a `WireTrace()`
+        self.trace: Optional[WireTrace] = None
+
+        # Persists every raw line once assigned a `JournalWriter()`
+        self.journal: Optional[JournalWriter] = None
+
+        self.is_supervised = False
+        self.disconnected_at: Optional[float] = None
+        self.reconnect_stats: Dict[str, Any] = {
+            'attempts': 0,
+            'reconnects': 0,
+            'last_backoff': None,
+            'last_reconnect_duration': None,
+            'last_registered_at': None,
+        }
 
     async def connect(self, host: str, port: int, use_tls: bool = False) -> None:
         """
@@ -68,15 +379,26 @@ class Client:
 
         self.logger.info('Connecting to {}:{}'.format(host, port))
 
+        self.reconnect_stats['attempts'] += 1
+        self.caps = {}
+        self.cap_accepted = []
+        self.cap_pending = []
+        self.cap_wanted = []
+        self.isupport = ISupport()
+
         self.secure = use_tls
         connection = asyncio.open_connection(host, port, ssl=use_tls)
         try:
             self.reader, self.writer = await connection
         except Exception as exception:
             self.logger.error('Disconnected', exception)
-            self.irc_disconnected(exception)
+            self.disconnected(exception)
             return
 
+        self.writer.transport.set_write_buffer_limits(
+            high=self.write_high_water, low=self.write_low_water
+        )
+
         await self.connected()
 
     async def read(self) -> Optional[Message]:
@@ -84,28 +406,360 @@ class Client:
         if not raw_message:
             return None
 
+        if self.journal:
+            self.journal.append(RECEIVED, raw_message.rstrip(b'\r\n'))
+
         line = raw_message.decode('utf-8').strip()
-        self.logger.debug('S: {}'.format(line))
+        if self.trace:
+            self.trace.record_received(line)
         return Message.parse(line)
 
+    async def read_lines(self) -> Optional[List[str]]:
+        """
+        Reads every complete line which is available from the connection,
+        waiting until there is at least one. Returns None once the
+        connection has closed.
+        """
+
+        while True:
+            data = await self.reader.read(self.read_size)
+            if not data:
+                return None
+
+            self.last_received = self.clock()
+
+            *lines, self.read_buffer = (self.read_buffer + data).split(b'\n')
+            if lines and self.journal:
+                for line in lines:
+                    self.journal.append(RECEIVED, line.rstrip(b'\r'))
+
+            if lines:
+                return [line.decode('utf-8').strip() for line in lines]
+
     async def connected(self) -> None:
         self.is_connected = True
+        self.read_buffer = b''
+        self.last_received = self.clock()
         self.authenticate()
-        await self.writer.drain()
+        self.schedule_keepalive()
 
         while self.is_connected:
-            message = await self.read()
+            try:
+                await self.drain_writer(self.writer)
+                lines = await self.read_lines()
+            except OSError as error:
+                # Such as the connection being reset by the server
+                if self.is_connected:
+                    self.logger.info('Disconnected: {!r}'.format(error))
+                    self.writer.close()
+                    self.disconnected(error)
+                return
+
+            if not self.is_connected:
+                # The connection was declared dead while waiting for data
+                return
 
-            if not message:
-                self.is_registered = False
-                self.is_connected = False
+            if lines is None:
                 self.writer.close()
-                self.irc_disconnected(None)
+                self.disconnected(None)
                 self.logger.info('Disconnected')
                 return
 
-            self.process_message(message)
-            await self.writer.drain()
+            if self.trace:
+                for line in lines:
+                    self.trace.record_received(line)
+
+            try:
+                self.process_lines(lines)
+            except Exception as exception:
+                if self.trace:
+                    self.trace.dump(
+                        'Exception processing lines: {!r}'.format(exception)
+                    )
+                raise
+
+    def process_lines(self, lines: List[str]) -> None:
+        """
+        Parses and processes the lines which have been read at once.
+        """
+
+        metrics = self.metrics
+        if metrics or self.profiler:
+            messages = [self.parse_line(line) for line in lines]
+        else:
+            messages = [Message.parse(line) for line in lines]
+
+        # PING is answered before any of the other lines which have been
+        # read are dispatched, so that a slow module or a backlog of lines
+        # cannot cause a ping timeout. It is still dispatched in order.
+        for message in messages:
+            if message.command == 'PING':
+                self.process_ping(message)
+
+        for message in messages:
+            is_answered = message.command == 'PING'
+
+            if metrics:
+                started = time.perf_counter()
+                self.process_message(message, is_answered)
+                metrics.dispatch.observe(time.perf_counter() - started)
+            else:
+                self.process_message(message, is_answered)
+
+        # Batches are also expired here as a server may never start another
+        self.expire_batches()
+
+    def parse_line(self, line: str) -> Message:
+        """
+        Parses a line which has been read, recording metrics and profiling.
+        """
+
+        started = time.perf_counter()
+
+        if self.profiler:
+            message = self.profiler.call('parse', Message.parse, line)
+        else:
+            message = Message.parse(line)
+
+        if self.metrics:
+            self.metrics.parse.observe(time.perf_counter() - started)
+            self.metrics.record_received(message.command, len(line.encode('utf-8')) + 2)
+
+        return message
+
+    def disconnected(self, error: Optional[Exception]) -> None:
+        """
+        Resets the connection state once the connection has been lost. The
+        channels are kept, including their members, so that their state can
+        be reconciled once they have been joined again.
+        """
+
+        if self.trace and error:
+            self.trace.dump('Disconnected: {!r}'.format(error))
+
+        was_connected = self.is_connected
+        self.is_registered = False
+        self.is_connected = False
+        self.registration = Registration.DISCONNECTED
+        self.account = None
+
+        self.fail_requests(ConnectionError('Disconnected'))
+        self.batches.clear()
+        self.names.clear()
+        self.pending_netsplit = None
+        self.lag_probes.clear()
+
+        self.whox_queue.clear()
+        self.whox_token = None
+        self.whox_channel = None
+        self.whox_members = None
+
+        if self.keepalive_timer:
+            self.keepalive_timer.cancel()
+            self.keepalive_timer = None
+
+        if self.whox_timer:
+            self.whox_timer.cancel()
+            self.whox_timer = None
+
+        if was_connected:
+            self.disconnected_at = self.clock()
+
+            for channel in self.channels:
+                if channel.is_attached:
+                    channel.is_attached = False
+                    if channel not in self.channels_to_rejoin:
+                        self.channels_to_rejoin.append(channel)
+
+        self.irc_disconnected(error)
+
+    def schedule_keepalive(self) -> None:
+        if self.keepalive_interval is None:
+            return
+
+        loop = asyncio.get_running_loop()
+        self.keepalive_timer = loop.call_later(self.keepalive_interval, self.keepalive)
+
+    def keepalive(self) -> None:
+        """
+        Sends a PING to measure the lag to the server, unless one sent
+        within the interval is still awaiting its PONG. Once no data has been received for
+        `keepalive_timeout` seconds the connection is aborted, as reading
+        from a connection which silently died would wait forever. Batches
+        which have been open for too long are discarded.
+        """
+
+        self.keepalive_timer = None
+        if not self.is_connected:
+            return
+
+        silence = self.clock() - (self.last_received or 0)
+        if silence >= self.keepalive_timeout:
+            self.logger.warning('No data received for {:.0f}s'.format(silence))
+            self.writer.transport.abort()
+            self.disconnected(
+                asyncio.TimeoutError('No data received for {:.0f}s'.format(silence))
+            )
+            return
+
+        self.expire_batches()
+
+        # A PONG which has not arrived within the interval may have been
+        # lost, measuring lag continues with a new probe
+        now = self.clock()
+        for token, sent_at in list(self.lag_probes.items()):
+            if now - sent_at >= (self.keepalive_interval or 0):
+                del self.lag_probes[token]
+
+        if not self.lag_probes:
+            token = 'irctk-lag-{}'.format(next(self.labels))
+            self.lag_probes[token] = self.clock()
+            self.send_line('PING :{}'.format(token))
+
+        self.schedule_keepalive()
+
+    async def supervise(
+        self,
+        servers: List[Server],
+        initial_delay: float = 1.0,
+        maximum_delay: float = 300.0,
+    ) -> None:
+        """
+        Connects to the IRC server and reconnects whenever the connection is
+        lost until `quit()` is called. Reconnection attempts are delayed with
+        a jittered exponential backoff, trying the next server from the list
+        after every failed attempt.
+
+            >>> await client.supervise([Server('irc.example.com', 6697)])
+        """
+
+        self.is_supervised = True
+        index = 0
+        failures = 0
+
+        while self.is_supervised:
+            server = Server(*servers[index % len(servers)])
+            connected_at = self.clock()
+            await self.connect(server.host, server.port, server.use_tls)
+
+            if not self.is_supervised:
+                break
+
+            registered_at = self.reconnect_stats.get('last_registered_at')
+            if registered_at and registered_at >= connected_at:
+                failures = 0
+            else:
+                failures += 1
+                index += 1
+
+            delay = min(maximum_delay, initial_delay * 2 ** max(failures - 1, 0))
+            delay = random.uniform(delay / 2, delay)
+            self.reconnect_stats['last_backoff'] = delay
+
+            self.logger.info('Reconnecting in {:.1f} seconds'.format(delay))
+            await asyncio.sleep(delay)
+
+    def rejoin_channels(self) -> None:
+        """
+        Joins the channels which were joined when the connection was lost.
+        Channels which can no longer be joined are left.
+        """
+
+        channels = self.channels_to_rejoin
+        self.channels_to_rejoin = []
+        if not channels:
+            return
+
+        futures = self.join_many([(channel.name, channel.key) for channel in channels])
+
+        for channel in channels:
+
+            def rejoined(future: asyncio.Future, channel: Channel = channel) -> None:
+                if future.cancelled() or future.exception():
+                    channel.leave()
+                else:
+                    # Modes may have changed while disconnected
+                    self.send(Command.MODE, channel.name)
+
+            futures[channel.name].add_done_callback(rejoined)
+
+    # WHOX
+
+    def enrich_channel(self, channel: Channel) -> None:
+        """
+        Queues a WHOX query for the ident, host, account, away status and
+        real name of every member of a channel. Queries are sent one at a
+        time, at most every `whox_interval` seconds.
+        """
+
+        if channel not in self.whox_queue and channel is not self.whox_channel:
+            self.whox_queue.append(channel)
+            self.schedule_whox()
+
+    def schedule_whox(self) -> None:
+        if self.whox_channel or self.whox_timer or not self.whox_queue:
+            return
+
+        delay = 0.0
+        if self.whox_sent_at is not None:
+            delay = self.whox_sent_at + self.whox_interval - self.clock()
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+        if delay > 0 and loop:
+            self.whox_timer = loop.call_later(delay, self.send_whox)
+        else:
+            self.send_whox()
+
+    def send_whox(self) -> None:
+        self.whox_timer = None
+
+        while self.whox_queue:
+            channel = self.whox_queue.pop(0)
+            if channel.is_attached and channel in self.channels:
+                break
+        else:
+            return
+
+        # Tokens are at most three digits
+        self.whox_token = str(next(self.whox_tokens) % 1000)
+        self.whox_channel = channel
+        self.whox_members = None
+        self.whox_sent_at = self.clock()
+
+        message = Message(
+            command='WHO',
+            parameters=[channel.name, '%tcuhnfar,{}'.format(self.whox_token)],
+        )
+        self.send(message)
+
+        # The next query is sent once RPL_ENDOFWHO is received, or once the
+        # query has timed out
+        request = self.add_request(self.whox_requests, self.whox_token, message)
+        request.future.add_done_callback(
+            functools.partial(self.whox_done, self.whox_token)
+        )
+
+    def whox_done(self, token: str, future: asyncio.Future) -> None:
+        if future.cancelled() or token != self.whox_token:
+            return
+
+        exception = future.exception()
+        if exception and self.whox_channel:
+            self.logger.warning(
+                'WHOX query for {} failed: {!r}'.format(self.whox_channel, exception)
+            )
+
+        self.end_whox()
+
+    def end_whox(self) -> None:
+        self.whox_token = None
+        self.whox_channel = None
+        self.whox_members = None
+        self.schedule_whox()
 
     # Variables
 
@@ -115,6 +769,20 @@ class Client:
     def get_alt_nickname(self) -> str:
         return self.nickname + '_'
 
+    def get_alt_nicknames(self) -> List[str]:
+        """
+        Returns the nicknames to try in order while registering when the
+        nickname is in use or rejected by the server.
+        """
+
+        nickname = self.get_nickname()
+        alternatives = [self.get_alt_nickname(), nickname + '__']
+
+        # Within the RFC 1459 limit of 9 characters, in case the nickname
+        # was rejected for being too long
+        alternatives += ['{}{}'.format(nickname[:8], i) for i in range(1, 10)]
+        return alternatives
+
     def get_ident(self) -> str:
         return self.ident
 
@@ -127,44 +795,49 @@ class Client:
     # CAP
 
     def supports_cap(self, cap: str) -> bool:
-        return cap in ['account-tag', 'multi-prefix', 'server-time', 'message-tags']
+        if cap == 'sasl':
+            # Servers may advertise the mechanisms they support
+            mechanisms = self.caps.get('sasl')
+            return self.sasl is not None and (
+                not mechanisms or self.sasl.name in mechanisms.split(',')
+            )
+
+        return cap in [
+            'account-notify',
+            'account-tag',
+            'away-notify',
+            'batch',
+            'cap-notify',
+            'chghost',
+            'extended-join',
+            'labeled-response',
+            'multi-prefix',
+            'server-time',
+            'message-tags',
+            'setname',
+            'userhost-in-names',
+        ]
 
     # Support
 
-    def irc_equal(self, lhs: str, rhs: str) -> bool:
+    def irc_lower(self, value: str) -> str:
         """
-        Determine if two strings are IRC equal.
+        Returns the lowercase form of a string using the servers case mapping.
         """
 
-        if self.isupport.case_mapping == 'rfc1459':
-
-            def to_lower(value: str) -> str:
-                return (
-                    value.lower().replace('[', '{').replace(']', '}').replace('\\', '|')
-                )
-
-        elif self.isupport.case_mapping == 'rfc1459-strict':
-
-            def to_lower(value: str) -> str:
-                return (
-                    value.lower()
-                    .replace('[', '{')
-                    .replace(']', '}')
-                    .replace('\\', '|')
-                    .replace('^', '~')
-                )
+        table = CASE_MAPPING_TABLES.get(self.isupport.case_mapping)
+        if table:
+            return value.lower().translate(table)
 
-        elif self.isupport.case_mapping == 'ascii':
+        # ascii or unknown case mapping
+        return value.lower()
 
-            def to_lower(value: str) -> str:
-                return value.lower()
-
-        else:
-            # Unknown case mapping
-            def to_lower(value: str) -> str:
-                return value.lower()
+    def irc_equal(self, lhs: str, rhs: str) -> bool:
+        """
+        Determine if two strings are IRC equal.
+        """
 
-        return to_lower(lhs) == to_lower(rhs)
+        return self.irc_lower(lhs) == self.irc_lower(rhs)
 
     # Channels
 
@@ -200,8 +873,12 @@ class Client:
         Disconnects from IRC and closes the connection. Accepts an optional
         reason.
         """
+        self.is_supervised = False
         self.send("QUIT", message)
-        self.writer.close()
+
+        writer = getattr(self, 'writer', None)
+        if writer:
+            writer.close()
 
     def send_privmsg(self, target, message: str) -> None:
         """
@@ -239,6 +916,112 @@ class Client:
         else:
             self.send_line('{} {}'.format(Command.JOIN, channel))
 
+    def join_many(
+        self,
+        channels_with_keys: Union[
+            Mapping[str, Optional[str]], Iterable[Union[str, Tuple[str, Optional[str]]]]
+        ],
+    ) -> Dict[str, asyncio.Future]:
+        """
+        Joins many channels using as few JOIN commands as possible. Returns a
+        future for every channel which resolves to the `Channel` once it has
+        been joined and the names list has been received, or fails when the
+        server refuses the join.
+
+        Channels which would exceed the servers CHANLIMIT are not sent and
+        their future fails immediately.
+
+            >>> futures = client.join_many(['#palaver', ('#secret', 'key')])
+            >>> channel = await futures['#palaver']
+        """
+
+        if isinstance(channels_with_keys, Mapping):
+            items: Iterable = channels_with_keys.items()
+        else:
+            items = channels_with_keys
+
+        loop = asyncio.get_event_loop()
+        futures: Dict[str, asyncio.Future] = {}
+        keyed: List[Tuple[str, str]] = []
+        keyless: List[Tuple[str, str]] = []
+
+        joined: Dict[str, int] = {}
+        for attached in self.channels:
+            if attached.is_attached:
+                joined[attached.name[:1]] = joined.get(attached.name[:1], 0) + 1
+        for request in self.joins.values():
+            name = request.message.parameters[0]
+            joined[name[:1]] = joined.get(name[:1], 0) + 1
+
+        limits = self.isupport.channel_limits
+
+        for item in items:
+            if isinstance(item, str):
+                name, key = item, None
+            else:
+                name, key = item
+
+            existing = self.joins.get(self.irc_lower(name))
+            if existing:
+                futures[name] = existing.future
+                continue
+
+            channel = self.find_channel(name)
+            if channel and channel.is_attached:
+                futures[name] = loop.create_future()
+                futures[name].set_result(channel)
+                continue
+
+            exceeds_limit = any(
+                limit is not None
+                and name[:1] in prefixes
+                and sum(joined.get(prefix, 0) for prefix in prefixes) >= limit
+                for prefixes, limit in limits.items()
+            )
+            if exceeds_limit:
+                futures[name] = loop.create_future()
+                futures[name].set_exception(
+                    Exception('CHANLIMIT reached, cannot join {}'.format(name))
+                )
+                continue
+
+            joined[name[:1]] = joined.get(name[:1], 0) + 1
+
+            parameters = [name, key] if key else [name]
+            message = Message(command=str(Command.JOIN), parameters=parameters)
+            futures[name] = self.add_request(
+                self.joins, self.irc_lower(name), message
+            ).future
+
+            if key:
+                keyed.append((name, key))
+            else:
+                keyless.append((name, ''))
+
+        # Channels with keys must come first as keys are matched positionally
+        def join_message(names: List[str], keys: List[str]) -> Message:
+            parameters = [','.join(names)]
+            if keys:
+                parameters.append(','.join(keys))
+            return Message(command=str(Command.JOIN), parameters=parameters)
+
+        names: List[str] = []
+        keys: List[str] = []
+        for name, key in keyed + keyless:
+            candidate = join_message(names + [name], keys + [key] if key else keys)
+            if names and len(bytes(candidate)) > MAXIMUM_LINE_LENGTH:
+                self.send(join_message(names, keys))
+                names, keys = [], []
+
+            names.append(name)
+            if key:
+                keys.append(key)
+
+        if names:
+            self.send(join_message(names, keys))
+
+        return futures
+
     def send_part(self, channel) -> None:
         """
         Sends a PART channel command.
@@ -256,19 +1039,43 @@ class Client:
 
             >>> client.send_line('PRIVMSG kylef :Hey!')
         """
-        self.logger.debug('C: {}'.format(line))
-        self.writer.write('{}\r\n'.format(line).encode('utf-8'))
+        if self.trace:
+            self.trace.record_sent(line)
+        data = '{}\r\n'.format(line).encode('utf-8')
+        if self.metrics:
+            self.metrics.record_sent(line, len(data))
+        if self.journal:
+            self.journal.append(SENT, data[:-2])
+        self.writer.write(data)
 
     def send(
         self,
         message_or_command: Union[str, Command, Message],
         *parameters,
-        colon: bool = False
+        colon: bool = False,
+        timeout: Optional[float] = None,
+        stream: bool = False,
+        buffer: Optional[bool] = None
     ):
         """
         Send an IRC message
 
         >>> client.send('JOIN', '#example')
+
+        When a response to the message can be awaited a future is returned.
+        The future fails with a `TimeoutError` after `timeout` seconds,
+        defaulting to the clients `request_timeout`.
+
+        Passing `stream` for a labeled message returns a `MessageStream`
+        instead, yielding each message of the response as it arrives.
+
+        The messages of a batched response to a labeled message are
+        dispatched as they arrive. Passing `buffer` keeps the messages of
+        the batch and resolves the future with them, otherwise the future
+        resolves with None once the batch has ended. Responses to messages
+        labeled by the caller are buffered unless `buffer` is False.
+
+        >>> messages = await client.send('WHO', '#example', buffer=True)
         """
 
         if isinstance(message_or_command, Message):
@@ -285,26 +1092,251 @@ class Client:
             )
             message.colon = colon
 
+        is_auto_labeled = (
+            message.label is None
+            and 'labeled-response' in self.cap_accepted
+            and message.command not in ('CAP', 'PONG', 'QUIT', 'AUTHENTICATE')
+        )
+        if is_auto_labeled:
+            message.tags.append(
+                MessageTag(name='label', value='irctk{}'.format(next(self.labels)))
+            )
+
+        if stream and not message.label:
+            raise ValueError('Only labeled messages can be streamed')
+
+        if buffer and not message.label:
+            raise ValueError('Only labeled messages can be buffered')
+
+        if buffer is None:
+            buffer = message.label is not None and not is_auto_labeled
+
         self.send_line(str(message))
 
         if message.label:
-            loop = asyncio.get_event_loop()
-            future = loop.create_future()
+            request = self.add_request(
+                self.requests, message.label, message, timeout, stream, buffer
+            )
+            future = request.future
+
+            if is_auto_labeled:
+                # Nobody may be awaiting a response to an automatically
+                # labeled message, retrieve the exception so a timeout or
+                # disconnection is not reported as never retrieved.
+                future.add_done_callback(
+                    lambda future: future.cancelled() or future.exception()
+                )
 
-            self.requests.append(Request(message=message, future=future))
-            return future
+            return request.stream or future
 
         if message.command == 'NICK':
-            loop = asyncio.get_event_loop()
-            future = loop.create_future()
-            self.requests.append(Request(message=message, future=future))
-            return future
+            return self.add_request(
+                self.nick_requests,
+                self.irc_lower(message.get(0) or ''),
+                message,
+                timeout,
+            ).future
 
         return None
 
+    # Requests
+
+    def add_request(
+        self,
+        requests: Dict[str, Request],
+        key: str,
+        message: Message,
+        timeout: Optional[float] = None,
+        stream: bool = False,
+        buffer: bool = False,
+    ) -> Request:
+        """
+        Adds a pending request to the given request table. The requests
+        future fails with a `TimeoutError` when no response arrives within
+        `timeout` (or `request_timeout`) seconds.
+        """
+
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+
+        if timeout is None:
+            timeout = self.request_timeout
+
+        handle = None
+        if timeout is not None:
+            handle = loop.call_later(
+                timeout, self.expire_request, requests, key, future
+            )
+
+        previous = requests.get(key)
+        if previous and previous.timeout:
+            previous.timeout.cancel()
+
+        request = Request(
+            message=message,
+            future=future,
+            timeout=handle,
+            stream=(
+                MessageStream(key, future, self.max_stream_messages) if stream else None
+            ),
+            buffer=buffer,
+        )
+        requests[key] = request
+        return request
+
+    def pop_request(self, requests: Dict[str, Request], key: str) -> Optional[Request]:
+        request = requests.pop(key, None)
+        if request and request.timeout:
+            request.timeout.cancel()
+
+        return request
+
+    def resolve_request(
+        self, requests: Dict[str, Request], key: str, result: Any
+    ) -> None:
+        request = self.pop_request(requests, key)
+        if request and not request.future.done():
+            request.future.set_result(result)
+
+    def reject_request(
+        self, requests: Dict[str, Request], key: str, exception: BaseException
+    ) -> None:
+        request = self.pop_request(requests, key)
+        if request and not request.future.done():
+            request.future.set_exception(exception)
+
+    def expire_request(
+        self, requests: Dict[str, Request], key: str, future: asyncio.Future
+    ) -> None:
+        request = requests.get(key)
+        if request and request.future is future:
+            del requests[key]
+
+            if not future.done():
+                future.set_exception(
+                    asyncio.TimeoutError(
+                        'No response to {}'.format(request.message.command)
+                    )
+                )
+
+    def fail_requests(self, exception: BaseException) -> None:
+        """
+        Fails every pending request, for example when disconnected.
+        """
+
+        for requests in (
+            self.requests,
+            self.nick_requests,
+            self.joins,
+            self.whox_requests,
+        ):
+            for key in list(requests):
+                self.reject_request(requests, key, exception)
+
+        self.streams.clear()
+
+    @property
+    def buffered_bytes(self) -> int:
+        """
+        Returns the number of bytes waiting to be written to the connection.
+        """
+
+        writer = getattr(self, 'writer', None)
+        if not writer or writer.transport.is_closing():
+            return 0
+
+        return writer.transport.get_write_buffer_size()
+
+    async def drain(self) -> None:
+        """
+        Waits until the outbound buffer has drained below the low-water mark
+        if it has grown beyond the high-water mark, otherwise returns
+        immediately.
+        """
+
+        writer = getattr(self, 'writer', None)
+        if writer and not writer.transport.is_closing():
+            await self.drain_writer(writer)
+
+    async def drain_writer(self, writer: asyncio.StreamWriter) -> None:
+        """
+        Waits for the writer to drain. Only one coroutine may wait for a
+        `StreamWriter` to drain at once on older versions of Python, so the
+        coroutines take turns.
+        """
+
+        if not self.drain_lock:
+            self.drain_lock = asyncio.Lock()
+
+        async with self.drain_lock:
+            await writer.drain()
+
+    async def send_async(
+        self,
+        message_or_command: Union[str, Command, Message],
+        *parameters,
+        colon: bool = False,
+        timeout: Optional[float] = None,
+        stream: bool = False
+    ):
+        """
+        Send an IRC message, waiting if the outbound buffer is above the
+        high-water mark. Use this when producing large amounts of output so
+        that the producer is slowed down to the speed of the connection.
+
+        >>> await client.send_async('PRIVMSG', '#example', 'Hello')
+        """
+
+        result = self.send(
+            message_or_command,
+            *parameters,
+            colon=colon,
+            timeout=timeout,
+            stream=stream,
+        )
+        await self.drain()
+        return result
+
+    @contextlib.asynccontextmanager
+    async def bulk_output(self):
+        """
+        Asynchronous context for sending bulk output. Upon exit waits until
+        all of the buffered output has been written to the connection.
+
+        >>> async with client.bulk_output():
+        ...     for line in lines:
+        ...         await client.send_async('PRIVMSG', '#example', line)
+        """
+
+        try:
+            yield self
+        finally:
+            writer = getattr(self, 'writer', None)
+            while writer and self.buffered_bytes > 0:
+                writer.transport.set_write_buffer_limits(high=0)
+                try:
+                    await self.drain_writer(writer)
+                finally:
+                    writer.transport.set_write_buffer_limits(
+                        high=self.write_high_water, low=self.write_low_water
+                    )
+
     def authenticate(self) -> None:
+        """
+        Starts registering the connection. Capability negotiation, the
+        password, nickname and user are sent at once, registration
+        completes once capabilities have been negotiated and any SASL
+        authentication has finished.
+        """
+
         if not self.is_registered:
-            self.send(Command.CAP, 'LS')
+            self.registration = Registration.NEGOTIATING
+            self.registration_started_at = self.clock()
+            self.time_to_registered = None
+            self.time_to_ready = None
+            self.alt_nicknames = self.get_alt_nicknames()
+
+            self.send(Command.CAP, 'LS', '302')
 
             password = self.get_password()
             if password:
@@ -326,12 +1358,12 @@ class Client:
         self.channel_add_membership(channel, Membership(nick))
 
     def channel_add_membership(self, channel: Channel, membership: Membership) -> None:
-        if self.channel_find_membership(channel, membership.nick):
-            return
-
         if self.irc_equal(membership.nick.nick, self.nick.nick):
             channel.is_attached = True
 
+        if self.channel_find_membership(channel, membership.nick):
+            return
+
         channel.members.append(membership)
 
     def channel_remove_nick(self, channel: Channel, nick: Nick) -> bool:
@@ -346,82 +1378,317 @@ class Client:
 
         return False
 
-    def channel_find_membership(
-        self, channel: Channel, nick: Nick
-    ) -> Optional[Membership]:
-        for membership in channel.members:
-            if self.irc_equal(membership.nick.nick, str(nick)):
-                return membership
+    def channel_find_membership(
+        self, channel: Channel, nick: Nick
+    ) -> Optional[Membership]:
+        for membership in channel.members:
+            if self.irc_equal(membership.nick.nick, str(nick)):
+                return membership
+
+        return None
+
+    # Handle IRC lines
+
+    def process_line(self, line: str) -> None:
+        self.process_message(Message.parse(line))
+
+    def process_message(self, message: Message, is_answered: bool = False) -> None:
+        """
+        Processes a message, dispatching it to modules. The message is not
+        handled by the client when it `is_answered` already.
+        """
+
+        if self.pending_netsplit and not (
+            message.command == 'QUIT' and message.get(0) == self.pending_netsplit[0]
+        ):
+            self.flush_netsplit()
+
+        try:
+            self.irc_raw(str(message))
+        except IRCIgnoreLine:
+            return
+
+        self.irc_message(message)
+
+        if not self.stream_message(message):
+            self.track_batch(message)
+
+        command = message.command.lower()
+        if not is_answered and hasattr(self, 'process_{}'.format(command)):
+            func = getattr(self, 'process_{}'.format(command))
+            if self.profiler:
+                self.profiler.call(func.__name__, func, message)
+            else:
+                func(message)
+
+        label = message.label
+        if label and message.command != 'BATCH':
+            if message.command == 'FAIL' or message.command[:1] in ('4', '5'):
+                self.reject_request(self.requests, label, Exception(message))
+            else:
+                self.resolve_request(self.requests, label, message)
+
+    # Batches
+
+    def add_batch_handler(
+        self, batch_type: str, on_message=None, on_complete=None
+    ) -> BatchHandler:
+        """
+        Registers a handler for batches of the given type.
+
+        When `on_message` is given, it is called with the client, the batch
+        and each message of the batch as they arrive and the messages of the
+        batch are not buffered. `on_complete` is called with the client and
+        the batch once the batch has ended, or once it has been discarded in
+        which case the batch is not complete.
+
+        Handlers for `netsplit` and `netjoin` batches are registered by
+        default to update channel memberships in bulk.
+
+            >>> client.add_batch_handler('chathistory', on_complete=history)
+        """
+
+        handler = BatchHandler(batch_type, on_message, on_complete)
+        self.batch_handlers[batch_type] = handler
+        return handler
+
+    def find_batch_stream(self, batch: Batch) -> Optional[Tuple[Batch, BatchHandler]]:
+        """
+        Returns the innermost batch (and its handler) which is streamed.
+        """
+
+        current: Optional[Batch] = batch
+        while current:
+            handler = self.batch_handlers.get(current.type or '')
+            if handler and handler.is_streaming:
+                return current, handler
+
+            current = current.parent
+
+        return None
+
+    def track_batch(self, message: Message) -> None:
+        if message.command == 'BATCH' and len(message.parameters) > 0:
+            if message.parameters[0].startswith('+'):
+                self.start_batch(message)
+            elif message.parameters[0].startswith('-'):
+                self.end_batch(message)
+        elif message.batch:
+            batch = self.batches.get(message.batch)
+            if batch:
+                self.add_batch_message(batch, message)
+
+    def add_batch_message(self, batch: Batch, message: Message) -> None:
+        stream = self.find_batch_stream(batch)
+        batch.append(message, buffer=stream is None and batch.is_buffered)
+
+        if stream:
+            stream[1].on_message(self, stream[0], message)
+        elif len(batch.messages) > self.max_batch_messages:
+            self.discard_batch(
+                batch, 'exceeded {} messages'.format(len(batch.messages))
+            )
+
+    def start_batch(self, message: Message) -> None:
+        self.expire_batches()
+
+        parent = self.batches.get(message.batch) if message.batch else None
+        batch = Batch(message, parent, self.clock())
+        self.batches[batch.reference_tag] = batch
+
+        if parent:
+            batch.is_buffered = parent.is_buffered
+        elif batch.label:
+            # The response to a labeled request is only buffered when asked
+            # for, the messages are dispatched either way
+            request = self.requests.get(batch.label)
+            batch.is_buffered = request is not None and request.buffer
+
+        handler = self.batch_handlers.get(batch.type or '')
+        if handler and handler.on_complete:
+            batch.is_buffered = True
+
+        if parent:
+            self.add_batch_message(parent, message)
+
+        stream = self.find_batch_stream(batch)
+        if stream and stream[0] is batch:
+            stream[1].on_message(self, batch, message)
+
+    def end_batch(self, message: Message) -> None:
+        batch = self.batches.pop(message.parameters[0][1:], None)
+        if not batch:
+            return
+
+        self.add_batch_message(batch, message)
+        if batch.is_closed:
+            # Discarded for exceeding the size limit
+            return
+
+        batch.is_closed = True
+        batch.is_complete = True
+
+        handler = self.batch_handlers.get(batch.type or '')
+        if handler and handler.on_complete:
+            handler.on_complete(self, batch)
+
+        label = batch.label
+        if label and not batch.parent:
+            self.resolve_request(
+                self.requests, label, list(batch) if batch.is_buffered else None
+            )
+
+    def discard_batch(self, batch: Batch, reason: str) -> None:
+        """
+        Stops tracking a batch along with its parent and nested batches,
+        failing any labeled request waiting for the batch.
+        """
+
+        root = batch.root
+        self.logger.warning(
+            'Discarding batch {}: {}'.format(root.reference_tag, reason)
+        )
+
+        for child in root.walk():
+            self.batches.pop(child.reference_tag, None)
+
+            if not child.is_closed:
+                child.is_closed = True
+
+                # Handlers see the incomplete batch so partial state is kept
+                handler = self.batch_handlers.get(child.type or '')
+                if handler and handler.on_complete:
+                    handler.on_complete(self, child)
+
+        if root.label:
+            self.reject_request(
+                self.requests, root.label, Exception('Batch {}'.format(reason))
+            )
+
+    def expire_batches(self) -> None:
+        if not self.batches:
+            return
+
+        now = self.clock()
+        for batch in list(self.batches.values()):
+            if batch.reference_tag not in self.batches:
+                # Already discarded along with a related batch
+                continue
+
+            age = now - batch.root.created_at
+            if age > self.max_batch_age:
+                self.discard_batch(batch, 'open for {:.0f} seconds'.format(age))
+
+    @property
+    def batch_stats(self) -> Dict[str, int]:
+        """
+        Returns the number of open batches and the number of messages and
+        estimated bytes buffered for them.
+        """
+
+        roots = {id(batch.root): batch.root for batch in self.batches.values()}
+        batches = [batch for root in roots.values() for batch in root.walk()]
+
+        return {
+            'open': len(self.batches),
+            'messages': sum(len(batch.messages) for batch in batches),
+            'bytes': sum(batch.size for batch in batches),
+        }
+
+    def stream_message(self, message: Message) -> bool:
+        """
+        Forwards a message to the stream of a pending streamed request.
+        Returns True when the message belonged to a stream.
+        """
+
+        is_batch = message.command == 'BATCH' and len(message.parameters) > 0
+        is_batch_start = is_batch and message.parameters[0].startswith('+')
+        is_batch_end = is_batch and message.parameters[0].startswith('-')
+        reference_tag = message.parameters[0][1:] if is_batch else ''
 
-        return None
+        if is_batch_end:
+            stream = self.streams.pop(reference_tag, None)
+            if stream:
+                stream.put(message)
 
-    # Handle IRC lines
+                if stream.batch == reference_tag:
+                    self.resolve_request(self.requests, stream.label, None)
 
-    def process_line(self, line: str) -> None:
-        self.process_message(Message.parse(line))
+            return stream is not None
 
-    def process_message(self, message: Message) -> None:
-        try:
-            self.irc_raw(str(message))
-        except IRCIgnoreLine:
-            return
+        stream = self.streams.get(message.batch) if message.batch else None
 
-        self.irc_message(message)
+        if not stream and message.label and message.label in self.requests:
+            request = self.requests[message.label]
+            stream = request.stream
 
-        if message.command == 'BATCH' and len(message.parameters) > 0:
-            if message.parameters[0].startswith('+'):
-                reference_tag = message.parameters[0][1:]
-                self.batches[reference_tag] = [message]
-            elif message.parameters[0].startswith('-'):
-                reference_tag = message.parameters[0][1:]
+            if stream and not is_batch_start:
+                # Response without a batch
+                stream.put(message)
+                self.resolve_request(self.requests, message.label, None)
+                return True
 
-                if reference_tag in self.batches:
-                    batch = self.batches[reference_tag]
-                    batch.append(message)
-                    del self.batches[reference_tag]
+            if stream:
+                stream.batch = reference_tag
 
-                    label = batch[0].label
-                    for request in self.requests:
-                        if request.message.label == label:
-                            self.requests.remove(request)
-                            request.future.set_result(batch)
-                            break
+                if request.timeout:
+                    # The response has started, it may take as long as needed
+                    request.timeout.cancel()
 
-        batch_tag = message.batch
-        if batch_tag and batch_tag in self.batches:
-            self.batches[batch_tag].append(message)
+        if not stream:
+            return False
 
-        command = message.command.lower()
-        if hasattr(self, 'process_{}'.format(command)):
-            func = getattr(self, 'process_{}'.format(command))
-            func(message)
+        if is_batch_start:
+            # Nested batches are streamed along with their parent
+            self.streams[reference_tag] = stream
 
-        label = message.label
-        if label and message.command != 'BATCH':
-            for request in self.requests:
-                if request.message.label == label:
-                    self.requests.remove(request)
-                    request.future.set_result(message)
+        stream.put(message)
+        return True
 
     def process_001(self, message: Message) -> None:
         self.is_registered = True
+        self.registration = Registration.REGISTERED
         self.nick.nick = message.parameters[0]
 
-        for request in self.requests:
-            if (
-                request.message.command == 'NICK'
-                and request.message.label is None
-                and len(request.message.parameters) > 0
-                and self.irc_equal(self.nick.nick, request.message.parameters[0])
-            ):
-                self.requests.remove(request)
-                request.future.set_result(message)
+        self.resolve_request(
+            self.nick_requests, self.irc_lower(self.nick.nick), message
+        )
 
         self.send(Command.WHO, self.nick)
+
+        now = self.clock()
+        if self.registration_started_at is not None:
+            self.time_to_registered = now - self.registration_started_at
+
+        self.reconnect_stats['last_registered_at'] = now
+        if self.disconnected_at is not None:
+            self.reconnect_stats['reconnects'] += 1
+            self.reconnect_stats['last_reconnect_duration'] = now - self.disconnected_at
+            self.disconnected_at = None
+
+        self.rejoin_channels()
         self.irc_registered()
 
+    # RPL_ENDOFMOTD
+    def process_376(self, message: Message) -> None:
+        if self.registration != Registration.REGISTERED:
+            return
+
+        self.registration = Registration.READY
+        if self.registration_started_at is not None:
+            self.time_to_ready = self.clock() - self.registration_started_at
+
+    # ERR_NOMOTD
+    def process_422(self, message: Message) -> None:
+        self.process_376(message)
+
     def process_005(self, message: Message) -> None:
-        self.isupport.parse(message.parameters[1])
+        # Each token is a parameter, followed by a description of them
+        tokens = message.parameters[1:]
+        if len(tokens) > 1:
+            tokens = tokens[:-1]
+
+        self.isupport.parse(' '.join(tokens))
 
     def process_324(self, message: Message) -> None:  # MODE
         channel = self.find_channel(message.get(1))
@@ -457,6 +1724,53 @@ class Client:
             self.nick.ident = message.get(2)
             self.nick.host = message.get(3)
 
+    # RPL_ENDOFWHO
+    def process_315(self, message: Message) -> None:
+        if self.whox_channel and self.irc_equal(
+            self.whox_channel.name, message.get(1) or ''
+        ):
+            if self.whox_token:
+                self.resolve_request(
+                    self.whox_requests, self.whox_token, self.whox_channel
+                )
+
+            self.end_whox()
+
+    # RPL_WHOSPCRPL
+    def process_354(self, message: Message) -> None:
+        # Replies to `%tcuhnfar`, the fields are always in this order
+        if (
+            not self.whox_channel
+            or message.get(1) != self.whox_token
+            or len(message.parameters) < 9
+        ):
+            return
+
+        ident, host, nickname, flags, account, realname = message.parameters[3:9]
+
+        if self.whox_members is None:
+            # Replies arrive after NAMES, index the members once for the
+            # replies which follow
+            self.whox_members = {
+                self.irc_lower(membership.nick.nick): membership
+                for membership in self.whox_channel.members
+            }
+
+        membership = self.whox_members.get(self.irc_lower(nickname))
+        if not membership:
+            return
+
+        nick = membership.nick
+        nick.ident = ident
+        nick.host = host
+        nick.account = None if account == '0' else account
+        nick.realname = realname
+        nick.is_away = flags.startswith('G')
+
+        if self.irc_equal(self.nick.nick, nickname):
+            self.nick.ident = ident
+            self.nick.host = host
+
     def process_432(self, message: Message) -> None:
         # Erroneous Nickname: Illegal characters
         self.process_433(message)
@@ -468,21 +1782,20 @@ class Client:
     def process_433(self, message: Message) -> None:
         # Nickname is already in use
         if not self.is_registered:
-            self.send(Command.NICK, self.get_alt_nickname())
+            if self.alt_nicknames:
+                nickname = self.alt_nicknames.pop(0)
+            else:
+                nickname = '{}{}'.format(
+                    self.get_nickname()[:5], random.randint(1000, 9999)
+                )
+
+            self.send(Command.NICK, nickname)
 
         if len(message.parameters) > 1:
             nick = message.parameters[1]
-
-            for request in self.requests:
-                if (
-                    request.message.command == 'NICK'
-                    and request.message.label is None
-                    and len(request.message.parameters) > 0
-                    and self.irc_equal(nick, request.message.parameters[0])
-                ):
-                    self.requests.remove(request)
-                    request.future.set_exception(Exception(message))
-                    break
+            self.reject_request(
+                self.nick_requests, self.irc_lower(nick), Exception(message)
+            )
 
     def names_353_to_membership(self, nick: str) -> Membership:
         for mode, prefix in self.isupport['prefix'].items():
@@ -501,61 +1814,289 @@ class Client:
         channel = self.find_channel(message.get(2))
         users = message.get(3)
         if channel and users:
+            key = self.irc_lower(channel.name)
+            if key not in self.names:
+                members = {
+                    self.irc_lower(membership.nick.nick): membership
+                    for membership in channel.members
+                }
+                self.names[key] = (members, set())
+
+            members, seen = self.names[key]
+
             for user in users.split():
                 membership = self.names_353_to_membership(user)
-                self.channel_add_membership(channel, membership)
+                nickname = self.irc_lower(membership.nick.nick)
+                seen.add(nickname)
+
+                if nickname == self.irc_lower(self.nick.nick):
+                    channel.is_attached = True
+
+                existing = members.get(nickname)
+                if existing:
+                    # NAMES is authoritative for the members modes, and
+                    # their ident and host with userhost-in-names
+                    existing.modes = membership.modes
+                    if membership.nick.host:
+                        existing.nick.ident = membership.nick.ident
+                        existing.nick.host = membership.nick.host
+                else:
+                    members[nickname] = membership
+                    channel.members.append(membership)
+
+    def process_366(self, message: Message) -> None:
+        # End of NAMES, the channel is now fully joined
+        channel = self.find_channel(message.get(1))
+
+        if channel and self.irc_lower(channel.name) in self.names:
+            # Reconcile members who are no longer present, such as after
+            # rejoining a channel.
+            _, seen = self.names.pop(self.irc_lower(channel.name))
+            channel.members = [
+                membership
+                for membership in channel.members
+                if self.irc_lower(membership.nick.nick) in seen
+            ]
+
+        if channel and channel.is_attached:
+            self.resolve_request(self.joins, self.irc_lower(channel.name), channel)
+
+    def fail_join_request(self, message: Message) -> None:
+        channel_name = message.get(1)
+        if not channel_name:
+            return
+
+        self.reject_request(
+            self.joins, self.irc_lower(channel_name), Exception(message)
+        )
+
+    def process_405(self, message: Message) -> None:
+        # You have joined too many channels
+        self.fail_join_request(message)
+
+    def process_471(self, message: Message) -> None:
+        # Channel is full
+        self.fail_join_request(message)
+
+    def process_473(self, message: Message) -> None:
+        # Invite only channel
+        self.fail_join_request(message)
+
+    def process_474(self, message: Message) -> None:
+        # Banned from channel
+        self.fail_join_request(message)
+
+    def process_475(self, message: Message) -> None:
+        # Bad channel key
+        self.fail_join_request(message)
 
     def process_431(self, message: Message) -> None:
-        for request in self.requests:
-            if (
-                request.message.command == 'NICK'
-                and request.message.label is None
-                and len(request.message.parameters) == 0
-            ):
-                self.requests.remove(request)
-                request.future.set_exception(Exception(message))
-                break
+        self.reject_request(self.nick_requests, '', Exception(message))
 
     def process_ping(self, message: Message) -> None:
         self.send(Command.PONG, ' '.join(message.parameters))
 
+    def process_pong(self, message: Message) -> None:
+        if not message.parameters:
+            return
+
+        sent_at = self.lag_probes.pop(message.parameters[-1], None)
+        if sent_at is not None:
+            self.lag.observe(self.clock() - sent_at)
+
+    def request_caps(self, caps: List[str]) -> None:
+        """
+        Requests the given capabilities in as few `CAP REQ` lines as fit
+        within the maximum line length.
+        """
+
+        # The server acknowledges or rejects each REQ as a whole
+        limit = MAXIMUM_LINE_LENGTH - len('CAP REQ :\r\n')
+        request: List[str] = []
+        length = 0
+
+        for cap in caps:
+            if request and length + 1 + len(cap) > limit:
+                self.send(Command.CAP, 'REQ', ' '.join(request))
+                request = []
+
+            length = len(cap) if not request else length + 1 + len(cap)
+            request.append(cap)
+            self.cap_pending.append(cap)
+
+        if request:
+            self.send(Command.CAP, 'REQ', ' '.join(request))
+
     def process_cap(self, message: Message) -> None:
         command = message.get(1)
         param2 = message.get(2)
         if not param2:
             return
 
-        if command == 'LS':
-            supported_caps = param2.split()
+        if command in ('LS', 'NEW'):
+            # Multiline replies mark each page but the last with `*`
+            is_final = param2 != '*'
+            caps = param2 if is_final else message.get(3) or ''
+
+            for cap in caps.split():
+                name, _, value = cap.partition('=')
+                self.caps[name] = value or None
+
+                if (
+                    self.supports_cap(name)
+                    and name not in self.cap_accepted
+                    and name not in self.cap_pending
+                    and name not in self.cap_wanted
+                ):
+                    self.cap_wanted.append(name)
+
+            if not is_final:
+                return
 
-            for cap in supported_caps:
-                if self.supports_cap(cap):
-                    self.send('CAP', 'REQ', cap)
-                    self.cap_pending.append(cap)
+            wanted, self.cap_wanted = self.cap_wanted, []
+            self.request_caps(wanted)
         elif command == 'ACK':
-            caps = param2.split()
+            for cap in param2.split():
+                if cap.startswith('-'):
+                    cap = cap[1:]
+                    if cap in self.cap_accepted:
+                        self.cap_accepted.remove(cap)
+                elif cap not in self.cap_accepted:
+                    self.cap_accepted.append(cap)
 
-            for cap in caps:
                 if cap in self.cap_pending:
                     self.cap_pending.remove(cap)
-                    self.cap_accepted.append(cap)
         elif command == 'NAK':
-            supported_caps = param2.split()
-
-            for cap in supported_caps:
+            for cap in param2.split():
                 if cap in self.cap_pending:
                     self.cap_pending.remove(cap)
+        elif command == 'DEL':
+            for cap in param2.split():
+                self.caps.pop(cap, None)
+                if cap in self.cap_accepted:
+                    self.cap_accepted.remove(cap)
+        else:
+            return
+
+        if not self.cap_pending and self.registration == Registration.NEGOTIATING:
+            if self.sasl and 'sasl' in self.cap_accepted:
+                self.start_sasl()
+            else:
+                self.end_cap()
+
+    def end_cap(self) -> None:
+        self.registration = Registration.REGISTERING
+        self.send(Command.CAP, 'END')
+
+    # SASL
+
+    def start_sasl(self) -> None:
+        assert self.sasl
+
+        self.registration = Registration.AUTHENTICATING
+        self.sasl.reset()
+        self.sasl_buffer = ''
+        self.send(Command.AUTHENTICATE, self.sasl.name)
+
+    def process_authenticate(self, message: Message) -> None:
+        if not self.sasl or self.registration != Registration.AUTHENTICATING:
+            return
+
+        chunk = message.get(0) or ''
+        if chunk != '+':
+            self.sasl_buffer += chunk
+
+        # Challenges are split into chunks of 400 bytes
+        if len(chunk) == 400:
+            return
+
+        data, self.sasl_buffer = self.sasl_buffer, ''
+        try:
+            challenge = base64.b64decode(data, validate=True)
+        except binascii.Error:
+            self.abort_sasl('Invalid SASL challenge')
+            return
+
+        if self.sasl.expensive:
+            future = self.offload(self.sasl.respond, challenge, key='sasl')
+            future.add_done_callback(self.sasl_responded)
+            return
+
+        try:
+            response = self.sasl.respond(challenge)
+        except SASLError as error:
+            self.abort_sasl(str(error))
+            return
+
+        self.send_sasl_response(response)
+
+    def sasl_responded(self, future: asyncio.Future) -> None:
+        if future.cancelled() or self.registration != Registration.AUTHENTICATING:
+            return
+
+        exception = future.exception()
+        if exception:
+            self.abort_sasl(str(exception))
+        else:
+            self.send_sasl_response(future.result())
+
+    def send_sasl_response(self, response: bytes) -> None:
+        encoded = base64.b64encode(response).decode('ascii')
+        for index in range(0, len(encoded), 400):
+            self.send(Command.AUTHENTICATE, encoded[index : index + 400])
+
+        # An empty chunk marks the end of a response which is empty or an
+        # exact multiple of the chunk size
+        if len(encoded) % 400 == 0:
+            self.send(Command.AUTHENTICATE, '+')
+
+    def abort_sasl(self, reason: str) -> None:
+        self.logger.warning('Aborting SASL authentication: {}'.format(reason))
+        self.send(Command.AUTHENTICATE, '*')
+
+    def sasl_finished(self) -> None:
+        if self.registration == Registration.AUTHENTICATING:
+            self.end_cap()
 
-        if not self.cap_pending:
-            self.send(Command.CAP, 'END')
+    # RPL_LOGGEDIN
+    def process_900(self, message: Message) -> None:
+        self.account = message.get(2)
+
+    # RPL_LOGGEDOUT
+    def process_901(self, message: Message) -> None:
+        self.account = None
+
+    # RPL_SASLSUCCESS
+    def process_903(self, message: Message) -> None:
+        self.sasl_finished()
+
+    def process_902(self, message: Message) -> None:
+        # Nick locked
+        self.process_904(message)
+
+    def process_904(self, message: Message) -> None:
+        # Authentication failed, registration continues without an account
+        self.logger.warning('SASL authentication failed: {}'.format(message))
+        self.sasl_finished()
+
+    def process_905(self, message: Message) -> None:
+        # Message too long
+        self.process_904(message)
+
+    def process_906(self, message: Message) -> None:
+        # Authentication aborted
+        self.process_904(message)
+
+    def process_907(self, message: Message) -> None:
+        # Already authenticated
+        self.process_904(message)
 
     def process_join(self, message: Message) -> None:
         channel_name = message.get(0)
-        if not channel_name:
+        if not channel_name or self.is_in_batch(message, 'netjoin'):
             return
 
-        assert message.prefix
-        nick = self.nick_class.parse(message.prefix)
+        nick = self.join_nick(message)
         channel = self.find_channel(channel_name)
 
         if not channel and self.irc_equal(self.nick.nick, nick.nick):
@@ -563,8 +2104,29 @@ class Client:
 
         if channel:
             self.channel_add_nick(channel, nick)
+
+            if self.irc_equal(self.nick.nick, nick.nick):
+                request = self.joins.get(self.irc_lower(channel.name))
+                if request and len(request.message.parameters) > 1:
+                    channel.key = request.message.parameters[1]
+
+                if self.isupport.whox:
+                    self.enrich_channel(channel)
+
             self.irc_channel_join(nick, channel)
 
+    def join_nick(self, message: Message) -> Nick:
+        assert message.prefix
+        nick = self.nick_class.parse(message.prefix)
+
+        if len(message.parameters) > 2:
+            # extended-join includes the account and real name
+            account = message.parameters[1]
+            nick.account = None if account == '*' else account
+            nick.realname = message.parameters[2]
+
+        return nick
+
     def process_part(self, message: Message) -> None:
         channel = self.find_channel(message.get(0))
         if channel:
@@ -613,16 +2175,66 @@ class Client:
                 if self.irc_equal(membership.nick.nick, nick.nick):
                     membership.nick.nick = new_nick
 
-        for request in self.requests:
-            if (
-                request.message.command == 'NICK'
-                and request.message.label is None
-                and len(request.message.parameters) > 0
-                and self.irc_equal(new_nick, request.message.parameters[0])
-            ):
-                self.requests.remove(request)
-                request.future.set_result(message)
-                break
+        self.resolve_request(self.nick_requests, self.irc_lower(new_nick), message)
+
+    # State of nicks
+
+    def find_nicks(self, nickname: str) -> List[Nick]:
+        """
+        Returns every tracked instance of a nick, the clients own nick and
+        the nick of each of its memberships.
+        """
+
+        nicks = [
+            membership.nick
+            for channel in self.channels
+            for membership in channel.members
+            if self.irc_equal(membership.nick.nick, nickname)
+        ]
+
+        if self.irc_equal(self.nick.nick, nickname):
+            nicks.append(self.nick)
+
+        return nicks
+
+    def process_account(self, message: Message) -> None:
+        # account-notify
+        account = message.get(0)
+        if not message.prefix or not account:
+            return
+
+        nickname = self.nick_class.parse(message.prefix).nick
+        for nick in self.find_nicks(nickname):
+            nick.account = None if account == '*' else account
+
+        if self.irc_equal(self.nick.nick, nickname):
+            self.account = self.nick.account
+
+    def process_away(self, message: Message) -> None:
+        # away-notify, the reason is omitted once the user is back
+        if not message.prefix:
+            return
+
+        for nick in self.find_nicks(self.nick_class.parse(message.prefix).nick):
+            nick.is_away = bool(message.get(0))
+
+    def process_chghost(self, message: Message) -> None:
+        ident = message.get(0)
+        host = message.get(1)
+        if not message.prefix or not ident or not host:
+            return
+
+        for nick in self.find_nicks(self.nick_class.parse(message.prefix).nick):
+            nick.ident = ident
+            nick.host = host
+
+    def process_setname(self, message: Message) -> None:
+        realname = message.get(0)
+        if not message.prefix or realname is None:
+            return
+
+        for nick in self.find_nicks(self.nick_class.parse(message.prefix).nick):
+            nick.realname = realname
 
     def process_privmsg(self, message: Message) -> None:
         assert message.prefix
@@ -654,10 +2266,112 @@ class Client:
         nick = self.nick_class.parse(message.prefix)
         reason = message.get(0)
 
+        if self.is_in_batch(message, 'netsplit'):
+            # Handled in bulk once the batch has ended
+            return
+
+        if reason and NETSPLIT_REASON_REGEX.match(reason):
+            if not self.pending_netsplit:
+                self.pending_netsplit = (reason, [])
+
+                try:
+                    asyncio.get_running_loop().call_soon(self.flush_netsplit)
+                except RuntimeError:
+                    pass
+
+            self.pending_netsplit[1].append(nick)
+            return
+
         for channel in self.channels:
             if self.channel_remove_nick(channel, nick):
                 self.irc_channel_quit(nick, channel, reason)
 
+    # Netsplits
+
+    def is_in_batch(self, message: Message, batch_type: str) -> bool:
+        batch = self.batches.get(message.batch) if message.batch else None
+        return batch is not None and batch.type == batch_type
+
+    def flush_netsplit(self) -> None:
+        """
+        Processes the quits of a netsplit detected by the quit reason.
+        """
+
+        if self.pending_netsplit:
+            reason, nicks = self.pending_netsplit
+            self.pending_netsplit = None
+            self.netsplit(reason.split(' '), nicks)
+
+    def netsplit_batch_complete(self, client: 'Client', batch: Batch) -> None:
+        nicks = [
+            self.nick_class.parse(message.prefix)
+            for message in batch
+            if message.command == 'QUIT' and message.prefix
+        ]
+        self.netsplit(batch.parameters, nicks)
+
+    def netjoin_batch_complete(self, client: 'Client', batch: Batch) -> None:
+        joins = [
+            (message.parameters[0], self.join_nick(message))
+            for message in batch
+            if message.command == 'JOIN' and message.prefix and message.parameters
+        ]
+        self.netjoin(batch.parameters, joins)
+
+    def netsplit(self, servers: List[str], nicks: List[Nick]) -> None:
+        """
+        Removes the nicks lost in a netsplit from every channel in one pass.
+        """
+
+        if not nicks:
+            return
+
+        quits = {self.irc_lower(nick.nick) for nick in nicks}
+        channels = []
+
+        for channel in self.channels:
+            members = [
+                membership
+                for membership in channel.members
+                if self.irc_lower(membership.nick.nick) not in quits
+            ]
+
+            if len(members) != len(channel.members):
+                channel.members = members
+                channels.append(channel)
+
+        self.irc_netsplit(servers, nicks, channels)
+
+    def netjoin(self, servers: List[str], joins: List[Tuple[str, Nick]]) -> None:
+        """
+        Adds the nicks returning from a netsplit to their channels in bulk.
+        """
+
+        members: Dict[str, Set[str]] = {}
+        channels: List[Channel] = []
+        nicks: Dict[str, Nick] = {}
+
+        for channel_name, nick in joins:
+            channel = self.find_channel(channel_name)
+            if not channel:
+                continue
+
+            key = self.irc_lower(channel.name)
+            if key not in members:
+                members[key] = {
+                    self.irc_lower(membership.nick.nick)
+                    for membership in channel.members
+                }
+                channels.append(channel)
+
+            nickname = self.irc_lower(nick.nick)
+            if nickname not in members[key]:
+                members[key].add(nickname)
+                channel.members.append(Membership(nick))
+                nicks.setdefault(nickname, nick)
+
+        self.irc_netjoin(servers, list(nicks.values()), channels)
+
     # Delegation methods
 
     @property
@@ -677,120 +2391,353 @@ class Client:
 
         self.modules.append(DelegateModule(delegate))
 
-    def irc_disconnected(self, error: Optional[Exception]) -> None:
+    def dispatch(self, name: str, *args: Any, key: Optional[str] = None) -> None:
+        """
+        Calls the handler `name` of every module. Handlers which are
+        coroutines are scheduled as tasks instead of being awaited, handlers
+        sharing the same `key` (a channel or nick) run in order.
+        """
+
         for module in self.modules:
-            if hasattr(module, 'irc_disconnected'):
-                module.irc_disconnected(self, error)
+            handler = getattr(module, name, None)
+            if not handler:
+                continue
+
+            # Handlers of the delegate are called through the module, the
+            # delegates handler is what may have been decorated
+            if isinstance(module, DelegateModule):
+                handler_name = '{}.{}'.format(type(module.delegate).__name__, name)
+                decorated = getattr(module.delegate, name, None)
+            else:
+                handler_name = '{}.{}'.format(type(module).__name__, name)
+                decorated = handler
+
+            is_offloaded = getattr(decorated, 'is_offloaded', False)
+            executor = getattr(decorated, 'offload_executor', None)
+            if is_offloaded and self.can_offload(handler_name, executor):
+                future = self.offload(
+                    functools.partial(handler, self, *args), key=key, executor=executor
+                )
+                future.add_done_callback(
+                    functools.partial(self.offloaded_handler_done, handler_name)
+                )
+                continue
+
+            started = time.perf_counter()
+            if self.profiler:
+                result = self.profiler.call(handler_name, handler, self, *args)
+            else:
+                result = handler(self, *args)
+
+            if asyncio.iscoroutine(result):
+                self.schedule_handler(result, handler_name, key)
+            else:
+                self.record_handler(handler_name, time.perf_counter() - started)
+
+                if is_offloaded and callable(result):
+                    result()
+
+    def offload(
+        self,
+        func: Callable,
+        *args: Any,
+        key: Optional[str] = None,
+        executor: Optional[str] = None
+    ) -> asyncio.Future:
+        """
+        Runs `func` with the given arguments in the executor named
+        `executor` from `Client.executors`, or the event loops default
+        executor. Returns a future for the result of the function. The
+        function, its arguments and result must be picklable for a process
+        pool.
+
+        Functions run in parallel, however the futures of calls sharing the
+        same `key` (such as a channel) complete in the order of the calls.
+
+            >>> title = await client.offload(parse_title, html, key='#example')
+        """
+
+        loop = asyncio.get_event_loop()
+        pool = self.executors[executor] if executor else None
+        stats = self.offload_stats.get(executor or 'default')
+        if not stats:
+            stats = self.offload_stats[executor or 'default'] = {
+                'submitted': 0,
+                'completed': 0,
+                'in_flight': 0,
+                'max_in_flight': 0,
+                'total': 0.0,
+            }
+
+        stats['submitted'] += 1
+        stats['in_flight'] += 1
+        stats['max_in_flight'] = max(stats['max_in_flight'], stats['in_flight'])
+
+        previous = self.offload_tails.get(key) if key else None
+        future = loop.create_future()
+
+        async def deliver() -> None:
+            started = time.perf_counter()
+            try:
+                result = await loop.run_in_executor(pool, func, *args)
+                exception = None
+            except Exception as error:
+                exception = error
+            finally:
+                stats['in_flight'] -= 1
+                stats['completed'] += 1
+                stats['total'] += time.perf_counter() - started
+
+            if previous:
+                await asyncio.wait([previous])
+
+            if future.done():
+                return
+            elif exception:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+
+        task = asyncio.ensure_future(deliver())
+        self.handler_tasks.add(task)
+        task.add_done_callback(self.handler_tasks.discard)
+
+        if key:
+            self.offload_tails[key] = future
+
+            def finished(future: asyncio.Future, key: str = key) -> None:
+                if self.offload_tails.get(key) is future:
+                    del self.offload_tails[key]
+
+            future.add_done_callback(finished)
+
+        return future
+
+    def can_offload(self, name: str, executor: Optional[str]) -> bool:
+        """
+        Returns whether the handler `name` can be offloaded to `executor`.
+        Handlers for executors missing from `Client.executors` or which are
+        process pools are run on the event loop instead, warning once for
+        each handler.
+        """
+
+        if not executor:
+            return True
+
+        pool = self.executors.get(executor)
+        if pool and not isinstance(pool, ProcessPoolExecutor):
+            return True
+
+        if name not in self.inline_handlers:
+            self.inline_handlers.add(name)
+            self.logger.warning(
+                '{} executor {} for handler {}, running it on the event '
+                'loop'.format('Process pool' if pool else 'Unknown', executor, name)
+            )
+
+        return False
+
+    def offloaded_handler_done(self, name: str, future: asyncio.Future) -> None:
+        if future.cancelled():
+            return
+
+        exception = future.exception()
+        if exception:
+            self.logger.error('Exception in handler {}: {}'.format(name, exception))
+            return
+
+        result = future.result()
+        if callable(result):
+            result()
+
+    def record_handler(self, name: str, duration: float) -> None:
+        stats = self.handler_stats.get(name)
+        if not stats:
+            stats = self.handler_stats[name] = {'calls': 0, 'total': 0.0, 'max': 0.0}
+
+        stats['calls'] += 1
+        stats['total'] += duration
+        stats['max'] = max(stats['max'], duration)
+
+        if self.metrics:
+            self.metrics.record_handler(name, duration)
+
+    def schedule_handler(self, coroutine, name: str, key: Optional[str]) -> None:
+        previous = None
+        if key and self.ordered_handlers:
+            previous = self.ordered_handler_tasks.get(key)
+
+        task = asyncio.ensure_future(self.run_handler(coroutine, name, previous))
+        self.handler_tasks.add(task)
+        task.add_done_callback(self.handler_tasks.discard)
+
+        if key and self.ordered_handlers:
+            self.ordered_handler_tasks[key] = task
+
+            def finished(task: asyncio.Task, key: str = key) -> None:
+                if self.ordered_handler_tasks.get(key) is task:
+                    del self.ordered_handler_tasks[key]
+
+            task.add_done_callback(finished)
+
+    async def run_handler(
+        self, coroutine, name: str, previous: Optional[asyncio.Task]
+    ) -> None:
+        if previous:
+            await asyncio.wait([previous])
+
+        if not self.handler_semaphore:
+            self.handler_semaphore = asyncio.Semaphore(self.max_concurrent_handlers)
+
+        async with self.handler_semaphore:
+            started = time.perf_counter()
+            try:
+                await coroutine
+            except Exception:
+                self.logger.exception('Exception in handler {}'.format(name))
+            finally:
+                self.record_handler(name, time.perf_counter() - started)
+
+    def irc_disconnected(self, error: Optional[Exception]) -> None:
+        self.dispatch('irc_disconnected', error)
 
     def irc_registered(self) -> None:
-        for module in self.modules:
-            if hasattr(module, 'irc_registered'):
-                module.irc_registered(self)
+        self.dispatch('irc_registered')
 
     def irc_raw(self, line: str) -> None:
-        for module in self.modules:
-            if hasattr(module, 'irc_raw'):
-                module.irc_raw(self, line)
+        self.dispatch('irc_raw', line)
 
     def irc_message(self, message: Message) -> None:
-        for module in self.modules:
-            if hasattr(module, 'irc_message'):
-                module.irc_message(self, message)
+        self.dispatch('irc_message', message)
 
     def irc_private_message(self, nick: Nick, message: str) -> None:
-        for module in self.modules:
-            if hasattr(module, 'irc_private_message'):
-                module.irc_private_message(self, nick, message)
+        self.dispatch(
+            'irc_private_message', nick, message, key=self.irc_lower(nick.nick)
+        )
 
     def irc_channel_message(self, nick: Nick, channel: Channel, message: str) -> None:
-        for module in self.modules:
-            if hasattr(module, 'irc_channel_message'):
-                module.irc_channel_message(self, nick, channel, message)
+        self.dispatch(
+            'irc_channel_message',
+            nick,
+            channel,
+            message,
+            key=self.irc_lower(channel.name),
+        )
 
     def irc_channel_join(self, nick: Nick, channel: Channel) -> None:
-        for module in self.modules:
-            if hasattr(module, 'irc_channel_join'):
-                module.irc_channel_join(self, nick, channel)
+        self.dispatch(
+            'irc_channel_join', nick, channel, key=self.irc_lower(channel.name)
+        )
 
     def irc_channel_quit(
         self, nick: Nick, channel: Channel, message: Optional[str]
     ) -> None:
-        for module in self.modules:
-            if hasattr(module, 'irc_channel_quit'):
-                module.irc_channel_quit(self, nick, channel, message)
+        self.dispatch(
+            'irc_channel_quit', nick, channel, message, key=self.irc_lower(channel.name)
+        )
 
     def irc_channel_part(
         self, nick: Nick, channel: Channel, message: Optional[str]
     ) -> None:
-        for module in self.modules:
-            if hasattr(module, 'irc_channel_part'):
-                module.irc_channel_part(self, nick, channel, message)
+        self.dispatch(
+            'irc_channel_part', nick, channel, message, key=self.irc_lower(channel.name)
+        )
 
     def irc_channel_kick(
         self, nick: Nick, channel: Channel, message: Optional[str]
     ) -> None:
-        for module in self.modules:
-            if hasattr(module, 'irc_channel_kick'):
-                module.irc_channel_kick(self, nick, channel, message)
+        self.dispatch(
+            'irc_channel_kick', nick, channel, message, key=self.irc_lower(channel.name)
+        )
 
     def irc_channel_topic(self, nick: Nick, channel: Channel) -> None:
-        for module in self.modules:
-            if hasattr(module, 'irc_channel_topic'):
-                module.irc_channel_topic(self, nick, channel)
+        self.dispatch(
+            'irc_channel_topic', nick, channel, key=self.irc_lower(channel.name)
+        )
+
+    def irc_netsplit(
+        self, servers: List[str], nicks: List[Nick], channels: List[Channel]
+    ) -> None:
+        self.dispatch('irc_netsplit', servers, nicks, channels)
+
+    def irc_netjoin(
+        self, servers: List[str], nicks: List[Nick], channels: List[Channel]
+    ) -> None:
+        self.dispatch('irc_netjoin', servers, nicks, channels)
 
 
 class DelegateModule:
     def __init__(self, delegate: Any):
         self.delegate = delegate
 
-    def irc_disconnected(self, client: Client, error: Optional[Exception]) -> None:
+    def irc_disconnected(self, client: Client, error: Optional[Exception]) -> Any:
         if hasattr(self.delegate, 'irc_disconnected'):
-            self.delegate.irc_disconnected(client, error)
+            return self.delegate.irc_disconnected(client, error)
 
-    def irc_registered(self, client: Client) -> None:
+    def irc_registered(self, client: Client) -> Any:
         if hasattr(self.delegate, 'irc_registered'):
-            self.delegate.irc_registered(client)
+            return self.delegate.irc_registered(client)
 
-    def irc_raw(self, client: Client, line: str) -> None:
+    def irc_raw(self, client: Client, line: str) -> Any:
         if hasattr(self.delegate, 'irc_raw'):
-            self.delegate.irc_raw(client, line)
+            return self.delegate.irc_raw(client, line)
 
-    def irc_message(self, client: Client, message: Message) -> None:
+    def irc_message(self, client: Client, message: Message) -> Any:
         if hasattr(self.delegate, 'irc_message'):
-            self.delegate.irc_message(client, message)
+            return self.delegate.irc_message(client, message)
 
-    def irc_private_message(self, client: Client, nick: Nick, message: str) -> None:
+    def irc_private_message(self, client: Client, nick: Nick, message: str) -> Any:
         if hasattr(self.delegate, 'irc_private_message'):
-            self.delegate.irc_private_message(client, nick, message)
+            return self.delegate.irc_private_message(client, nick, message)
 
     def irc_channel_message(
         self, client: Client, nick: Nick, channel: Channel, message: str
-    ) -> None:
+    ) -> Any:
         if hasattr(self.delegate, 'irc_channel_message'):
-            self.delegate.irc_channel_message(client, nick, channel, message)
+            return self.delegate.irc_channel_message(client, nick, channel, message)
 
-    def irc_channel_join(self, client: Client, nick: Nick, channel: Channel) -> None:
+    def irc_channel_join(self, client: Client, nick: Nick, channel: Channel) -> Any:
         if hasattr(self.delegate, 'irc_channel_join'):
-            self.delegate.irc_channel_join(client, nick, channel)
+            return self.delegate.irc_channel_join(client, nick, channel)
 
     def irc_channel_quit(
         self, client: Client, nick: Nick, channel: Channel, message: Optional[str]
-    ) -> None:
+    ) -> Any:
         if hasattr(self.delegate, 'irc_channel_quit'):
-            self.delegate.irc_channel_quit(client, nick, channel, message)
+            return self.delegate.irc_channel_quit(client, nick, channel, message)
 
     def irc_channel_part(
         self, client: Client, nick: Nick, channel, message: Optional[str]
-    ) -> None:
+    ) -> Any:
         if hasattr(self.delegate, 'irc_channel_part'):
-            self.delegate.irc_channel_part(client, nick, channel, message)
+            return self.delegate.irc_channel_part(client, nick, channel, message)
 
     def irc_channel_kick(
         self, client: Client, nick: Nick, channel: Channel, message: Optional[str]
-    ) -> None:
+    ) -> Any:
         if hasattr(self.delegate, 'irc_channel_kick'):
-            self.delegate.irc_channel_kick(client, nick, channel, message)
+            return self.delegate.irc_channel_kick(client, nick, channel, message)
 
-    def irc_channel_topic(self, client: Client, nick: Nick, channel: Channel) -> None:
+    def irc_channel_topic(self, client: Client, nick: Nick, channel: Channel) -> Any:
         if hasattr(self.delegate, 'irc_channel_topic'):
-            self.delegate.irc_channel_topic(client, nick, channel)
+            return self.delegate.irc_channel_topic(client, nick, channel)
+
+    def irc_netsplit(
+        self,
+        client: Client,
+        servers: List[str],
+        nicks: List[Nick],
+        channels: List[Channel],
+    ) -> Any:
+        if hasattr(self.delegate, 'irc_netsplit'):
+            return self.delegate.irc_netsplit(client, servers, nicks, channels)
+
+    def irc_netjoin(
+        self,
+        client: Client,
+        servers: List[str],
+        nicks: List[Nick],
+        channels: List[Channel],
+    ) -> Any:
+        if hasattr(self.delegate, 'irc_netjoin'):
+            return self.delegate.irc_netjoin(client, servers, nicks, channels)
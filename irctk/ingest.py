@@ -0,0 +1,194 @@
+import collections
+import concurrent.futures
+import datetime
+import gzip
+import os
+from typing import (
+    Any,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+)
+
+from irctk.message import Message
+
+Columns = Dict[str, List[Any]]
+
+COLUMNS = ('time', 'command', 'nick', 'target', 'text')
+
+
+class Chunk(NamedTuple):
+    """
+    A range of bytes of an archive of raw IRC lines. A chunk contains the
+    lines which start within its range.
+    """
+
+    path: str
+    start: int
+    end: Optional[int]
+
+
+def split_archive(path: str, chunk_size: int = 16 * 1024 * 1024) -> List[Chunk]:
+    """
+    Splits an archive into chunks of roughly `chunk_size` bytes, compressed
+    archives cannot be split and are a single chunk.
+    """
+
+    if path.endswith('.gz'):
+        return [Chunk(path, 0, None)]
+
+    size = os.path.getsize(path)
+    return [
+        Chunk(path, start, min(start + chunk_size, size))
+        for start in range(0, max(size, 1), chunk_size)
+    ]
+
+
+def parse_time(value: Optional[str]) -> Optional[float]:
+    """
+    Parses a server-time tag into seconds since the epoch.
+
+    >>> parse_time('2021-06-01T12:00:00.500Z')
+    1622548800.5
+    """
+
+    if not value:
+        return None
+
+    try:
+        return datetime.datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+def read_lines(chunk: Chunk) -> Iterator[bytes]:
+    if chunk.end is None:
+        with gzip.open(chunk.path, 'rb') as fp:
+            yield from fp
+        return
+
+    with open(chunk.path, 'rb') as fp:
+        fp.seek(chunk.start)
+
+        if chunk.start > 0:
+            # The line which started in the previous chunk belongs to it,
+            # unless the previous chunk ended on a line break.
+            fp.seek(chunk.start - 1)
+            fp.readline()
+
+        while fp.tell() < chunk.end:
+            line = fp.readline()
+            if not line:
+                break
+
+            yield line
+
+
+def parse_chunk(chunk: Chunk, tags: Sequence[str] = ()) -> Columns:
+    """
+    Parses the lines of a chunk into columns of the time (from the
+    server-time tag), command, nick of the prefix, first parameter (target)
+    and last parameter (text) along with a column for each tag.
+    """
+
+    columns: Columns = {name: [] for name in COLUMNS}
+    tag_columns = [(tag, columns.setdefault('tag_' + tag, [])) for tag in tags]
+
+    times = columns['time']
+    commands = columns['command']
+    nicks = columns['nick']
+    targets = columns['target']
+    texts = columns['text']
+
+    for raw in read_lines(chunk):
+        line = raw.decode('utf-8', errors='replace').strip()
+        if not line:
+            continue
+
+        message = Message.parse(line)
+        parameters = message.parameters
+
+        times.append(parse_time(message.find_tag('time')))
+        commands.append(message.command)
+        nicks.append(message.prefix.split('!', 1)[0] if message.prefix else None)
+        targets.append(parameters[0] if len(parameters) > 1 else None)
+        texts.append(parameters[-1] if parameters else None)
+
+        for tag, column in tag_columns:
+            column.append(message.find_tag(tag))
+
+    return columns
+
+
+def ingest(
+    paths: Iterable[str],
+    tags: Sequence[str] = (),
+    processes: Optional[int] = None,
+    chunk_size: int = 16 * 1024 * 1024,
+) -> Iterator[Columns]:
+    """
+    Parses archives of raw IRC lines in a pool of processes, yielding the
+    columns of each chunk in the order of the archives.
+
+    >>> for columns in ingest(glob.glob('logs/*.log'), tags=['account']):
+    ...     print(len(columns['command']))
+    """
+
+    processes = processes or os.cpu_count() or 1
+    chunks = (chunk for path in paths for chunk in split_archive(path, chunk_size))
+
+    with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+        # Only a few chunks per process are parsed ahead of the consumer so
+        # that the parsed columns of large archives are not held in memory.
+        pending: Deque[concurrent.futures.Future] = collections.deque()
+
+        for chunk in chunks:
+            pending.append(executor.submit(parse_chunk, chunk, tuple(tags)))
+            if len(pending) >= processes * 2:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+
+def concat(batches: Iterable[Columns]) -> Columns:
+    """
+    Joins batches of columns into a single batch.
+    """
+
+    result: Columns = {}
+    for columns in batches:
+        for name, values in columns.items():
+            result.setdefault(name, []).extend(values)
+
+    return result
+
+
+def to_numpy(columns: Columns) -> Any:
+    """
+    Converts columns into a NumPy structured array, requires NumPy to be
+    installed. Times are float64 (NaN when missing), other columns are
+    objects.
+    """
+
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError('to_numpy() requires NumPy to be installed') from None
+
+    dtype = [(name, 'f8' if name == 'time' else 'O') for name in columns]
+    count = len(columns['command'])
+    array = numpy.empty(count, dtype=dtype)
+
+    for name, values in columns.items():
+        if name == 'time':
+            array[name] = [numpy.nan if value is None else value for value in values]
+        else:
+            array[name] = values
+
+    return array
@@ -1,5 +1,7 @@
+import functools
 import re
-from typing import List, Optional
+import types
+from typing import Any, Dict, List, Mapping, Optional
 
 DEFAULT_ISUPPORT = {
     'casemapping': 'rfc1459',
@@ -27,8 +29,52 @@ DEFAULT_ISUPPORT = {
 }
 
 
+IRC_ISUPPORT_PREFIX = re.compile(r'^\((.+)\)(.+)$')
+
+
+# The parsed PREFIX and CHANMODES tables are shared between every ISupport
+# with the same value (such as many clients connected to the same network),
+# so they are read-only.
+
+
+@functools.lru_cache(maxsize=64)
+def parse_prefix(value: str) -> Mapping[str, str]:
+    prefix = {}
+
+    m = IRC_ISUPPORT_PREFIX.match(value)
+    if m and len(m.group(1)) == len(m.group(2)):
+        for x in range(0, len(m.group(1))):
+            prefix[m.group(1)[x]] = m.group(2)[x]
+
+    return types.MappingProxyType(prefix)
+
+
+@functools.lru_cache(maxsize=64)
+def parse_chanmodes(value: str) -> Optional[Mapping[str, Any]]:
+    try:
+        list_args, arg, arg_set, no_args = value.split(',')
+    except ValueError:
+        return None
+
+    chanmodes: Dict[str, Any] = {}
+
+    for mode in list_args:
+        chanmodes[mode] = list
+
+    for mode in arg:
+        chanmodes[mode] = 'arg'
+
+    for mode in arg_set:
+        chanmodes[mode] = 'arg_set'
+
+    for mode in no_args:
+        chanmodes[mode] = None
+
+    return types.MappingProxyType(chanmodes)
+
+
 class ISupport(dict):
-    IRC_ISUPPORT_PREFIX = re.compile(r'^\((.+)\)(.+)$')
+    IRC_ISUPPORT_PREFIX = IRC_ISUPPORT_PREFIX
 
     def __init__(self):
         self.update(DEFAULT_ISUPPORT)
@@ -129,32 +175,12 @@ class ISupport(dict):
                 self[key] = value
 
     def parse_prefix(self, value: str) -> None:
-        self['prefix'] = {}
-
-        m = self.IRC_ISUPPORT_PREFIX.match(value)
-        if m and len(m.group(1)) == len(m.group(2)):
-            for x in range(0, len(m.group(1))):
-                self['prefix'][m.group(1)[x]] = m.group(2)[x]
+        self['prefix'] = parse_prefix(value)
 
     def parse_chanmodes(self, value: str) -> None:
-        try:
-            list_args, arg, arg_set, no_args = value.split(',')
-        except ValueError:
-            return
-
-        self['chanmodes'] = {}
-
-        for mode in list_args:
-            self['chanmodes'][mode] = list
-
-        for mode in arg:
-            self['chanmodes'][mode] = 'arg'
-
-        for mode in arg_set:
-            self['chanmodes'][mode] = 'arg_set'
-
-        for mode in no_args:
-            self['chanmodes'][mode] = None
+        chanmodes = parse_chanmodes(value)
+        if chanmodes is not None:
+            self['chanmodes'] = chanmodes
 
     # Get
 
@@ -206,6 +232,36 @@ class ISupport(dict):
         """
         return self['casemapping']
 
+    @property
+    def channel_limits(self) -> Dict[str, Optional[int]]:
+        """
+        Returns the maximum number of channels that may be joined for each
+        group of channel prefixes. A limit of `None` means unlimited.
+
+        Example::
+
+            >>> support.parse('CHANLIMIT=#&:100,+:')
+            >>> support.channel_limits
+            {'#&': 100, '+': None}
+        """
+
+        limits: Dict[str, Optional[int]] = {}
+        value = self.get('CHANLIMIT')
+        if not value:
+            return limits
+
+        for pair in value.split(','):
+            if ':' not in pair:
+                continue
+
+            prefixes, limit = pair.split(':', 1)
+            try:
+                limits[prefixes] = int(limit) if limit else None
+            except ValueError:
+                continue
+
+        return limits
+
     #
 
     def is_channel(self, channel_name: str) -> bool:
@@ -232,6 +288,14 @@ class ISupport(dict):
 
         return False
 
+    @property
+    def whox(self) -> bool:
+        """
+        Whether the server supports WHOX queries.
+        """
+
+        return 'WHOX' in self
+
     @property
     def bot_mode(self) -> Optional[str]:
         """
@@ -0,0 +1,336 @@
+import asyncio
+import bisect
+import logging
+import mmap
+import os
+import re
+import struct
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import IO, Iterator, List, NamedTuple, Optional, Tuple
+
+SEGMENT_MAGIC = b'IRCTKJ01'
+
+# Timestamp in nanoseconds, direction and length of the line
+RECORD_HEADER = struct.Struct('<QcI')
+
+# Timestamp in nanoseconds and offset of a record in the segment
+INDEX_ENTRY = struct.Struct('<QQ')
+
+
+class JournalRecord(NamedTuple):
+    timestamp: int
+    direction: str
+    line: bytes
+    segment: int
+    offset: int
+
+    @property
+    def time(self) -> float:
+        return self.timestamp / 1e9
+
+
+class JournalWriter:
+    """
+    Appends every raw line received and sent by a client to a journal once
+    assigned to `Client.journal`.
+
+    >>> client.journal = JournalWriter('/var/log/irc/libera')
+
+    Lines are written and synced to disk in groups, once `commit_bytes`
+    have been buffered or `commit_interval` seconds after the first line
+    buffered since the last commit. The journal is split into segments of
+    at most `max_segment_bytes`, each with an index of the offset of a
+    record every `index_interval` bytes. Syncing to disk is done in a
+    thread when committing from the event loop.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        prefix: str = 'journal',
+        max_segment_bytes: int = 64 * 1024 * 1024,
+        commit_bytes: int = 256 * 1024,
+        commit_interval: float = 1.0,
+        index_interval: int = 64 * 1024,
+        fsync: bool = True,
+    ):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_segment_bytes = max_segment_bytes
+        self.commit_bytes = commit_bytes
+        self.commit_interval = commit_interval
+        self.index_interval = index_interval
+        self.fsync = fsync
+        self.logger = logging.getLogger(__name__)
+
+        os.makedirs(directory, exist_ok=True)
+        segments = list_segments(directory, prefix)
+        self.segment = segments[-1] + 1 if segments else 0
+
+        self.file: Optional[IO[bytes]] = None
+        self.index: Optional[IO[bytes]] = None
+        self.size = 0
+        self.last_indexed: Optional[int] = None
+
+        self.buffer = bytearray()
+        self.index_buffer = bytearray()
+        self.commit_timer: Optional[asyncio.TimerHandle] = None
+
+        # Syncs and closes files in order, away from the event loop
+        self.executor: Optional[ThreadPoolExecutor] = None
+
+    def open_segment(self) -> None:
+        self.close_segment()
+
+        path = segment_path(self.directory, self.prefix, self.segment)
+        self.file = open(path, 'wb')
+        self.index = open(path + '.index', 'wb')
+        self.file.write(SEGMENT_MAGIC)
+        self.size = len(SEGMENT_MAGIC)
+        self.last_indexed = None
+
+    def close_segment(self) -> None:
+        if self.file and self.index:
+            if self.executor:
+                # Closed once any pending sync of the files has finished
+                self.executor.submit(close_files, self.file, self.index)
+            else:
+                close_files(self.file, self.index)
+            self.segment += 1
+
+        self.file = None
+        self.index = None
+
+    def append(
+        self, direction: str, line: bytes, timestamp: Optional[int] = None
+    ) -> None:
+        """
+        Appends a line to the journal, the line is written to disk with the
+        next commit.
+        """
+
+        if timestamp is None:
+            timestamp = time.time_ns()
+
+        record_size = RECORD_HEADER.size + len(line)
+        if not self.file or (
+            self.size + record_size > self.max_segment_bytes
+            and self.size > len(SEGMENT_MAGIC)
+        ):
+            self.commit()
+            self.open_segment()
+
+        if self.last_indexed is None or self.size - self.last_indexed >= (
+            self.index_interval
+        ):
+            self.index_buffer += INDEX_ENTRY.pack(timestamp, self.size)
+            self.last_indexed = self.size
+
+        self.buffer += RECORD_HEADER.pack(timestamp, direction.encode(), len(line))
+        self.buffer += line
+        self.size += record_size
+
+        if len(self.buffer) >= self.commit_bytes:
+            self.commit()
+        elif not self.commit_timer:
+            self.schedule_commit()
+
+    def schedule_commit(self) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+
+        self.commit_timer = loop.call_later(self.commit_interval, self.commit)
+
+    def commit(self) -> None:
+        """
+        Writes the buffered lines to disk.
+        """
+
+        if self.commit_timer:
+            self.commit_timer.cancel()
+            self.commit_timer = None
+
+        if not self.file or not self.index or not self.buffer:
+            return
+
+        self.file.write(self.buffer)
+        self.file.flush()
+        self.index.write(self.index_buffer)
+        self.index.flush()
+        self.buffer.clear()
+        self.index_buffer.clear()
+
+        if self.fsync:
+            self.sync(self.file, self.index)
+
+    def sync(self, *files: IO[bytes]) -> None:
+        """
+        Syncs the files to disk, in the executor when called from the event
+        loop so that the loop is not blocked.
+        """
+
+        if not self.executor:
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                sync_files(*files)
+                return
+
+            self.executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix='journal'
+            )
+
+        self.executor.submit(sync_files, *files).add_done_callback(self.sync_done)
+
+    def sync_done(self, future: Future) -> None:
+        exception = future.exception()
+        if exception:
+            self.logger.error('Failed to sync journal: {!r}'.format(exception))
+
+    def close(self) -> None:
+        self.commit()
+        self.close_segment()
+
+        if self.executor:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+
+class JournalReader:
+    """
+    Reads the records of a journal using memory maps, so that journals much
+    larger than memory can be read.
+
+    >>> reader = JournalReader('/var/log/irc/libera')
+    >>> for record in reader.seek_time(time.time() - 3600):
+    ...     print(record.line)
+    """
+
+    def __init__(self, directory: str, prefix: str = 'journal'):
+        self.directory = directory
+        self.prefix = prefix
+
+    @property
+    def segments(self) -> List[int]:
+        return list_segments(self.directory, self.prefix)
+
+    def __iter__(self) -> Iterator[JournalRecord]:
+        return self.records()
+
+    def records(
+        self, segment: Optional[int] = None, offset: int = 0
+    ) -> Iterator[JournalRecord]:
+        """
+        Iterates over the records starting at the given offset of a segment,
+        offsets of records are available from `JournalRecord.offset`.
+        """
+
+        for number in self.segments:
+            if segment is not None and number < segment:
+                continue
+
+            start = offset if number == segment else 0
+            yield from self.read_segment(number, start)
+
+    def read_segment(self, segment: int, offset: int = 0) -> Iterator[JournalRecord]:
+        path = segment_path(self.directory, self.prefix, segment)
+
+        with open(path, 'rb') as fp:
+            if os.fstat(fp.fileno()).st_size <= len(SEGMENT_MAGIC):
+                return
+
+            with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if data[: len(SEGMENT_MAGIC)] != SEGMENT_MAGIC:
+                    raise ValueError('{} is not a journal segment'.format(path))
+
+                offset = max(offset, len(SEGMENT_MAGIC))
+                size = len(data)
+
+                while offset + RECORD_HEADER.size <= size:
+                    timestamp, direction, length = RECORD_HEADER.unpack_from(
+                        data, offset
+                    )
+                    start = offset + RECORD_HEADER.size
+                    if start + length > size:
+                        # Partially written record
+                        return
+
+                    yield JournalRecord(
+                        timestamp,
+                        direction.decode(),
+                        data[start : start + length],
+                        segment,
+                        offset,
+                    )
+                    offset = start + length
+
+    def read_index(self, segment: int) -> List[Tuple[int, int]]:
+        path = segment_path(self.directory, self.prefix, segment) + '.index'
+
+        try:
+            with open(path, 'rb') as fp:
+                data = fp.read()
+        except FileNotFoundError:
+            return []
+
+        count = len(data) // INDEX_ENTRY.size
+        return [
+            INDEX_ENTRY.unpack_from(data, i * INDEX_ENTRY.size) for i in range(count)
+        ]
+
+    def seek_time(self, timestamp: float) -> Iterator[JournalRecord]:
+        """
+        Iterates over the records from the first record at or after the
+        given time in seconds since the epoch.
+        """
+
+        target = int(timestamp * 1e9)
+        segment, offset = None, 0
+
+        # The last indexed record before the target, in the last segment
+        # starting before the target.
+        for number in self.segments:
+            index = self.read_index(number)
+            if not index or index[0][0] > target:
+                if segment is None:
+                    segment = number
+                break
+
+            position = bisect.bisect_right([entry[0] for entry in index], target)
+            segment, offset = number, index[max(position - 1, 0)][1]
+
+        if segment is None:
+            return
+
+        for record in self.records(segment, offset):
+            if record.timestamp >= target:
+                yield record
+
+
+def sync_files(*files: IO[bytes]) -> None:
+    for file in files:
+        os.fsync(file.fileno())
+
+
+def close_files(*files: IO[bytes]) -> None:
+    for file in files:
+        file.close()
+
+
+def segment_path(directory: str, prefix: str, segment: int) -> str:
+    return os.path.join(directory, '{}-{:08d}.journal'.format(prefix, segment))
+
+
+def list_segments(directory: str, prefix: str) -> List[int]:
+    pattern = re.compile(r'^{}-(\d{{8}})\.journal$'.format(re.escape(prefix)))
+
+    segments = []
+    for name in os.listdir(directory):
+        match = pattern.match(name)
+        if match:
+            segments.append(int(match.group(1)))
+
+    return sorted(segments)
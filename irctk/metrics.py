@@ -0,0 +1,338 @@
+import asyncio
+import bisect
+import collections
+import itertools
+import math
+from typing import (
+    TYPE_CHECKING,
+    Deque,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+if TYPE_CHECKING:
+    from irctk.client import Client
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf)
+
+# Buckets in seconds for the time spent parsing and handling messages
+LATENCY_BUCKETS = (
+    0.00001,
+    0.00005,
+    0.0001,
+    0.0005,
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.5,
+    1.0,
+    math.inf,
+)
+
+
+class RollingHistogram:
+    """
+    Histogram of the most recent observations.
+
+    >>> histogram = RollingHistogram(size=3)
+    >>> for value in [0.2, 0.3, 4.0, 0.04]:
+    ...     histogram.observe(value)
+    >>> histogram.last
+    0.04
+    >>> histogram.percentile(50)
+    0.3
+    """
+
+    def __init__(self, size: int = 100, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.values: Deque[float] = collections.deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def observe(self, value: float) -> None:
+        self.values.append(value)
+
+    @property
+    def last(self) -> Optional[float]:
+        if not self.values:
+            return None
+
+        return self.values[-1]
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """
+        Returns the value at the given percentile (0-100) of the recent
+        observations using the nearest-rank method.
+        """
+
+        if not self.values:
+            return None
+
+        values = sorted(self.values)
+        rank = max(1, math.ceil(percentile / 100 * len(values)))
+        return values[rank - 1]
+
+    def counts(self) -> Dict[float, int]:
+        """
+        Returns the number of recent observations less than or equal to the
+        upper bound of each bucket.
+        """
+
+        return {
+            bucket: sum(1 for value in self.values if value <= bucket)
+            for bucket in self.buckets
+        }
+
+
+class Histogram:
+    """
+    Histogram of every observation, counted into fixed buckets.
+
+    >>> histogram = Histogram(buckets=(0.1, 1.0, math.inf))
+    >>> histogram.observe(0.05)
+    >>> histogram.observe(0.5)
+    >>> histogram.cumulative_counts()
+    [(0.1, 1), (1.0, 2), (inf, 2)]
+    """
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+
+        self.count += 1
+        self.sum += value
+
+    def cumulative_counts(self) -> List[Tuple[float, int]]:
+        """
+        Returns the upper bound of each bucket along with the number of
+        observations less than or equal to it.
+        """
+
+        return list(zip(self.buckets, itertools.accumulate(self.counts)))
+
+
+class Metrics:
+    """
+    Traffic counters and latency histograms of a client, recorded once
+    assigned to `Client.metrics`.
+
+    >>> client.metrics = Metrics()
+    >>> client.metrics.lines_received['PRIVMSG']
+    42
+    """
+
+    def __init__(self) -> None:
+        # Lines and bytes received and sent keyed by command
+        self.lines_received: Dict[str, int] = collections.defaultdict(int)
+        self.bytes_received: Dict[str, int] = collections.defaultdict(int)
+        self.lines_sent: Dict[str, int] = collections.defaultdict(int)
+        self.bytes_sent: Dict[str, int] = collections.defaultdict(int)
+
+        # Seconds spent parsing lines, processing messages (including
+        # synchronous module handlers) and in each module handler
+        self.parse = Histogram()
+        self.dispatch = Histogram()
+        self.handlers: Dict[str, Histogram] = {}
+
+    def record_received(self, command: str, size: int) -> None:
+        self.lines_received[command] += 1
+        self.bytes_received[command] += size
+
+    def record_sent(self, line: str, size: int) -> None:
+        command = line
+        if command.startswith('@'):
+            command = command.split(' ', 1)[-1]
+        if command.startswith(':'):
+            command = command.split(' ', 1)[-1]
+
+        command = command.split(' ', 1)[0].upper()
+        self.lines_sent[command] += 1
+        self.bytes_sent[command] += size
+
+    def record_handler(self, name: str, duration: float) -> None:
+        histogram = self.handlers.get(name)
+        if not histogram:
+            histogram = self.handlers[name] = Histogram()
+
+        histogram.observe(duration)
+
+
+def gauges(client: 'Client') -> Dict[str, Optional[float]]:
+    """
+    Returns the current size of the state of a client, along with how long
+    it took to register which is None until the client has registered and
+    the most recently measured lag which is None until it has been measured.
+    """
+
+    return {
+        'pending_requests': len(client.requests)
+        + len(client.nick_requests)
+        + len(client.joins)
+        + len(client.whox_requests),
+        'open_batches': len(client.batches),
+        'batch_buffer_bytes': client.batch_stats['bytes'],
+        'channels': len(client.channels),
+        'members': sum(len(channel.members) for channel in client.channels),
+        'outbound_buffer_bytes': client.buffered_bytes,
+        'time_to_registered_seconds': client.time_to_registered,
+        'time_to_ready_seconds': client.time_to_ready,
+        'lag_seconds': client.lag.last,
+    }
+
+
+# Prometheus text exposition
+
+COUNTERS = {
+    'lines_received': 'Lines received by command.',
+    'bytes_received': 'Bytes received by command.',
+    'lines_sent': 'Lines sent by command.',
+    'bytes_sent': 'Bytes sent by command.',
+}
+
+GAUGES = {
+    'pending_requests': 'Requests awaiting a response.',
+    'open_batches': 'Batches which have been started but not ended.',
+    'batch_buffer_bytes': 'Estimated bytes of messages buffered for open batches.',
+    'channels': 'Channels known to the client.',
+    'members': 'Members of every channel.',
+    'outbound_buffer_bytes': 'Bytes waiting to be written to the connection.',
+    'time_to_registered_seconds': 'Seconds from starting registration until welcomed.',
+    'time_to_ready_seconds': 'Seconds from starting registration until the MOTD.',
+    'lag_seconds': 'Seconds until the most recent keepalive PING was answered.',
+}
+
+
+def format_labels(labels: Mapping[str, str]) -> str:
+    return ','.join(
+        '{}="{}"'.format(
+            name,
+            value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'),
+        )
+        for name, value in labels.items()
+    )
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+
+    return repr(value)
+
+
+def render_prometheus(clients: Mapping[str, 'Client']) -> str:
+    """
+    Renders the metrics of the given clients, keyed by the value of their
+    `client` label, in the Prometheus text exposition format.
+    """
+
+    lines: List[str] = []
+
+    def header(name: str, metric_type: str, description: str) -> None:
+        lines.append('# HELP irctk_{} {}'.format(name, description))
+        lines.append('# TYPE irctk_{} {}'.format(name, metric_type))
+
+    def sample(name: str, labels: Mapping[str, str], value: float) -> None:
+        lines.append(
+            'irctk_{}{{{}}} {}'.format(name, format_labels(labels), format_value(value))
+        )
+
+    def histogram(name: str, labels: Dict[str, str], histogram: Histogram) -> None:
+        for bucket, count in histogram.cumulative_counts():
+            sample(name + '_bucket', dict(labels, le=format_value(bucket)), count)
+
+        sample(name + '_sum', labels, histogram.sum)
+        sample(name + '_count', labels, histogram.count)
+
+    enabled = {
+        name: client.metrics for name, client in clients.items() if client.metrics
+    }
+
+    for counter, description in COUNTERS.items():
+        header(counter + '_total', 'counter', description)
+        for name, metrics in enabled.items():
+            for command, value in sorted(getattr(metrics, counter).items()):
+                sample(counter + '_total', {'client': name, 'command': command}, value)
+
+    header('parse_seconds', 'histogram', 'Time spent parsing lines.')
+    for name, metrics in enabled.items():
+        histogram('parse_seconds', {'client': name}, metrics.parse)
+
+    header('dispatch_seconds', 'histogram', 'Time spent processing messages.')
+    for name, metrics in enabled.items():
+        histogram('dispatch_seconds', {'client': name}, metrics.dispatch)
+
+    header('handler_seconds', 'histogram', 'Time spent in module handlers.')
+    for name, metrics in enabled.items():
+        for handler, handler_histogram in sorted(metrics.handlers.items()):
+            histogram(
+                'handler_seconds',
+                {'client': name, 'handler': handler},
+                handler_histogram,
+            )
+
+    client_gauges = {name: gauges(client) for name, client in clients.items()}
+    for gauge, description in GAUGES.items():
+        header(gauge, 'gauge', description)
+        for name, values in client_gauges.items():
+            value = values[gauge]
+            if value is not None:
+                sample(gauge, {'client': name}, value)
+
+    return '\n'.join(lines) + '\n'
+
+
+async def serve_metrics(
+    clients: Mapping[str, 'Client'], host: str = '127.0.0.1', port: int = 9120
+) -> asyncio.Server:
+    """
+    Serves the metrics of the given clients over HTTP at `/metrics` for
+    scraping by Prometheus. The mapping of clients may change while it is
+    being served.
+
+    >>> server = await serve_metrics({'bot': client})
+    """
+
+    async def handle(
+        reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            request = await reader.readline()
+            while (await reader.readline()).strip():
+                pass
+
+            parts = request.decode('latin-1').split()
+            if parts[:2] == ['GET', '/metrics']:
+                status = '200 OK'
+                body = render_prometheus(clients).encode('utf-8')
+            else:
+                status = '404 Not Found'
+                body = b'Not Found\n'
+
+            header = (
+                'HTTP/1.1 {}\r\n'
+                'Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n'
+                'Content-Length: {}\r\n'
+                'Connection: close\r\n\r\n'
+            ).format(status, len(body))
+            writer.write(header.encode('latin-1') + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
@@ -19,6 +19,12 @@ class Nick(object):
         self.ident = ident
         self.host = host
 
+        # Account the user is logged in to, their real name and whether they
+        # are away, when known
+        self.account: Optional[str] = None
+        self.realname: Optional[str] = None
+        self.is_away = False
+
     def __str__(self) -> str:
         return self.nick
 
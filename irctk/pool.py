@@ -0,0 +1,155 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from irctk.client import Client, Server
+
+
+class PoolMember(NamedTuple):
+    client: Client
+    servers: List[Server]
+    network: Optional[str]
+
+
+class ClientPool:
+    """
+    Runs many clients in a single event loop, owning their lifecycle.
+
+    Clients are connected gradually, at most `connections_per_second`, so
+    that starting many clients does not overwhelm the event loop or the
+    servers. Each client is kept connected with `Client.supervise`.
+
+    >>> pool = ClientPool(connections_per_second=20)
+    >>> pool.add(Client(nickname='bot'), [Server('irc.example.com')])
+    >>> await pool.start()
+    >>> await pool.stop()
+    """
+
+    def __init__(self, connections_per_second: float = 10):
+        self.logger = logging.getLogger(__name__)
+        self.connections_per_second = connections_per_second
+
+        self.members: List[PoolMember] = []
+        self.tasks: Dict[Client, asyncio.Task] = {}
+        self.is_running = False
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    @property
+    def clients(self) -> List[Client]:
+        return [member.client for member in self.members]
+
+    def add(
+        self, client: Client, servers: List[Server], network: Optional[str] = None
+    ) -> None:
+        """
+        Adds a client to the pool, the client is connected to the given
+        servers once the pool has been started (or immediately when the pool
+        is already running).
+        """
+
+        self.members.append(PoolMember(client, servers, network))
+
+        if self.is_running:
+            self.start_client(self.members[-1])
+
+    def start_client(self, member: PoolMember) -> None:
+        if member.client in self.tasks:
+            return
+
+        task = asyncio.ensure_future(member.client.supervise(member.servers))
+        self.tasks[member.client] = task
+        task.add_done_callback(lambda task: self.tasks.pop(member.client, None))
+
+    async def start(self) -> None:
+        """
+        Starts connecting every client in the pool, returning once every
+        connection has been initiated.
+        """
+
+        self.is_running = True
+        interval = 1 / self.connections_per_second
+
+        for member in list(self.members):
+            if not self.is_running:
+                break
+
+            self.start_client(member)
+            await asyncio.sleep(interval)
+
+    async def stop(self, message: str = 'Disconnected', timeout: float = 10) -> None:
+        """
+        Disconnects every client in the pool, waiting up to `timeout` seconds
+        for the connections to close before cancelling them.
+        """
+
+        self.is_running = False
+
+        for member in self.members:
+            client = member.client
+            client.is_supervised = False
+
+            if client.is_connected:
+                try:
+                    client.quit(message)
+                except Exception as exception:
+                    self.logger.error('Failed to quit: {}'.format(exception))
+
+        tasks = list(self.tasks.values())
+        if not tasks:
+            return
+
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+
+        if pending:
+            await asyncio.wait(pending)
+
+    async def run(self) -> None:
+        """
+        Starts the pool and waits until every client has stopped.
+        """
+
+        await self.start()
+
+        while self.tasks:
+            await asyncio.wait(list(self.tasks.values()))
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns pool wide statistics, in total and for each network.
+        """
+
+        def client_stats(clients: List[Client]) -> Dict[str, int]:
+            return {
+                'clients': len(clients),
+                'connected': sum(client.is_connected for client in clients),
+                'registered': sum(client.is_registered for client in clients),
+                'channels': sum(len(client.channels) for client in clients),
+                'members': sum(
+                    len(channel.members)
+                    for client in clients
+                    for channel in client.channels
+                ),
+                'pending_requests': sum(
+                    len(client.requests) + len(client.nick_requests) + len(client.joins)
+                    for client in clients
+                ),
+                'reconnects': sum(
+                    client.reconnect_stats['reconnects'] for client in clients
+                ),
+            }
+
+        networks: Dict[str, List[Client]] = {}
+        for member in self.members:
+            if member.network:
+                networks.setdefault(member.network, []).append(member.client)
+
+        stats: Dict[str, Any] = client_stats(self.clients)
+        stats['networks'] = {
+            network: client_stats(clients) for network, clients in networks.items()
+        }
+        return stats
@@ -0,0 +1,176 @@
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+STATISTICS = ('calls', 'wall', 'cpu', 'allocations')
+
+
+class Frame:
+    def __init__(self, name: str):
+        self.name = name
+        self.child_wall = 0.0
+        self.child_cpu = 0.0
+
+
+class Profiler:
+    """
+    Records the wall time, CPU time and allocated memory blocks of each
+    step of handling a message once assigned to `Client.profiler`: parsing,
+    every `process_*` method and every module handler.
+
+    Only `sample_rate` (0-1) of the outermost steps are profiled, along
+    with every step nested within them.
+
+    >>> client.profiler = Profiler(sample_rate=0.1)
+    >>> print(client.profiler.report(limit=5))
+    """
+
+    def __init__(self, sample_rate: float = 1.0, track_allocations: bool = True):
+        self.sample_rate = sample_rate
+        self.track_allocations = track_allocations
+
+        # Statistics for every stack of handlers that has been sampled, the
+        # self time of a stack excludes the time spent in nested handlers
+        self.stacks: Dict[Tuple[str, ...], Dict[str, float]] = {}
+
+        self.frames: List[Frame] = []
+        self.skipped_depth = 0
+
+    def call(self, name: str, func: Callable, *args: Any) -> Any:
+        """
+        Calls the function, recording it as a step named `name` nested in
+        any step currently running.
+        """
+
+        if self.skipped_depth or (
+            not self.frames and random.random() >= self.sample_rate
+        ):
+            self.skipped_depth += 1
+            try:
+                return func(*args)
+            finally:
+                self.skipped_depth -= 1
+
+        frame = Frame(name)
+        self.frames.append(frame)
+        blocks = sys.getallocatedblocks() if self.track_allocations else 0
+        cpu_started = time.thread_time()
+        started = time.perf_counter()
+
+        try:
+            return func(*args)
+        finally:
+            wall = time.perf_counter() - started
+            cpu = time.thread_time() - cpu_started
+            if self.track_allocations:
+                blocks = sys.getallocatedblocks() - blocks
+
+            stack = tuple(frame.name for frame in self.frames)
+            self.frames.pop()
+            if self.frames:
+                self.frames[-1].child_wall += wall
+                self.frames[-1].child_cpu += cpu
+
+            self.record(stack, wall, cpu, frame.child_wall, frame.child_cpu, blocks)
+
+    def record(
+        self,
+        stack: Tuple[str, ...],
+        wall: float,
+        cpu: float,
+        child_wall: float,
+        child_cpu: float,
+        allocations: int,
+    ) -> None:
+        stats = self.stacks.get(stack)
+        if not stats:
+            stats = self.stacks[stack] = {
+                'calls': 0,
+                'wall': 0.0,
+                'cpu': 0.0,
+                'self_wall': 0.0,
+                'self_cpu': 0.0,
+                'allocations': 0,
+            }
+
+        stats['calls'] += 1
+        stats['wall'] += wall
+        stats['cpu'] += cpu
+        stats['self_wall'] += wall - child_wall
+        stats['self_cpu'] += cpu - child_cpu
+        stats['allocations'] += allocations
+
+    def reset(self) -> None:
+        self.stacks.clear()
+
+    @property
+    def handlers(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns the statistics of each step by name, regardless of which
+        steps it was nested in.
+        """
+
+        handlers: Dict[str, Dict[str, float]] = {}
+
+        for stack, stats in self.stacks.items():
+            handler = handlers.setdefault(stack[-1], dict.fromkeys(STATISTICS, 0))
+            for statistic in STATISTICS:
+                handler[statistic] += stats[statistic]
+
+        return handlers
+
+    def report(self, sort: str = 'wall', limit: int = 0) -> str:
+        """
+        Returns a table of the steps sorted by `sort` (one of calls, wall,
+        cpu or allocations), times are in milliseconds.
+        """
+
+        handlers = sorted(
+            self.handlers.items(), key=lambda item: item[1][sort], reverse=True
+        )
+        if limit:
+            handlers = handlers[:limit]
+
+        lines = [
+            '{:<48} {:>8} {:>12} {:>12} {:>12} {:>12}'.format(
+                'handler', 'calls', 'wall ms', 'cpu ms', 'per call ms', 'allocations'
+            )
+        ]
+
+        for name, stats in handlers:
+            lines.append(
+                '{:<48} {:>8} {:>12.3f} {:>12.3f} {:>12.4f} {:>12}'.format(
+                    name,
+                    stats['calls'],
+                    stats['wall'] * 1000,
+                    stats['cpu'] * 1000,
+                    stats['wall'] * 1000 / stats['calls'],
+                    stats['allocations'],
+                )
+            )
+
+        return '\n'.join(lines)
+
+    def collapsed(self, statistic: str = 'wall') -> str:
+        """
+        Returns the self time of each stack in microseconds (or the
+        allocations) in the collapsed stack format read by flamegraph.pl
+        and speedscope.
+
+        >>> print(profiler.collapsed())
+        process_privmsg;Bot.irc_channel_message 1520
+        """
+
+        lines = []
+
+        for stack, stats in sorted(self.stacks.items()):
+            if statistic == 'allocations':
+                value = stats['allocations']
+            else:
+                value = round(stats['self_' + statistic] * 1000000)
+
+            if value > 0:
+                lines.append('{} {}'.format(';'.join(stack), value))
+
+        return '\n'.join(lines)
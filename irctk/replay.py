@@ -0,0 +1,165 @@
+import asyncio
+import os
+import time
+from typing import Iterable, NamedTuple, Optional, Union
+
+from irctk.client import Client
+from irctk.journal import JournalReader
+from irctk.trace import RECEIVED, read_capture
+
+
+class VirtualClock:
+    """
+    A clock which only advances when it is told to, replacing
+    `Client.clock` while replaying.
+    """
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class ReplayWriter:
+    """
+    Stands in for the connection of a replayed client, discarding every
+    line that is sent.
+    """
+
+    class Transport:
+        def is_closing(self) -> bool:
+            return False
+
+        def get_write_buffer_size(self) -> int:
+            return 0
+
+        def set_write_buffer_limits(self, high=None, low=None) -> None:
+            pass
+
+        def abort(self) -> None:
+            pass
+
+    def __init__(self) -> None:
+        self.transport = self.Transport()
+        self.lines = 0
+        self.bytes = 0
+
+    def write(self, data: bytes) -> None:
+        self.lines += 1
+        self.bytes += len(data)
+
+    async def drain(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class ReplayStats(NamedTuple):
+    # Lines received which were processed, and lines which were sent
+    # during the replay and discarded
+    lines: int
+    bytes: int
+    suppressed_lines: int
+
+    # Wall clock seconds the replay took, and seconds of traffic replayed
+    elapsed: float
+    duration: float
+
+    @property
+    def lines_per_second(self) -> float:
+        return self.lines / self.elapsed if self.elapsed else 0.0
+
+
+class Replay:
+    """
+    Drives a client with previously captured traffic, processing each line
+    received as if it had been read from the connection. Lines the client
+    sends are discarded and the clients clock follows the timestamps of the
+    capture.
+
+    >>> replay = Replay(client)
+    >>> stats = await replay.run(read_capture('irc.jsonl'))
+    >>> stats.lines_per_second
+    85312.4
+
+    By default lines are replayed as fast as possible, passing a `speed`
+    paces the lines to their original timestamps (`2` replays at twice the
+    original speed).
+    """
+
+    def __init__(self, client: Client, speed: Optional[float] = None):
+        self.client = client
+        self.speed = speed
+        self.clock = VirtualClock()
+        self.writer = ReplayWriter()
+
+        # Lines processed between giving scheduled handlers a chance to run
+        self.yield_interval = 1000
+
+    async def run(self, records: Iterable) -> ReplayStats:
+        """
+        Replays records with a `time`, `direction` and `line`, such as
+        those read by `read_capture()` or a `JournalReader`.
+        """
+
+        client = self.client
+        client.clock = self.clock  # type: ignore
+        client.writer = self.writer  # type: ignore
+        client.is_connected = True
+
+        lines = 0
+        size = 0
+        first: Optional[float] = None
+        started = time.perf_counter()
+
+        for record in records:
+            if record.direction != RECEIVED:
+                continue
+
+            line: Union[str, bytes] = record.line
+            if isinstance(line, str):
+                size += len(line.encode('utf-8'))
+            else:
+                size += len(line)
+                line = line.decode('utf-8', errors='replace')
+
+            if first is None:
+                first = record.time
+
+            if self.speed:
+                delay = (record.time - first) / self.speed - (
+                    time.perf_counter() - started
+                )
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            self.clock.now = record.time
+            client.process_lines([line])
+
+            lines += 1
+            if lines % self.yield_interval == 0:
+                await asyncio.sleep(0)
+
+        # Allow any handlers which were scheduled to complete
+        await asyncio.sleep(0)
+
+        return ReplayStats(
+            lines=lines,
+            bytes=size,
+            suppressed_lines=self.writer.lines,
+            elapsed=time.perf_counter() - started,
+            duration=self.clock.now - first if first is not None else 0.0,
+        )
+
+
+def load_records(path: str) -> Iterable:
+    """
+    Returns the records of a journal directory or a capture file.
+    """
+
+    if os.path.isdir(path):
+        return JournalReader(path)
+
+    return read_capture(path)
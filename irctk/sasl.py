@@ -0,0 +1,142 @@
+import base64
+import hashlib
+import hmac
+import os
+from typing import Dict, Optional
+
+
+class SASLError(Exception):
+    pass
+
+
+class Mechanism:
+    """
+    A SASL mechanism used to authenticate while registering once assigned
+    to `Client.sasl`.
+
+    >>> client.sasl = Plain('kyle', 'sekret')
+
+    `respond()` is called with each challenge from the server and returns
+    the response. Mechanisms which are `expensive` are responded to in an
+    executor, away from the event loop.
+    """
+
+    name = ''
+    expensive = False
+
+    def reset(self) -> None:
+        """
+        Called before authenticating with the mechanism on each connection.
+        """
+
+    def respond(self, challenge: bytes) -> bytes:
+        raise NotImplementedError
+
+
+class Plain(Mechanism):
+    name = 'PLAIN'
+
+    def __init__(self, username: str, password: str, authzid: str = ''):
+        self.username = username
+        self.password = password
+        self.authzid = authzid
+
+    def respond(self, challenge: bytes) -> bytes:
+        return '\0'.join([self.authzid, self.username, self.password]).encode('utf-8')
+
+
+class External(Mechanism):
+    """
+    Authenticates using the TLS client certificate of the connection.
+    """
+
+    name = 'EXTERNAL'
+
+    def __init__(self, authzid: str = ''):
+        self.authzid = authzid
+
+    def respond(self, challenge: bytes) -> bytes:
+        return self.authzid.encode('utf-8')
+
+
+class ScramSHA256(Mechanism):
+    """
+    Authenticates without sending the password (RFC 7677). Deriving the
+    salted password is deliberately slow, so responses are computed in an
+    executor.
+    """
+
+    name = 'SCRAM-SHA-256'
+    expensive = True
+
+    def __init__(self, username: str, password: str):
+        self.username = username
+        self.password = password
+        self.reset()
+
+    def reset(self) -> None:
+        self.nonce = base64.b64encode(os.urandom(18)).decode('ascii')
+        self.client_first_bare: Optional[str] = None
+        self.server_signature: Optional[bytes] = None
+
+    def respond(self, challenge: bytes) -> bytes:
+        if self.client_first_bare is None:
+            username = self.username.replace('=', '=3D').replace(',', '=2C')
+            self.client_first_bare = 'n={},r={}'.format(username, self.nonce)
+            return ('n,,' + self.client_first_bare).encode('utf-8')
+
+        if self.server_signature is None:
+            return self.client_final(challenge.decode('utf-8'))
+
+        attributes = parse_attributes(challenge.decode('utf-8'))
+        if 'e' in attributes:
+            raise SASLError('Server rejected authentication: ' + attributes['e'])
+
+        signature = base64.b64decode(attributes.get('v', ''))
+        if not hmac.compare_digest(signature, self.server_signature):
+            raise SASLError('Invalid server signature')
+
+        return b''
+
+    def client_final(self, server_first: str) -> bytes:
+        attributes = parse_attributes(server_first)
+        nonce = attributes.get('r', '')
+        if not nonce.startswith(self.nonce):
+            raise SASLError('Invalid server nonce')
+
+        if 's' not in attributes or not attributes.get('i', '').isdigit():
+            raise SASLError('Invalid server challenge')
+
+        salted = hashlib.pbkdf2_hmac(
+            'sha256',
+            self.password.encode('utf-8'),
+            base64.b64decode(attributes['s']),
+            int(attributes['i']),
+        )
+
+        client_key = hmac.digest(salted, b'Client Key', 'sha256')
+        stored_key = hashlib.sha256(client_key).digest()
+        server_key = hmac.digest(salted, b'Server Key', 'sha256')
+
+        without_proof = 'c=biws,r=' + nonce
+        auth_message = ','.join(
+            [str(self.client_first_bare), server_first, without_proof]
+        ).encode('utf-8')
+
+        signature = hmac.digest(stored_key, auth_message, 'sha256')
+        proof = bytes(a ^ b for a, b in zip(client_key, signature))
+        self.server_signature = hmac.digest(server_key, auth_message, 'sha256')
+
+        return '{},p={}'.format(
+            without_proof, base64.b64encode(proof).decode('ascii')
+        ).encode('utf-8')
+
+
+def parse_attributes(message: str) -> Dict[str, str]:
+    attributes = {}
+
+    for attribute in message.split(','):
+        name, _, value = attribute.partition('=')
+        attributes[name] = value
+
+    return attributes
@@ -0,0 +1,411 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+from multiprocessing.connection import Connection
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+)
+
+from irctk.client import Client, Server
+from irctk.pool import ClientPool
+
+
+class ClientSpec(NamedTuple):
+    """
+    Describes a client to run in a shard, it must be picklable.
+    """
+
+    client_id: str
+    servers: List[Server]
+    network: Optional[str] = None
+    options: Optional[Dict[str, Any]] = None
+
+
+class Event(NamedTuple):
+    """
+    An event published by a client running in a shard.
+    """
+
+    shard: int
+    client_id: str
+    type: str
+    data: Dict[str, Any]
+
+
+class ShardCommand(NamedTuple):
+    """
+    A command sent from the coordinator to a shard. A command without a
+    client stops the shard.
+    """
+
+    client_id: Optional[str]
+    line: Optional[str] = None
+
+
+class ShardReport(NamedTuple):
+    """
+    Periodic health and load report of a shard.
+    """
+
+    shard: int
+    pid: int
+    clients: int
+    connected: int
+    registered: int
+    events: int
+    loop_lag: float
+    dropped_events: int = 0
+
+
+def create_client(spec: ClientSpec) -> Client:
+    return Client(**(spec.options or {}))
+
+
+class EventBusModule:
+    """
+    Client module publishing the clients events to the coordinator.
+    """
+
+    def __init__(self, shard: 'Shard', client_id: str):
+        self.shard = shard
+        self.client_id = client_id
+
+    def publish(self, type: str, **data: Any) -> None:
+        self.shard.publish(Event(self.shard.shard_id, self.client_id, type, data))
+
+    def irc_registered(self, client: Client) -> None:
+        self.publish('registered', nick=client.nick.nick)
+
+    def irc_disconnected(self, client: Client, error: Optional[Exception]) -> None:
+        self.publish('disconnected', error=str(error) if error else None)
+
+    def irc_private_message(self, client: Client, nick, message: str) -> None:
+        self.publish('private_message', nick=nick.nick, host=nick.host, text=message)
+
+    def irc_channel_message(self, client: Client, nick, channel, message: str) -> None:
+        self.publish(
+            'channel_message',
+            nick=nick.nick,
+            host=nick.host,
+            channel=channel.name,
+            text=message,
+        )
+
+    def irc_channel_join(self, client: Client, nick, channel) -> None:
+        self.publish('channel_join', nick=nick.nick, channel=channel.name)
+
+    def irc_channel_part(self, client: Client, nick, channel, message) -> None:
+        self.publish(
+            'channel_part', nick=nick.nick, channel=channel.name, reason=message
+        )
+
+    def irc_channel_kick(self, client: Client, nick, channel, message) -> None:
+        self.publish(
+            'channel_kick', nick=nick.nick, channel=channel.name, reason=message
+        )
+
+
+class Shard:
+    """
+    Runs the clients of a single shard, inside of the shards process.
+
+    Events are written to the coordinator from a thread so that a
+    coordinator which stops reading cannot block the shards event loop.
+    Once `max_pending_events` are waiting to be written further events are
+    dropped.
+    """
+
+    def __init__(
+        self,
+        shard_id: int,
+        specs: List[ClientSpec],
+        connection: Connection,
+        factory: Callable[[ClientSpec], Client] = create_client,
+        report_interval: float = 5,
+        connections_per_second: float = 10,
+        max_pending_events: int = 10000,
+    ):
+        self.logger = logging.getLogger(__name__)
+
+        self.shard_id = shard_id
+        self.specs = specs
+        self.connection = connection
+        self.factory = factory
+        self.report_interval = report_interval
+
+        self.pool = ClientPool(connections_per_second)
+        self.clients: Dict[str, Client] = {}
+        self.events = 0
+        self.loop_lag = 0.0
+
+        self.outbox: queue.Queue = queue.Queue(max_pending_events)
+        self.writer: Optional[threading.Thread] = None
+        self.dropped_events = 0
+
+    def publish(self, event: Any) -> None:
+        self.events += 1
+
+        try:
+            self.outbox.put_nowait(event)
+        except queue.Full:
+            if not self.dropped_events:
+                self.logger.warning('Coordinator is not reading, dropping events')
+            self.dropped_events += 1
+
+    def write_events(self) -> None:
+        while True:
+            event = self.outbox.get()
+            if event is None:
+                return
+
+            try:
+                self.connection.send(event)
+            except OSError:
+                return
+
+    def start_writer(self) -> None:
+        self.writer = threading.Thread(target=self.write_events, daemon=True)
+        self.writer.start()
+
+    def stop_writer(self, timeout: float = 5) -> None:
+        """
+        Waits for the pending events to be written, blocking.
+        """
+
+        if self.writer:
+            try:
+                self.outbox.put(None, timeout=timeout)
+            except queue.Full:
+                return
+
+            self.writer.join(timeout)
+
+    def report(self) -> ShardReport:
+        stats = self.pool.stats
+        return ShardReport(
+            shard=self.shard_id,
+            pid=os.getpid(),
+            clients=stats['clients'],
+            connected=stats['connected'],
+            registered=stats['registered'],
+            events=self.events,
+            loop_lag=self.loop_lag,
+            dropped_events=self.dropped_events,
+        )
+
+    def receive(self, stopped: asyncio.Future) -> None:
+        while self.connection.poll():
+            try:
+                command = self.connection.recv()
+            except EOFError:
+                command = ShardCommand(None)
+
+            if command.client_id is None:
+                if not stopped.done():
+                    stopped.set_result(None)
+                return
+
+            client = self.clients.get(command.client_id)
+            if client and client.is_connected and command.line:
+                client.send_line(command.line)
+
+    async def monitor(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.report_interval)
+            self.loop_lag = max(0.0, loop.time() - started - self.report_interval)
+            self.publish(self.report())
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopped = loop.create_future()
+
+        for spec in self.specs:
+            client = self.factory(spec)
+            client.modules.append(EventBusModule(self, spec.client_id))
+            self.clients[spec.client_id] = client
+            self.pool.add(client, spec.servers, spec.network)
+
+        self.start_writer()
+        loop.add_reader(self.connection.fileno(), self.receive, stopped)
+        monitor = asyncio.ensure_future(self.monitor())
+
+        try:
+            await self.pool.start()
+            await stopped
+        finally:
+            loop.remove_reader(self.connection.fileno())
+            monitor.cancel()
+            await self.pool.stop()
+            self.publish(self.report())
+            await loop.run_in_executor(None, self.stop_writer)
+            self.connection.close()
+
+
+def run_shard(
+    shard_id: int,
+    specs: List[ClientSpec],
+    connection: Connection,
+    factory: Callable[[ClientSpec], Client],
+    report_interval: float,
+    connections_per_second: float,
+) -> None:
+    shard = Shard(
+        shard_id, specs, connection, factory, report_interval, connections_per_second
+    )
+    asyncio.run(shard.run())
+
+
+class ShardedRunner:
+    """
+    Spreads clients across a pool of processes, so that parsing and
+    dispatching messages scales with the number of cores.
+
+    Events from every client are received by iterating over `events()`,
+    commands can be sent to a client with `send_line()`.
+
+    >>> runner = ShardedRunner(specs, shards=4)
+    >>> runner.start()
+    >>> async for event in runner.events():
+    ...     if event.type == 'channel_message' and event.data['text'] == 'ping':
+    ...         runner.send_line(event.client_id, 'PRIVMSG {} :pong'.format(
+    ...             event.data['channel']))
+    """
+
+    def __init__(
+        self,
+        specs: List[ClientSpec],
+        shards: Optional[int] = None,
+        factory: Callable[[ClientSpec], Client] = create_client,
+        report_interval: float = 5,
+        connections_per_second: float = 10,
+    ):
+        self.logger = logging.getLogger(__name__)
+
+        self.specs = specs
+        self.shard_count = max(1, min(shards or os.cpu_count() or 1, len(specs)))
+        self.factory = factory
+        self.report_interval = report_interval
+        self.connections_per_second = connections_per_second
+
+        self.processes: List[multiprocessing.Process] = []
+        self.connections: List[Connection] = []
+        self.routes: Dict[str, int] = {}
+        self.reports: Dict[int, ShardReport] = {}
+
+    def start(self) -> None:
+        """
+        Starts a process for every shard, clients are spread evenly.
+        """
+
+        for shard_id in range(self.shard_count):
+            specs = self.specs[shard_id :: self.shard_count]
+            for spec in specs:
+                self.routes[spec.client_id] = shard_id
+
+            connection, child_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=run_shard,
+                args=(
+                    shard_id,
+                    specs,
+                    child_connection,
+                    self.factory,
+                    self.report_interval,
+                    self.connections_per_second,
+                ),
+                daemon=True,
+            )
+            process.start()
+            child_connection.close()
+
+            self.processes.append(process)
+            self.connections.append(connection)
+
+    def send_line(self, client_id: str, line: str) -> None:
+        """
+        Sends a raw line from the given client.
+        """
+
+        self.connections[self.routes[client_id]].send(ShardCommand(client_id, line))
+
+    async def events(self) -> AsyncIterator[Event]:
+        """
+        Yields the events of every client until every shard has stopped.
+        Shard reports are recorded in `reports` as they arrive.
+        """
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        open_connections = set(range(len(self.connections)))
+
+        def receive(shard_id: int) -> None:
+            connection = self.connections[shard_id]
+
+            try:
+                while connection.poll():
+                    queue.put_nowait(connection.recv())
+            except (EOFError, OSError):
+                loop.remove_reader(connection.fileno())
+                queue.put_nowait(shard_id)
+
+        for shard_id in open_connections:
+            loop.add_reader(self.connections[shard_id].fileno(), receive, shard_id)
+
+        try:
+            while open_connections:
+                item = await queue.get()
+
+                if isinstance(item, int):
+                    open_connections.discard(item)
+                elif isinstance(item, ShardReport):
+                    self.reports[item.shard] = item
+                else:
+                    yield item
+        finally:
+            for shard_id in open_connections:
+                loop.remove_reader(self.connections[shard_id].fileno())
+
+    @property
+    def health(self) -> Dict[int, Dict[str, Any]]:
+        """
+        Returns whether each shard process is alive along with its latest
+        report.
+        """
+
+        return {
+            shard_id: {
+                'alive': process.is_alive(),
+                'report': self.reports.get(shard_id),
+            }
+            for shard_id, process in enumerate(self.processes)
+        }
+
+    async def stop(self, timeout: float = 10) -> None:
+        """
+        Stops every shard, terminating shards which do not stop in time.
+        """
+
+        for connection in self.connections:
+            try:
+                connection.send(ShardCommand(None))
+            except OSError:
+                pass
+
+        loop = asyncio.get_running_loop()
+        for process in self.processes:
+            await loop.run_in_executor(None, process.join, timeout)
+            if process.is_alive():
+                self.logger.warning('Terminating shard {}'.format(process.pid))
+                process.terminate()
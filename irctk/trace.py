@@ -0,0 +1,148 @@
+import collections
+import json
+import logging
+import struct
+import time
+from typing import IO, Deque, Iterator, List, NamedTuple, Optional
+
+RECEIVED = 'S'
+SENT = 'C'
+
+BINARY_MAGIC = b'IRCTKTR1'
+BINARY_HEADER = struct.Struct('<dcI')
+
+
+class TraceRecord(NamedTuple):
+    time: float
+    direction: str
+    line: str
+
+    def __str__(self) -> str:
+        return '{:.6f} {}: {}'.format(self.time, self.direction, self.line)
+
+
+class WireTrace:
+    """
+    Keeps the most recent lines received and sent by a client once assigned
+    to `Client.trace`, optionally writing every line to a capture file.
+
+    >>> client.trace = WireTrace(size=500, capture='irc.jsonl')
+    >>> print(client.trace.format())
+
+    The lines are dumped to the `irctk.trace` logger, or appended to
+    `dump_path`, when the connection is lost with an error or processing a
+    message fails.
+
+    Capture files are written as JSON lines, or in a compact binary format
+    when `capture_format` is `binary`, and are read by `read_capture()`.
+    """
+
+    def __init__(
+        self,
+        size: int = 1000,
+        capture: Optional[str] = None,
+        capture_format: str = 'jsonl',
+        dump_path: Optional[str] = None,
+    ):
+        if capture_format not in ('jsonl', 'binary'):
+            raise ValueError('Unsupported capture format {}'.format(capture_format))
+
+        self.logger = logging.getLogger(__name__)
+
+        self.received: Deque[TraceRecord] = collections.deque(maxlen=size)
+        self.sent: Deque[TraceRecord] = collections.deque(maxlen=size)
+        self.dump_path = dump_path
+
+        self.capture_format = capture_format
+        self.capture: Optional[IO[bytes]] = None
+        if capture:
+            self.capture = open(capture, 'ab')
+            if capture_format == 'binary' and self.capture.tell() == 0:
+                self.capture.write(BINARY_MAGIC)
+
+    def record_received(self, line: str) -> None:
+        record = TraceRecord(time.time(), RECEIVED, line)
+        self.received.append(record)
+        if self.capture:
+            self.write(record)
+
+    def record_sent(self, line: str) -> None:
+        record = TraceRecord(time.time(), SENT, line)
+        self.sent.append(record)
+        if self.capture:
+            self.write(record)
+
+    def write(self, record: TraceRecord) -> None:
+        assert self.capture
+
+        if self.capture_format == 'binary':
+            data = record.line.encode('utf-8')
+            self.capture.write(
+                BINARY_HEADER.pack(record.time, record.direction.encode(), len(data))
+                + data
+            )
+        else:
+            self.capture.write(
+                json.dumps(
+                    {'t': record.time, 'd': record.direction, 'l': record.line}
+                ).encode('utf-8')
+                + b'\n'
+            )
+
+    @property
+    def records(self) -> List[TraceRecord]:
+        """
+        Returns the buffered lines in both directions in the order they
+        were received or sent.
+        """
+
+        return sorted(
+            list(self.received) + list(self.sent), key=lambda record: record.time
+        )
+
+    def format(self) -> str:
+        return '\n'.join(map(str, self.records))
+
+    def dump(self, reason: str) -> None:
+        """
+        Dumps the buffered lines to `dump_path` or the logger.
+        """
+
+        if self.dump_path:
+            with open(self.dump_path, 'a') as fp:
+                fp.write('# {}\n{}\n'.format(reason, self.format()))
+        else:
+            self.logger.warning('{}, recent lines:\n{}'.format(reason, self.format()))
+
+        if self.capture:
+            self.capture.flush()
+
+    def close(self) -> None:
+        if self.capture:
+            self.capture.close()
+            self.capture = None
+
+
+def read_capture(path: str) -> Iterator[TraceRecord]:
+    """
+    Reads the records of a capture file written by `WireTrace`, in either
+    format.
+    """
+
+    with open(path, 'rb') as fp:
+        if fp.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+            fp.seek(0)
+            for line in fp:
+                record = json.loads(line)
+                yield TraceRecord(record['t'], record['d'], record['l'])
+            return
+
+        while True:
+            header = fp.read(BINARY_HEADER.size)
+            if len(header) < BINARY_HEADER.size:
+                return
+
+            timestamp, direction, length = BINARY_HEADER.unpack(header)
+            yield TraceRecord(
+                timestamp, direction.decode(), fp.read(length).decode('utf-8')
+            )
@@ -0,0 +1,45 @@
+from irctk.batch import Batch
+from irctk.message import Message
+
+
+def test_batch_parses_start_message() -> None:
+    batch = Batch(Message.parse('BATCH +yXNAbvnRHTRBv netsplit a.net b.net'))
+    assert batch.reference_tag == 'yXNAbvnRHTRBv'
+    assert batch.type == 'netsplit'
+    assert batch.parameters == ['a.net', 'b.net']
+    assert batch.parent is None
+
+
+def test_batch_nested_parent() -> None:
+    parent = Batch(Message.parse('BATCH +outer labeled-response'))
+    child = Batch(Message.parse('@batch=outer BATCH +inner netjoin'), parent)
+
+    assert parent.children == [child]
+    assert child.root is parent
+    assert list(parent.walk()) == [parent, child]
+
+
+def test_batch_iterates_nested_messages_in_order() -> None:
+    parent = Batch(Message.parse('BATCH +outer labeled-response'))
+    start = Message.parse('@batch=outer BATCH +inner netjoin')
+    child = Batch(start, parent)
+    parent.append(start)
+    child.append(Message.parse('@batch=inner :a JOIN #test'))
+    child.append(Message.parse('BATCH -inner'))
+    parent.append(Message.parse('BATCH -outer'))
+
+    assert [str(message) for message in parent] == [
+        'BATCH +outer labeled-response',
+        '@batch=outer BATCH +inner netjoin',
+        '@batch=inner :a JOIN #test',
+        'BATCH -inner',
+        'BATCH -outer',
+    ]
+
+
+def test_batch_append_without_buffering() -> None:
+    batch = Batch(Message.parse('BATCH +tag chathistory #test'))
+    batch.append(Message.parse('@batch=tag :a PRIVMSG #test :Hi'), buffer=False)
+
+    assert batch.message_count == 2
+    assert len(batch.messages) == 1
@@ -0,0 +1,19 @@
+from benchmarks.run import BENCHMARKS, compare
+
+
+def test_benchmarks_run() -> None:
+    for setup in BENCHMARKS.values():
+        setup()()
+
+
+def test_compare_reports_regressions() -> None:
+    baseline = {'fast': {'ns_per_op': 100.0}, 'slow': {'ns_per_op': 100.0}}
+    results = {
+        'fast': {'ns_per_op': 120.0},
+        'slow': {'ns_per_op': 150.0},
+        'new': {'ns_per_op': 1000.0},
+    }
+
+    assert compare(results, baseline, 0.25) == [
+        'slow: 150.0ns, baseline 100.0ns (+50%)'
+    ]
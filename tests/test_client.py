@@ -1,12 +1,32 @@
+import asyncio
 import datetime
+import socket
+import tempfile
+import threading
+import time
 import unittest
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from typing import List
 
+from irctk.client import Client as ConnectionClient
+from irctk.client import IRCIgnoreLine, Registration, Server, offload
+from irctk.journal import JournalReader, JournalWriter
 from irctk.message import Message, MessageTag
+from irctk.metrics import Metrics
 from irctk.nick import Nick
+from irctk.sasl import Plain, ScramSHA256
+from irctk.trace import WireTrace
 from tests.mock_client import MockClient as Client
 
 
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
 class ClientTests(unittest.TestCase):
     def setUp(self) -> None:
         self.client = Client('kylef', 'kyle', 'Kyle Fuller')
@@ -58,6 +78,33 @@ class ClientTests(unittest.TestCase):
         )
         self.assertTrue(self.client.is_registered)
 
+    def test_client_tries_generated_nicknames_while_registering(self) -> None:
+        self.client.authenticate()
+        self.client.sent_lines = []
+
+        for _ in range(3):
+            self.client.process_line(
+                ':irc.example.com 433 * kylef :Nickname is already in use'
+            )
+
+        self.assertEqual(
+            self.client.sent_lines, ['NICK kylef_', 'NICK kylef__', 'NICK kylef1']
+        )
+
+    def test_client_measures_time_to_registered_and_ready(self) -> None:
+        now = [10.0]
+        self.client.clock = lambda: now[0]  # type: ignore
+
+        self.client.authenticate()
+        now[0] = 10.5
+        self.client.process_line(':irc.example.com 001 kylef :Welcome')
+        now[0] = 11.0
+        self.client.process_line(':irc.example.com 376 kylef :End of MOTD')
+
+        self.assertEqual(self.client.registration, Registration.READY)
+        self.assertEqual(self.client.time_to_registered, 0.5)
+        self.assertEqual(self.client.time_to_ready, 1.0)
+
     # Ping
 
     def test_client_sends_pong_when_pinged(self) -> None:
@@ -85,6 +132,15 @@ class ClientTests(unittest.TestCase):
         self.assertEqual(self.client.isupport.maximum_nick_length, 5)
         self.assertEqual(self.client.isupport.maximum_channel_length, 6)
 
+    def test_client_handles_5_with_multiple_tokens(self) -> None:
+        self.client.process_line(
+            ':irc.example.com 005 kyle CHANLIMIT=#:250 WHOX NICKLEN=30 '
+            ':are supported by this server'
+        )
+        self.assertEqual(self.client.isupport.channel_limits, {'#': 250})
+        self.assertTrue(self.client.isupport.whox)
+        self.assertEqual(self.client.isupport.maximum_nick_length, 30)
+
     def test_client_handles_joining_channel(self) -> None:
         self.client.process_line(':kylef!kyle@kyle JOIN #test')
 
@@ -224,7 +280,7 @@ class ClientTests(unittest.TestCase):
 
     def test_client_asks_for_server_capabilities_on_connection(self) -> None:
         self.client.authenticate()
-        self.assertEqual(self.client.sent_lines[0], 'CAP LS')
+        self.assertEqual(self.client.sent_lines[0], 'CAP LS 302')
 
     def test_client_ends_capabilities_negotiation_after_no_caps(self) -> None:
         self.client.authenticate()
@@ -254,6 +310,291 @@ class ClientTests(unittest.TestCase):
         self.assertEqual(self.client.sent_lines, ['CAP END'])
         self.assertEqual(self.client.cap_accepted, [])
 
+    def test_client_requests_capabilities_in_a_single_line(self) -> None:
+        self.client.authenticate()
+        self.client.sent_lines = []
+        self.client.process_line(
+            ':irc.example.com CAP * LS :multi-prefix sasl=PLAIN,EXTERNAL batch'
+        )
+        self.assertEqual(self.client.sent_lines, ['CAP REQ :multi-prefix batch'])
+        self.assertEqual(
+            self.client.caps,
+            {'multi-prefix': None, 'sasl': 'PLAIN,EXTERNAL', 'batch': None},
+        )
+
+        self.client.sent_lines = []
+        self.client.process_line(':irc.example.com CAP * ACK :multi-prefix batch')
+        self.assertEqual(self.client.sent_lines, ['CAP END'])
+        self.assertEqual(self.client.cap_accepted, ['multi-prefix', 'batch'])
+
+    def test_client_waits_for_every_page_of_multiline_capabilities(self) -> None:
+        self.client.authenticate()
+        self.client.sent_lines = []
+        self.client.process_line(':irc.example.com CAP * LS * :multi-prefix')
+        self.assertEqual(self.client.sent_lines, [])
+
+        self.client.process_line(':irc.example.com CAP * LS :server-time')
+        self.assertEqual(self.client.sent_lines, ['CAP REQ :multi-prefix server-time'])
+
+    def test_client_splits_capability_requests_longer_than_a_line(self) -> None:
+        self.client.supports_cap = lambda cap: True  # type: ignore
+        caps = ['capability-{}'.format(i) for i in range(60)]
+
+        self.client.sent_lines = []
+        self.client.process_line(':irc.example.com CAP * LS :{}'.format(' '.join(caps)))
+
+        self.assertEqual(len(self.client.sent_lines), 2)
+        self.assertTrue(all(len(line) + 2 <= 512 for line in self.client.sent_lines))
+        requested = [
+            Message.parse(line).parameters[-1] for line in self.client.sent_lines
+        ]
+        self.assertEqual(' '.join(requested).split(), caps)
+
+    def test_client_requests_new_capabilities_after_registration(self) -> None:
+        self.client.is_registered = True
+        self.client.process_line(':irc.example.com CAP kylef NEW :server-time foo')
+        self.assertEqual(self.client.sent_lines, ['CAP REQ server-time'])
+
+        self.client.sent_lines = []
+        self.client.process_line(':irc.example.com CAP kylef ACK :server-time')
+        self.assertEqual(self.client.sent_lines, [])
+        self.assertEqual(self.client.cap_accepted, ['server-time'])
+
+    def test_client_removes_deleted_capabilities(self) -> None:
+        self.client.is_registered = True
+        self.client.process_line(':irc.example.com CAP kylef NEW :server-time')
+        self.client.process_line(':irc.example.com CAP kylef ACK :server-time')
+        self.client.process_line(':irc.example.com CAP kylef DEL :server-time')
+
+        self.assertEqual(self.client.cap_accepted, [])
+        self.assertEqual(self.client.caps, {})
+
+    # SASL
+
+    def test_client_authenticates_with_sasl_before_ending_negotiation(self) -> None:
+        self.client.sasl = Plain('kyle', 'sekret')
+        self.client.authenticate()
+        self.client.sent_lines = []
+
+        self.client.process_line(':irc.example.com CAP * LS :sasl=PLAIN,EXTERNAL')
+        self.client.process_line(':irc.example.com CAP * ACK :sasl')
+        self.assertEqual(self.client.sent_lines, ['CAP REQ sasl', 'AUTHENTICATE PLAIN'])
+
+        self.client.sent_lines = []
+        self.client.process_line('AUTHENTICATE +')
+        self.assertEqual(self.client.sent_lines, ['AUTHENTICATE AGt5bGUAc2VrcmV0'])
+
+        self.client.sent_lines = []
+        self.client.process_line(
+            ':irc.example.com 900 kylef kylef!kyle@kyle kyle :Logged in as kyle'
+        )
+        self.client.process_line(':irc.example.com 903 kylef :SASL successful')
+        self.assertEqual(self.client.sent_lines, ['CAP END'])
+        self.assertEqual(self.client.account, 'kyle')
+
+    def test_client_ends_negotiation_after_sasl_failure(self) -> None:
+        self.client.sasl = Plain('kyle', 'wrong')
+        self.client.authenticate()
+        self.client.process_line(':irc.example.com CAP * LS :sasl')
+        self.client.process_line(':irc.example.com CAP * ACK :sasl')
+        self.client.process_line('AUTHENTICATE +')
+
+        self.client.sent_lines = []
+        self.client.process_line(':irc.example.com 904 kylef :SASL failed')
+        self.assertEqual(self.client.sent_lines, ['CAP END'])
+        self.assertIsNone(self.client.account)
+
+    def test_client_does_not_request_sasl_with_unsupported_mechanism(self) -> None:
+        self.client.sasl = Plain('kyle', 'sekret')
+        self.client.authenticate()
+        self.client.sent_lines = []
+
+        self.client.process_line(':irc.example.com CAP * LS :sasl=EXTERNAL')
+        self.assertEqual(self.client.sent_lines, ['CAP END'])
+
+    def test_client_responds_to_scram_challenges_in_executor(self) -> None:
+        async def authenticate() -> None:
+            self.client.sasl = ScramSHA256('user', 'pencil')
+            self.client.authenticate()
+            self.client.process_line(':irc.example.com CAP * LS :sasl')
+            self.client.process_line(':irc.example.com CAP * ACK :sasl')
+            self.client.sasl.nonce = 'rOprNGfwEbeRWgbNEkqO'  # type: ignore
+
+            self.client.sent_lines = []
+            self.client.process_line('AUTHENTICATE +')
+            await asyncio.sleep(0.1)
+
+        run(authenticate())
+
+        self.assertEqual(
+            self.client.sent_lines,
+            ['AUTHENTICATE biwsbj11c2VyLHI9ck9wck5HZndFYmVSV2diTkVrcU8='],
+        )
+
+    def test_client_splits_long_sasl_responses(self) -> None:
+        self.client.send_sasl_response(b'x' * 300)
+
+        self.assertEqual(
+            [len(line) for line in self.client.sent_lines],
+            [len('AUTHENTICATE ') + 400, len('AUTHENTICATE +')],
+        )
+
+    # WHOX
+
+    def test_client_enriches_members_with_whox_after_joining(self) -> None:
+        self.client.process_line(':irc.example.com 001 kylef :Welcome')
+        self.client.process_line(':irc.example.com 005 kylef WHOX :are supported')
+        self.client.sent_lines = []
+
+        self.client.process_line(':kylef!kyle@kyle JOIN #test')
+        self.assertEqual(self.client.sent_lines, ['WHO #test %tcuhnfar,1'])
+
+        self.client.process_line(':irc.example.com 353 kylef = #test :@kylef doe')
+        self.client.process_line(':irc.example.com 366 kylef #test :End')
+        self.client.process_line(
+            ':irc.example.com 354 kylef 1 #test d doe.example.com doe G* doe :Doe'
+        )
+        self.client.process_line(
+            ':irc.example.com 354 kylef 1 #test kyle kyle.example.com kylef H@ 0 :K'
+        )
+        self.client.process_line(':irc.example.com 315 kylef #test :End of WHO')
+
+        channel = self.client.find_channel('#test')
+        assert channel
+        doe = channel.members[1].nick
+        self.assertEqual(
+            (doe.ident, doe.host, doe.account, doe.realname, doe.is_away),
+            ('d', 'doe.example.com', 'doe', 'Doe', True),
+        )
+
+        kylef = channel.members[0].nick
+        self.assertEqual(kylef.account, None)
+        self.assertFalse(kylef.is_away)
+        self.assertEqual(self.client.nick.host, 'kyle.example.com')
+
+    def test_client_sends_one_whox_query_at_a_time(self) -> None:
+        self.client.isupport.parse('WHOX')
+        self.client.whox_interval = 0
+        self.client.process_line(':irc.example.com 001 kylef :Welcome')
+        self.client.sent_lines = []
+
+        self.client.process_line(':kylef!kyle@kyle JOIN #one')
+        self.client.process_line(':kylef!kyle@kyle JOIN #two')
+        self.assertEqual(self.client.sent_lines, ['WHO #one %tcuhnfar,1'])
+
+        self.client.process_line(':irc.example.com 315 kylef #one :End of WHO')
+        self.assertEqual(
+            self.client.sent_lines, ['WHO #one %tcuhnfar,1', 'WHO #two %tcuhnfar,2']
+        )
+
+    def test_client_paces_whox_queries(self) -> None:
+        async def join() -> List[str]:
+            self.client.isupport.parse('WHOX')
+            self.client.whox_interval = 0.05
+            self.client.process_line(':irc.example.com 001 kylef :Welcome')
+            self.client.process_line(':kylef!kyle@kyle JOIN #one')
+            self.client.process_line(':kylef!kyle@kyle JOIN #two')
+            self.client.sent_lines = []
+
+            self.client.process_line(':irc.example.com 315 kylef #one :End')
+            sent = list(self.client.sent_lines)
+            await asyncio.sleep(0.1)
+            return sent
+
+        self.assertEqual(run(join()), [])
+        self.assertEqual(self.client.sent_lines, ['WHO #two %tcuhnfar,2'])
+
+    def test_client_sends_next_whox_query_after_timeout(self) -> None:
+        async def join() -> None:
+            self.client.request_timeout = 0.01
+            self.client.whox_interval = 0
+            self.client.process_line(':irc.example.com 001 kylef :Welcome')
+            self.client.process_line(':irc.example.com 005 kylef WHOX :supported')
+            self.client.process_line(':kylef!kyle@kyle JOIN #one')
+            self.client.process_line(':kylef!kyle@kyle JOIN #two')
+            self.client.sent_lines = []
+            await asyncio.sleep(0.05)
+
+        run(join())
+        self.assertEqual(self.client.sent_lines, ['WHO #two %tcuhnfar,2'])
+
+    # IRCv3 state
+
+    def test_client_tracks_account_and_realname_from_extended_join(self) -> None:
+        self.client.process_line(':kylef!kyle@kyle JOIN #test')
+        self.client.process_line(':doe!d@d JOIN #test doe :Doe')
+        self.client.process_line(':eve!e@e JOIN #test * :Eve')
+
+        channel = self.client.find_channel('#test')
+        assert channel
+        doe = channel.members[1].nick
+        eve = channel.members[2].nick
+        self.assertEqual((doe.account, doe.realname), ('doe', 'Doe'))
+        self.assertEqual((eve.account, eve.realname), (None, 'Eve'))
+
+    def test_client_tracks_account_changes(self) -> None:
+        self.client.process_line(':kylef!kyle@kyle JOIN #one')
+        self.client.process_line(':kylef!kyle@kyle JOIN #two')
+        self.client.process_line(':doe!d@d JOIN #one')
+        self.client.process_line(':doe!d@d JOIN #two')
+
+        self.client.process_line(':doe!d@d ACCOUNT doe')
+        self.assertEqual(
+            [channel.members[1].nick.account for channel in self.client.channels],
+            ['doe', 'doe'],
+        )
+
+        self.client.process_line(':doe!d@d ACCOUNT *')
+        self.assertEqual(
+            [channel.members[1].nick.account for channel in self.client.channels],
+            [None, None],
+        )
+
+    def test_client_tracks_away_changes(self) -> None:
+        self.client.process_line(':kylef!kyle@kyle JOIN #test')
+        self.client.process_line(':doe!d@d JOIN #test')
+        channel = self.client.find_channel('#test')
+        assert channel
+
+        self.client.process_line(':doe!d@d AWAY :Gone fishing')
+        self.assertTrue(channel.members[1].nick.is_away)
+
+        self.client.process_line(':doe!d@d AWAY')
+        self.assertFalse(channel.members[1].nick.is_away)
+
+    def test_client_tracks_host_changes(self) -> None:
+        self.client.process_line(':kylef!kyle@kyle JOIN #test')
+        self.client.process_line(':kylef!kyle@kyle CHGHOST ident example.com')
+
+        channel = self.client.find_channel('#test')
+        assert channel
+        self.assertEqual(channel.members[0].nick.host, 'example.com')
+        self.assertEqual(self.client.nick.ident, 'ident')
+        self.assertEqual(self.client.nick.host, 'example.com')
+
+    def test_client_tracks_realname_changes(self) -> None:
+        self.client.process_line(':kylef!kyle@kyle JOIN #test')
+        self.client.process_line(':doe!d@d JOIN #test')
+        self.client.process_line(':doe!d@d SETNAME :John Doe')
+
+        channel = self.client.find_channel('#test')
+        assert channel
+        self.assertEqual(channel.members[1].nick.realname, 'John Doe')
+
+    def test_client_tracks_hosts_from_userhost_in_names(self) -> None:
+        self.client.process_line(':kylef!kyle@kyle JOIN #test')
+        self.client.process_line(':doe!d@d JOIN #test')
+        self.client.process_line(
+            ':irc.example.com 353 kylef = #test :@kylef!kyle@kyle +doe!doe@example.com'
+        )
+        self.client.process_line(':irc.example.com 366 kylef #test :End')
+
+        channel = self.client.find_channel('#test')
+        assert channel
+        doe = channel.members[1]
+        self.assertEqual((doe.nick.ident, doe.nick.host), ('doe', 'example.com'))
+        self.assertEqual(doe.modes, ['v'])
+
     # Perform
 
     def test_client_perform_on_connect(self) -> None:
@@ -261,7 +602,7 @@ class ClientTests(unittest.TestCase):
 
         self.assertEqual(
             self.client.sent_lines,
-            ['CAP LS', 'NICK kylef', 'USER kyle 0 * :Kyle Fuller'],
+            ['CAP LS 302', 'NICK kylef', 'USER kyle 0 * :Kyle Fuller'],
         )
 
     def test_client_perform_on_connect_with_password(self) -> None:
@@ -270,7 +611,12 @@ class ClientTests(unittest.TestCase):
 
         self.assertEqual(
             self.client.sent_lines,
-            ['CAP LS', 'PASS sekret', 'NICK kylef', 'USER kyle 0 * :Kyle Fuller'],
+            [
+                'CAP LS 302',
+                'PASS sekret',
+                'NICK kylef',
+                'USER kyle 0 * :Kyle Fuller',
+            ],
         )
 
     # Delegate
@@ -441,3 +787,1003 @@ class ClientTests(unittest.TestCase):
 
         self.client.process_line(':irc.example.com 001 doe :Welcome')
         self.assertTrue(future.done())
+
+    # Join Many
+
+    def test_client_join_many(self) -> None:
+        futures = self.client.join_many(['#a', ('#b', 'key'), '#c'])
+
+        self.assertEqual(self.client.sent_lines, ['JOIN #b,#a,#c key'])
+        self.assertFalse(futures['#a'].done())
+
+        self.client.process_line(':kylef!kyle@kyle JOIN #a')
+        self.assertFalse(futures['#a'].done())
+
+        self.client.process_line(':server 366 kylef #a :End of /NAMES list.')
+        self.assertTrue(futures['#a'].done())
+        self.assertEqual(futures['#a'].result().name, '#a')
+
+    def test_client_join_many_stores_key(self) -> None:
+        self.client.join_many({'#b': 'key'})
+        self.client.process_line(':kylef!kyle@kyle JOIN #b')
+        self.client.process_line(':server 366 kylef #b :End of /NAMES list.')
+
+        channel = self.client.find_channel('#b')
+        assert channel
+        self.assertEqual(channel.key, 'key')
+
+    def test_client_join_many_splits_long_lines(self) -> None:
+        channels = ['#channel{}'.format(i) for i in range(100)]
+        self.client.join_many(channels)
+
+        self.assertEqual(len(self.client.sent_lines), 3)
+        for line in self.client.sent_lines:
+            self.assertLessEqual(len(line) + 2, 512)
+
+        joined = ','.join(line[5:] for line in self.client.sent_lines)
+        self.assertEqual(joined.split(','), channels)
+
+    def test_client_join_many_failure(self) -> None:
+        futures = self.client.join_many(['#a', '#b'])
+        self.client.process_line(':server 474 kylef #B :Cannot join channel (+b)')
+
+        self.assertTrue(futures['#b'].done())
+        self.assertIsNotNone(futures['#b'].exception())
+        self.assertFalse(futures['#a'].done())
+
+    def test_client_join_many_respects_chanlimit(self) -> None:
+        self.client.process_line(':server 005 kylef CHANLIMIT=#:2 :are supported')
+        self.client.process_line(':kylef!kyle@kyle JOIN #a')
+        futures = self.client.join_many(['#b', '#c'])
+
+        self.assertEqual(self.client.sent_lines, ['JOIN #b'])
+        self.assertFalse(futures['#b'].done())
+        self.assertIsNotNone(futures['#c'].exception())
+
+    # Backpressure
+
+    def test_client_buffered_bytes_without_connection(self) -> None:
+        self.assertEqual(self.client.buffered_bytes, 0)
+
+    def test_client_send_async(self) -> None:
+        async def send() -> None:
+            async with self.client.bulk_output():
+                await self.client.send_async('PRIVMSG', 'kyle', 'Hello')
+
+        run(send())
+        self.assertEqual(self.client.sent_lines, ['PRIVMSG kyle Hello'])
+
+    def test_client_send_async_waits_for_drain(self) -> None:
+        class Transport:
+            def __init__(self) -> None:
+                self.limits: List = []
+
+            def is_closing(self) -> bool:
+                return False
+
+            def get_write_buffer_size(self) -> int:
+                return 0
+
+            def set_write_buffer_limits(self, high=None, low=None) -> None:
+                self.limits.append((high, low))
+
+        class Writer:
+            def __init__(self) -> None:
+                self.transport = Transport()
+                self.drained = 0
+
+            async def drain(self) -> None:
+                self.drained += 1
+
+        writer = Writer()
+        self.client.writer = writer  # type: ignore
+
+        run(self.client.send_async('PRIVMSG', 'kyle', 'Hello'))
+        self.assertEqual(writer.drained, 1)
+
+    def test_client_send_async_waits_above_high_water(self) -> None:
+        self.use_connection_client()
+        client_socket, server_socket = socket.socketpair()
+        client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+        server_socket.setblocking(False)
+
+        async def send() -> None:
+            _, writer = await asyncio.open_connection(sock=client_socket)
+            writer.transport.set_write_buffer_limits(high=1024, low=0)
+            self.client.writer = writer
+
+            while self.client.buffered_bytes <= 1024:
+                self.client.send_line('PRIVMSG #test :' + 'x' * 400)
+
+            tasks = [
+                asyncio.ensure_future(self.client.send_async('PRIVMSG', '#test', 'a')),
+                asyncio.ensure_future(self.client.send_async('PRIVMSG', '#test', 'b')),
+            ]
+            await asyncio.sleep(0.05)
+            self.assertFalse(any(task.done() for task in tasks))
+
+            # The server starts reading, both senders may continue
+            async def read() -> None:
+                loop = asyncio.get_running_loop()
+                while True:
+                    await loop.sock_recv(server_socket, 65536)
+
+            reader = asyncio.ensure_future(read())
+            await asyncio.wait_for(asyncio.gather(*tasks), 5)
+            reader.cancel()
+            writer.close()
+
+        try:
+            run(send())
+        finally:
+            server_socket.close()
+
+    # Requests
+
+    def test_client_auto_labels_when_labeled_response_negotiated(self) -> None:
+        self.client.cap_accepted.append('labeled-response')
+        future = self.client.send('WHOIS', 'kyle')
+
+        self.assertEqual(self.client.sent_lines, ['@label=irctk1 WHOIS kyle'])
+        self.assertEqual(list(self.client.requests), ['irctk1'])
+
+        self.client.process_line('@label=irctk1 :irc.example.com 318 kylef kyle :End')
+        self.assertTrue(future.done())
+        self.assertEqual(self.client.requests, {})
+
+    def test_client_does_not_auto_label_pong(self) -> None:
+        self.client.cap_accepted.append('labeled-response')
+        self.client.process_line('PING :hello')
+
+        self.assertEqual(self.client.sent_lines, ['PONG hello'])
+        self.assertEqual(self.client.requests, {})
+
+    def test_client_request_timeout(self) -> None:
+        message = Message(command='PING', parameters=['localhost'])
+        message.tags.append(MessageTag(name='label', value='xx'))
+        future = self.client.send(message, timeout=0)
+
+        future.get_loop().run_until_complete(asyncio.sleep(0.01))
+        self.assertTrue(future.done())
+        self.assertIsInstance(future.exception(), asyncio.TimeoutError)
+        self.assertEqual(self.client.requests, {})
+
+    def test_client_fails_requests_when_disconnected(self) -> None:
+        labeled = Message(command='PING', parameters=['localhost'])
+        labeled.tags.append(MessageTag(name='label', value='xx'))
+        label_future = self.client.send(labeled)
+        nick_future = self.client.send('NICK', 'doe')
+        join_futures = self.client.join_many(['#test'])
+
+        self.client.fail_requests(ConnectionError('Disconnected'))
+
+        for future in [label_future, nick_future, join_futures['#test']]:
+            self.assertIsInstance(future.exception(), ConnectionError)
+
+        self.assertEqual(self.client.requests, {})
+        self.assertEqual(self.client.nick_requests, {})
+        self.assertEqual(self.client.joins, {})
+
+    # Streaming
+
+    def test_client_send_stream_requires_label(self) -> None:
+        with self.assertRaises(ValueError):
+            self.client.send('WHO', '#test', stream=True)
+
+    def test_client_send_stream_batch(self) -> None:
+        message = Message(command='WHO', parameters=['#test'])
+        message.tags.append(MessageTag(name='label', value='xx'))
+        stream = self.client.send(message, stream=True)
+        loop = stream.future.get_loop()
+
+        self.client.process_line('@label=xx :irc.example.com BATCH +outer labeled')
+        self.client.process_line('@batch=outer :irc.example.com 352 kylef #test a')
+        self.assertEqual(
+            str(loop.run_until_complete(stream.__anext__())),
+            '@label=xx :irc.example.com BATCH +outer labeled',
+        )
+        self.assertEqual(
+            str(loop.run_until_complete(stream.__anext__())),
+            '@batch=outer :irc.example.com 352 kylef #test a',
+        )
+
+        self.client.process_line('@batch=outer :irc.example.com BATCH +inner nested')
+        self.client.process_line('@batch=inner :irc.example.com 352 kylef #test b')
+        self.client.process_line(':irc.example.com BATCH -inner')
+        self.client.process_line(':irc.example.com BATCH -outer')
+        self.assertEqual(self.client.batches, {})
+        self.assertEqual(self.client.streams, {})
+        self.assertEqual(self.client.requests, {})
+
+        async def collect() -> List[str]:
+            return [str(message) async for message in stream]
+
+        self.assertEqual(
+            loop.run_until_complete(collect()),
+            [
+                '@batch=outer :irc.example.com BATCH +inner nested',
+                '@batch=inner :irc.example.com 352 kylef #test b',
+                ':irc.example.com BATCH -inner',
+                ':irc.example.com BATCH -outer',
+            ],
+        )
+
+    def test_client_send_stream_fails_when_not_consumed(self) -> None:
+        self.client.max_stream_messages = 2
+        message = Message(command='WHO', parameters=['#test'])
+        message.tags.append(MessageTag(name='label', value='xx'))
+        stream = self.client.send(message, stream=True)
+
+        self.client.process_line('@label=xx :irc.example.com BATCH +outer labeled')
+        self.client.process_line('@batch=outer :irc.example.com 352 kylef #test a')
+        self.client.process_line('@batch=outer :irc.example.com 352 kylef #test b')
+        self.client.process_line('@batch=outer :irc.example.com 352 kylef #test c')
+        self.assertEqual(stream.queue.qsize(), 0)
+
+        self.client.process_line(':irc.example.com BATCH -outer')
+        self.assertEqual(self.client.streams, {})
+        self.assertEqual(self.client.requests, {})
+
+        async def collect() -> List[str]:
+            return [str(message) async for message in stream]
+
+        with self.assertRaises(BufferError):
+            stream.future.get_loop().run_until_complete(collect())
+
+    def test_client_send_stream_single_response(self) -> None:
+        message = Message(command='PING', parameters=['localhost'])
+        message.tags.append(MessageTag(name='label', value='xx'))
+        stream = self.client.send(message, stream=True)
+
+        self.client.process_line('@label=xx PONG localhost')
+
+        async def collect() -> List[str]:
+            return [str(message) async for message in stream]
+
+        self.assertEqual(
+            stream.future.get_loop().run_until_complete(collect()),
+            ['@label=xx PONG localhost'],
+        )
+
+    # Batches
+
+    def test_client_batch_handler_complete(self) -> None:
+        batches: List = []
+        self.client.add_batch_handler(
+            'chathistory', on_complete=lambda client, batch: batches.append(batch)
+        )
+
+        self.client.process_line(':irc.example.com BATCH +tag chathistory #test')
+        self.client.process_line('@batch=tag :doe!d@d PRIVMSG #test :Hi')
+        self.assertEqual(batches, [])
+
+        self.client.process_line(':irc.example.com BATCH -tag')
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(batches[0].parameters, ['#test'])
+        self.assertEqual(len(batches[0].messages), 3)
+        self.assertEqual(self.client.batches, {})
+
+    def test_client_batch_handler_streaming(self) -> None:
+        messages: List = []
+        self.client.add_batch_handler(
+            'chathistory',
+            on_message=lambda client, batch, message: messages.append(message),
+        )
+
+        self.client.process_line(':irc.example.com BATCH +tag chathistory #test')
+        self.client.process_line('@batch=tag :doe!d@d PRIVMSG #test :Hi')
+        self.assertEqual(len(messages), 2)
+        self.assertEqual(self.client.batch_stats['messages'], 1)
+
+        self.client.process_line(':irc.example.com BATCH -tag')
+        self.assertEqual(len(messages), 3)
+
+    def test_client_nested_batches(self) -> None:
+        self.client.process_line(':irc.example.com BATCH +outer example')
+        self.client.process_line('@batch=outer :irc.example.com BATCH +inner example')
+        self.client.process_line('@batch=inner :doe!d@d PRIVMSG #test :Hi')
+
+        inner = self.client.batches['inner']
+        self.assertIs(inner.parent, self.client.batches['outer'])
+        self.assertEqual(self.client.batch_stats['open'], 2)
+        self.assertEqual(self.client.batch_stats['messages'], 4)
+
+    def test_client_discards_batch_exceeding_size(self) -> None:
+        self.client.max_batch_messages = 2
+
+        message = Message(command='WHO', parameters=['#test'])
+        message.tags.append(MessageTag(name='label', value='xx'))
+        future = self.client.send(message)
+
+        self.client.process_line('@label=xx :irc.example.com BATCH +tag labeled')
+        self.client.process_line('@batch=tag :irc.example.com 352 kylef #test a')
+        self.client.process_line('@batch=tag :irc.example.com 352 kylef #test b')
+
+        self.assertEqual(self.client.batches, {})
+        self.assertIsNotNone(future.exception())
+
+    def test_client_completes_discarded_nested_batch_once(self) -> None:
+        completed: List = []
+        self.client.max_batch_messages = 3
+
+        def on_complete(client, batch) -> None:
+            completed.append((batch.reference_tag, batch.is_complete))
+
+        self.client.add_batch_handler('labeled', on_complete=on_complete)
+        self.client.add_batch_handler('chathistory', on_complete=on_complete)
+
+        self.client.process_line(':irc.example.com BATCH +outer labeled')
+        self.client.process_line(
+            '@batch=outer :irc.example.com BATCH +inner chathistory'
+        )
+        self.client.process_line('@batch=inner :doe!d@d PRIVMSG #test :a')
+        self.client.process_line('@batch=inner :doe!d@d PRIVMSG #test :b')
+        self.client.process_line(':irc.example.com BATCH -inner')
+        self.client.process_line(':irc.example.com BATCH -outer')
+
+        self.assertEqual(completed, [('outer', False), ('inner', False)])
+        self.assertEqual(self.client.batches, {})
+
+    def test_client_does_not_buffer_responses_by_default(self) -> None:
+        self.client.max_batch_messages = 2
+        self.client.cap_accepted = ['labeled-response']
+        future = self.client.send('WHO', '#test')
+
+        self.client.process_line('@label=irctk1 :irc.example.com BATCH +tag labeled')
+        self.client.process_line('@batch=tag :irc.example.com 352 kylef #test a')
+        self.client.process_line('@batch=tag :irc.example.com 352 kylef #test b')
+        self.client.process_line('@batch=tag :irc.example.com 352 kylef #test c')
+
+        self.assertEqual(list(self.client.batches), ['tag'])
+        self.assertEqual(self.client.batch_stats['messages'], 1)
+
+        self.client.process_line(':irc.example.com BATCH -tag')
+        self.assertEqual(self.client.requests, {})
+        self.assertIsNone(future.result())
+
+    def test_client_buffers_responses_when_asked(self) -> None:
+        self.client.cap_accepted = ['labeled-response']
+        future = self.client.send('WHO', '#test', buffer=True)
+
+        self.client.process_line('@label=irctk1 :irc.example.com BATCH +tag labeled')
+        self.client.process_line('@batch=tag :irc.example.com 352 kylef #test a')
+        self.client.process_line(':irc.example.com BATCH -tag')
+
+        async def who() -> List[Message]:
+            # Awaited only once the response has been received
+            return await future
+
+        self.assertEqual(len(run(who())), 3)
+
+    def test_client_does_not_buffer_labeled_message_when_asked(self) -> None:
+        message = Message(command='WHO', parameters=['#test'])
+        message.tags.append(MessageTag(name='label', value='xx'))
+        future = self.client.send(message, buffer=False)
+
+        self.client.process_line('@label=xx :irc.example.com BATCH +tag labeled')
+        self.client.process_line('@batch=tag :irc.example.com 352 kylef #test a')
+        self.assertEqual(self.client.batch_stats['messages'], 1)
+
+        self.client.process_line(':irc.example.com BATCH -tag')
+        self.assertIsNone(future.result())
+
+    def test_client_buffers_only_labeled_messages(self) -> None:
+        with self.assertRaises(ValueError):
+            self.client.send('WHO', '#test', buffer=True)
+
+    def test_client_fails_labeled_request_with_error_reply(self) -> None:
+        self.client.cap_accepted = ['labeled-response']
+        self.client.is_registered = True
+        future = self.client.send('NICK', 'doe')
+
+        self.client.process_line(
+            '@label=irctk1 :irc.example.com 433 kylef doe :Nickname is already in use'
+        )
+        self.assertIsNotNone(future.exception())
+
+    def test_client_fails_labeled_request_with_fail_reply(self) -> None:
+        self.client.cap_accepted = ['labeled-response']
+        future = self.client.send('CHATHISTORY', 'LATEST', '#test', '*', '10')
+
+        self.client.process_line(
+            '@label=irctk1 :irc.example.com FAIL CHATHISTORY INVALID_TARGET :No'
+        )
+        self.assertIsNotNone(future.exception())
+
+    def test_client_discards_expired_batch(self) -> None:
+        self.client.max_batch_age = 0
+
+        self.client.process_line(':irc.example.com BATCH +a example')
+        self.client.process_line(':irc.example.com BATCH +b example')
+
+        self.assertEqual(list(self.client.batches), ['b'])
+
+    def test_client_discards_lone_expired_batch(self) -> None:
+        now = [0.0]
+        self.client.clock = lambda: now[0]
+        self.client.max_batch_age = 60
+
+        self.client.process_lines([':irc.example.com BATCH +a example'])
+        now[0] = 61
+        self.client.process_lines([':doe!d@d PRIVMSG kylef :Hello'])
+
+        self.assertEqual(self.client.batches, {})
+
+    # Netsplits
+
+    def irc_netsplit(self, client, servers, nicks, channels):
+        self.netsplits.append((servers, nicks, channels))
+
+    def irc_netjoin(self, client, servers, nicks, channels):
+        self.netjoins.append((servers, nicks, channels))
+
+    def join_netsplit_channels(self) -> None:
+        self.netsplits: List = []
+        self.netjoins: List = []
+
+        for name in ['#a', '#b']:
+            self.client.process_line(':kylef!kyle@kyle JOIN {}'.format(name))
+            self.client.process_line(
+                ':server 353 kylef = {} :kylef doe bob alice'.format(name)
+            )
+
+    def test_client_netsplit_batch(self) -> None:
+        self.join_netsplit_channels()
+
+        self.client.process_line(':irc.example.com BATCH +tag netsplit a.net b.net')
+        self.client.process_line('@batch=tag :doe!d@d QUIT :a.net b.net')
+        self.client.process_line('@batch=tag :BOB!b@b QUIT :a.net b.net')
+        self.assertEqual(len(self.client.channels[0].members), 4)
+
+        self.client.process_line(':irc.example.com BATCH -tag')
+
+        for channel in self.client.channels:
+            self.assertEqual(
+                [member.nick.nick for member in channel.members], ['kylef', 'alice']
+            )
+
+        self.assertEqual(len(self.netsplits), 1)
+        servers, nicks, channels = self.netsplits[0]
+        self.assertEqual(servers, ['a.net', 'b.net'])
+        self.assertEqual([nick.nick for nick in nicks], ['doe', 'BOB'])
+        self.assertEqual(channels, self.client.channels)
+
+    def test_client_netsplit_quit_reason(self) -> None:
+        self.join_netsplit_channels()
+
+        self.client.process_line(':doe!d@d QUIT :a.example.net b.example.net')
+        self.client.process_line(':bob!b@b QUIT :a.example.net b.example.net')
+        self.assertEqual(self.netsplits, [])
+
+        self.client.process_line('PING :hello')
+        self.assertEqual(len(self.netsplits), 1)
+        self.assertEqual(len(self.netsplits[0][1]), 2)
+        self.assertEqual(len(self.client.channels[0].members), 2)
+
+    def test_client_quit_reason_not_netsplit(self) -> None:
+        self.join_netsplit_channels()
+
+        self.client.process_line(':doe!d@d QUIT :Quit: a.example.net b.example.net')
+        self.assertEqual(self.netsplits, [])
+        self.assertEqual(len(self.client.channels[0].members), 3)
+
+    def test_client_netjoin_batch(self) -> None:
+        self.join_netsplit_channels()
+
+        self.client.process_line(':irc.example.com BATCH +tag netjoin a.net b.net')
+        self.client.process_line('@batch=tag :eve!e@e JOIN #a')
+        self.client.process_line('@batch=tag :eve!e@e JOIN #b')
+        self.client.process_line('@batch=tag :doe!d@d JOIN #b')
+        self.client.process_line(':irc.example.com BATCH -tag')
+
+        self.assertEqual(len(self.client.channels[0].members), 5)
+        self.assertEqual(len(self.client.channels[1].members), 5)
+
+        self.assertEqual(len(self.netjoins), 1)
+        servers, nicks, channels = self.netjoins[0]
+        self.assertEqual([nick.nick for nick in nicks], ['eve'])
+        self.assertEqual(channels, self.client.channels)
+
+    def test_client_netjoin_batch_with_extended_join(self) -> None:
+        self.join_netsplit_channels()
+
+        self.client.process_line(':irc.example.com BATCH +tag netjoin a.net b.net')
+        self.client.process_line('@batch=tag :eve!e@e JOIN #a eve :Eve')
+        self.client.process_line(':irc.example.com BATCH -tag')
+
+        servers, nicks, channels = self.netjoins[0]
+        self.assertEqual((nicks[0].account, nicks[0].realname), ('eve', 'Eve'))
+
+    # Reconnection
+
+    def test_client_keeps_channels_when_disconnected(self) -> None:
+        self.client.is_connected = True
+        self.client.process_line(':kylef!kyle@kyle JOIN #test')
+        self.client.process_line(':server 353 kylef = #test :kylef doe bob')
+
+        self.client.disconnected(None)
+
+        channel = self.client.channels[0]
+        self.assertFalse(channel.is_attached)
+        self.assertEqual(len(channel.members), 3)
+        self.assertEqual(self.client.channels_to_rejoin, [channel])
+
+    def test_client_rejoins_and_reconciles_after_reconnect(self) -> None:
+        self.client.is_connected = True
+        self.client.join_many({'#test': 'key'})
+        self.client.process_line(':kylef!kyle@kyle JOIN #test')
+        self.client.process_line(':server 353 kylef = #test :kylef doe bob')
+        self.client.process_line(':server 366 kylef #test :End of /NAMES list.')
+        channel = self.client.channels[0]
+        doe = channel.members[1]
+
+        self.client.disconnected(None)
+        self.client.sent_lines = []
+        self.client.process_line(':server 001 kylef :Welcome')
+        self.assertEqual(self.client.sent_lines, ['WHO kylef', 'JOIN #test key'])
+        self.assertEqual(self.client.reconnect_stats['reconnects'], 1)
+
+        self.client.process_line(':kylef!kyle@kyle JOIN #test')
+        self.client.process_line(':server 353 kylef = #test :kylef @doe eve')
+        self.client.process_line(':server 366 kylef #test :End of /NAMES list.')
+
+        self.assertTrue(channel.is_attached)
+        self.assertEqual(
+            [member.nick.nick for member in channel.members], ['kylef', 'doe', 'eve']
+        )
+        self.assertIs(channel.members[1], doe)
+        self.assertTrue(doe.has_mode('o'))
+
+    def test_client_supervise_reconnects(self) -> None:
+        servers: List = []
+
+        async def connect(host, port, use_tls=False) -> None:
+            servers.append(host)
+            if len(servers) == 3:
+                self.client.is_supervised = False
+
+        self.client.connect = connect  # type: ignore
+
+        run(self.client.supervise([Server('a.net'), Server('b.net')], 0))
+        self.assertEqual(servers, ['a.net', 'b.net', 'a.net'])
+
+    def test_client_reconciles_modes_after_rejoining(self) -> None:
+        async def rejoin() -> None:
+            self.client.is_connected = True
+            self.client.process_line(':kylef!kyle@kyle JOIN #test')
+            self.client.disconnected(None)
+
+            self.client.process_line(':server 001 kylef :Welcome')
+            self.client.process_line(':kylef!kyle@kyle JOIN #test')
+            self.client.process_line(':server 366 kylef #test :End of /NAMES list.')
+            self.client.sent_lines = []
+            await asyncio.sleep(0)
+
+        run(rejoin())
+        self.assertEqual(self.client.sent_lines, ['MODE #test'])
+
+    def test_client_supervise_reconnects_after_connection_reset(self) -> None:
+        attempts: List[str] = []
+
+        class Reader:
+            async def read(self, size: int) -> bytes:
+                raise ConnectionResetError()
+
+        class Writer:
+            def write(self, data: bytes) -> None:
+                pass
+
+            async def drain(self) -> None:
+                pass
+
+            def close(self) -> None:
+                pass
+
+        async def connect(host, port, use_tls=False) -> None:
+            attempts.append(host)
+            if len(attempts) == 2:
+                self.client.is_supervised = False
+
+            self.client.reader = Reader()  # type: ignore
+            self.client.writer = Writer()  # type: ignore
+            await self.client.connected()
+
+        self.client.connect = connect  # type: ignore
+        self.client.keepalive_interval = None
+
+        run(self.client.supervise([Server('a.net')], 0))
+        self.assertEqual(attempts, ['a.net', 'a.net'])
+        self.assertFalse(self.client.is_connected)
+        self.assertIsNotNone(self.client.disconnected_at)
+
+    # Coroutine handlers
+
+    def test_client_schedules_coroutine_handlers_in_order(self) -> None:
+        events: List = []
+
+        class Module:
+            async def irc_channel_message(self, client, nick, channel, message):
+                events.append(('start', message))
+                await asyncio.sleep(0.01 if message == 'first' else 0)
+                events.append(('end', message))
+
+        async def receive() -> None:
+            self.client.modules.append(Module())
+            self.client.process_line(':kylef!kyle@kyle JOIN #test')
+            self.client.process_line(':doe!d@d PRIVMSG #test :first')
+            self.client.process_line(':doe!d@d PRIVMSG #test :second')
+            self.assertEqual(events, [])
+            self.assertEqual(len(self.client.handler_tasks), 2)
+
+            await asyncio.wait(list(self.client.handler_tasks))
+
+        run(receive())
+
+        self.assertEqual(
+            events,
+            [
+                ('start', 'first'),
+                ('end', 'first'),
+                ('start', 'second'),
+                ('end', 'second'),
+            ],
+        )
+        self.assertEqual(
+            self.client.handler_stats['Module.irc_channel_message']['calls'], 2
+        )
+        self.assertEqual(self.client.ordered_handler_tasks, {})
+
+    def test_client_coroutine_handlers_unordered(self) -> None:
+        events: List = []
+        self.client.ordered_handlers = False
+
+        class Delegate:
+            async def irc_channel_message(self, client, nick, channel, message):
+                await asyncio.sleep(0.01 if message == 'first' else 0)
+                events.append(message)
+
+        async def receive() -> None:
+            self.client.delegate = Delegate()
+            self.client.process_line(':kylef!kyle@kyle JOIN #test')
+            self.client.process_line(':doe!d@d PRIVMSG #test :first')
+            self.client.process_line(':doe!d@d PRIVMSG #test :second')
+            await asyncio.wait(list(self.client.handler_tasks))
+
+        run(receive())
+
+        self.assertEqual(events, ['second', 'first'])
+        self.assertIn('Delegate.irc_channel_message', self.client.handler_stats)
+
+    # Offloading
+
+    def test_client_offloaded_handler_delivers_in_order(self) -> None:
+        delivered: List = []
+
+        class Module:
+            @offload()
+            def irc_channel_message(self, client, nick, channel, message):
+                time.sleep(0.05 if message == 'first' else 0)
+                return lambda: delivered.append(message)
+
+        async def receive() -> None:
+            self.client.modules.append(Module())
+            self.client.process_line(':kylef!kyle@kyle JOIN #test')
+            self.client.process_line(':doe!d@d PRIVMSG #test :first')
+            self.client.process_line(':doe!d@d PRIVMSG #test :second')
+            self.assertEqual(delivered, [])
+
+            while self.client.handler_tasks:
+                await asyncio.wait(list(self.client.handler_tasks))
+            await asyncio.sleep(0)
+
+        run(receive())
+
+        self.assertEqual(delivered, ['first', 'second'])
+        self.assertEqual(self.client.offload_stats['default']['completed'], 2)
+        self.assertEqual(self.client.offload_stats['default']['in_flight'], 0)
+        self.assertEqual(self.client.offload_tails, {})
+
+    def test_client_offloads_delegate_handler(self) -> None:
+        threads: List = []
+
+        class Delegate:
+            @offload()
+            def irc_channel_message(self, client, nick, channel, message):
+                threads.append(threading.current_thread())
+
+        async def receive() -> None:
+            self.client.delegate = Delegate()
+            self.client.process_line(':kylef!kyle@kyle JOIN #test')
+            self.client.process_line(':doe!d@d PRIVMSG #test :Hello')
+
+            while self.client.handler_tasks:
+                await asyncio.wait(list(self.client.handler_tasks))
+
+        run(receive())
+
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.current_thread())
+        self.assertEqual(self.client.offload_stats['default']['completed'], 1)
+
+    def test_client_runs_handler_with_unknown_executor_inline(self) -> None:
+        delivered: List = []
+
+        class Module:
+            @offload(executor='missing')
+            def irc_channel_message(self, client, nick, channel, message):
+                return lambda: delivered.append(message)
+
+        self.client.modules.append(Module())
+        self.client.process_line(':kylef!kyle@kyle JOIN #test')
+
+        with self.assertLogs(self.client.logger, 'WARNING') as logs:
+            self.client.process_line(':doe!d@d PRIVMSG #test :first')
+            self.client.process_line(':doe!d@d PRIVMSG #test :second')
+
+        self.assertEqual(delivered, ['first', 'second'])
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('Unknown executor missing', logs.output[0])
+        self.assertEqual(self.client.offload_stats, {})
+
+    def test_client_runs_handler_with_process_pool_inline(self) -> None:
+        delivered: List = []
+
+        class Module:
+            @offload(executor='cpu')
+            def irc_channel_message(self, client, nick, channel, message):
+                return lambda: delivered.append(message)
+
+        self.client.executors['cpu'] = ProcessPoolExecutor(max_workers=1)
+        self.client.modules.append(Module())
+        self.client.process_line(':kylef!kyle@kyle JOIN #test')
+
+        with self.assertLogs(self.client.logger, 'WARNING') as logs:
+            self.client.process_line(':doe!d@d PRIVMSG #test :Hello')
+
+        self.assertEqual(delivered, ['Hello'])
+        self.assertIn('Process pool executor cpu', logs.output[0])
+        self.client.executors['cpu'].shutdown()
+
+    def test_client_offload_process_pool(self) -> None:
+        self.client.executors['cpu'] = ProcessPoolExecutor(max_workers=1)
+
+        async def compute() -> int:
+            return await self.client.offload(sum, [1, 2, 3], executor='cpu')
+
+        self.assertEqual(run(compute()), 6)
+        self.assertEqual(self.client.offload_stats['cpu']['completed'], 1)
+        self.client.executors['cpu'].shutdown()
+
+    def test_client_offload_named_executor(self) -> None:
+        self.client.executors['cpu'] = ThreadPoolExecutor(max_workers=1)
+
+        async def compute() -> int:
+            return await self.client.offload(sum, [1, 2, 3], executor='cpu')
+
+        self.assertEqual(run(compute()), 6)
+        self.assertEqual(self.client.offload_stats['cpu']['submitted'], 1)
+        self.client.executors['cpu'].shutdown()
+
+    # Connection
+
+    def connect(self, data: bytes) -> List[bytes]:
+        written: List[bytes] = []
+        processed: List[str] = []
+
+        class Writer:
+            def write(self, data: bytes) -> None:
+                written.append(data)
+
+            async def drain(self) -> None:
+                pass
+
+            def close(self) -> None:
+                pass
+
+        self.client.modules.append(
+            type(
+                'Module',
+                (),
+                {'irc_raw': lambda module, client, line: processed.append(line)},
+            )()
+        )
+
+        async def connected() -> None:
+            reader = asyncio.StreamReader()
+            reader.feed_data(data)
+            reader.feed_eof()
+
+            self.client.reader = reader
+            self.client.writer = Writer()  # type: ignore
+            await self.client.connected()
+
+        run(connected())
+        self.processed = processed
+        return written
+
+    def use_connection_client(self) -> None:
+        # Writes sent lines to the connection rather than recording them
+        self.client = ConnectionClient('kylef', 'kyle', 'Kyle Fuller')  # type: ignore
+        self.client.nick.nick = 'kylef'
+        self.client.delegate = self
+
+    def test_client_reads_lines_split_across_reads(self) -> None:
+        self.client.read_size = 4
+        self.connect(b':irc.example.com 001 kyle :Welcome\r\n:doe!d@d QUIT\r\n')
+
+        self.assertEqual(
+            self.processed, [':irc.example.com 001 kyle Welcome', ':doe!d@d QUIT']
+        )
+        self.assertFalse(self.client.is_connected)
+
+    def test_client_answers_ping_before_dispatch(self) -> None:
+        sent_lines: List[str] = []
+
+        class Module:
+            def irc_private_message(self, client, nick, message):
+                sent_lines.extend(client.sent_lines)
+
+        self.client.modules.append(Module())
+        self.connect(b':doe!d@d PRIVMSG kylef :Hello\r\nPING :irc.example.com\r\n')
+
+        self.assertEqual(sent_lines[-1], 'PONG irc.example.com')
+        self.assertEqual(self.client.sent_lines.count('PONG irc.example.com'), 1)
+        self.assertEqual(
+            self.processed,
+            [':doe!d@d PRIVMSG kylef Hello', 'PING irc.example.com'],
+        )
+
+    def test_client_answers_ignored_ping_once(self) -> None:
+        class Module:
+            def irc_raw(self, client, line):
+                if line.startswith('PING'):
+                    raise IRCIgnoreLine()
+
+        self.client.modules.append(Module())
+        self.connect(b'PING :a\r\nPING :b\r\nPING :c\r\n')
+
+        self.assertEqual(
+            [line for line in self.client.sent_lines if line.startswith('PONG')],
+            ['PONG a', 'PONG b', 'PONG c'],
+        )
+        self.assertEqual(self.processed, [])
+
+    def test_client_records_metrics(self) -> None:
+        self.use_connection_client()
+        self.client.metrics = Metrics()
+        self.connect(b':doe!d@d PRIVMSG kylef :Hello\r\nPING :irc.example.com\r\n')
+
+        metrics = self.client.metrics
+        self.assertEqual(metrics.lines_received, {'PRIVMSG': 1, 'PING': 1})
+        self.assertEqual(metrics.bytes_received['PRIVMSG'], 31)
+        self.assertEqual(metrics.lines_sent['PONG'], 1)
+        self.assertEqual(metrics.parse.count, 2)
+        self.assertEqual(metrics.dispatch.count, 2)
+        self.assertEqual(metrics.handlers['ClientTests.irc_private_message'].count, 1)
+
+    def test_client_records_wire_trace(self) -> None:
+        self.use_connection_client()
+        self.client.trace = WireTrace(size=1)
+        self.connect(b':doe!d@d PRIVMSG kylef :Hello\r\nPING :irc.example.com\r\n')
+
+        self.assertEqual(
+            [record.line for record in self.client.trace.received],
+            ['PING :irc.example.com'],
+        )
+        self.assertEqual(
+            [record.line for record in self.client.trace.sent],
+            ['PONG irc.example.com'],
+        )
+
+    def test_client_writes_journal(self) -> None:
+        self.use_connection_client()
+        with tempfile.TemporaryDirectory() as directory:
+            self.client.journal = JournalWriter(directory, fsync=False)
+            self.connect(b'PING :irc.example.com\r\n')
+            self.client.journal.close()
+
+            records = [
+                (record.direction, record.line) for record in JournalReader(directory)
+            ]
+
+        self.assertEqual(
+            records[-2:],
+            [('S', b'PING :irc.example.com'), ('C', b'PONG irc.example.com')],
+        )
+
+    def test_client_dumps_wire_trace_on_exception(self) -> None:
+        dumps: List[str] = []
+        self.client.trace = WireTrace()
+        self.client.trace.dump = dumps.append  # type: ignore
+        self.client.modules.append(
+            type(
+                'Module',
+                (),
+                {'irc_private_message': lambda module, client, nick, message: 1 / 0},
+            )()
+        )
+
+        with self.assertRaises(ZeroDivisionError):
+            self.connect(b':doe!d@d PRIVMSG kylef :Hello\r\n')
+
+        self.assertEqual(
+            dumps, ["Exception processing lines: ZeroDivisionError('division by zero')"]
+        )
+
+    # Keepalive
+
+    def keepalive(self) -> List[bytes]:
+        written: List[bytes] = []
+
+        class Transport:
+            is_aborted = False
+
+            def abort(self) -> None:
+                self.is_aborted = True
+
+        class Writer:
+            transport = Transport()
+
+            def write(self, data: bytes) -> None:
+                written.append(data)
+
+        async def keepalive() -> None:
+            self.client.is_connected = True
+            self.client.writer = Writer()  # type: ignore
+            self.client.keepalive()
+            self.client.keepalive()
+
+        run(keepalive())
+        self.transport = Writer.transport
+        return written
+
+    def test_client_keepalive_sends_lag_probe(self) -> None:
+        self.client.last_received = time.monotonic()
+        self.keepalive()
+
+        self.assertEqual(self.client.sent_lines, ['PING :irctk-lag-1'])
+        self.assertEqual(list(self.client.lag_probes), ['irctk-lag-1'])
+        self.assertTrue(self.client.is_connected)
+
+    def test_client_keepalive_replaces_lost_lag_probe(self) -> None:
+        self.client.last_received = time.monotonic()
+        self.client.lag_probes['irctk-lag-0'] = time.monotonic() - 61
+        self.keepalive()
+
+        self.assertEqual(self.client.sent_lines, ['PING :irctk-lag-1'])
+        self.assertEqual(list(self.client.lag_probes), ['irctk-lag-1'])
+
+    def test_client_keepalive_discards_expired_batch(self) -> None:
+        self.client.max_batch_age = 0
+        self.client.process_line(':irc.example.com BATCH +a example')
+        self.client.last_received = time.monotonic()
+        self.keepalive()
+
+        self.assertEqual(self.client.batches, {})
+
+    def test_client_measures_lag_from_pong(self) -> None:
+        self.client.lag_probes['irctk-lag-1'] = time.monotonic() - 0.2
+        self.client.process_line(':irc.example.com PONG irc.example.com :irctk-lag-1')
+
+        self.assertEqual(self.client.lag_probes, {})
+        self.assertEqual(len(self.client.lag), 1)
+        self.assertGreaterEqual(self.client.lag.percentile(100) or 0, 0.2)
+        self.assertEqual(self.client.lag.counts()[0.25], 1)
+
+    def test_client_ignores_unknown_pong(self) -> None:
+        self.client.process_line(':irc.example.com PONG irc.example.com :other')
+        self.assertEqual(len(self.client.lag), 0)
+
+    def test_client_keepalive_aborts_silent_connection(self) -> None:
+        errors: List = []
+        self.irc_disconnected = lambda client, error: errors.append(error)
+        self.client.last_received = time.monotonic() - 300
+        self.client.lag_probes['irctk-lag-1'] = time.monotonic() - 300
+
+        written = self.keepalive()
+
+        self.assertEqual(written, [])
+        self.assertTrue(self.transport.is_aborted)
+        self.assertFalse(self.client.is_connected)
+        self.assertEqual(self.client.lag_probes, {})
+        self.assertIsInstance(errors[0], asyncio.TimeoutError)
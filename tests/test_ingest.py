@@ -0,0 +1,97 @@
+import gzip
+
+import pytest
+
+from irctk.ingest import (
+    Chunk,
+    concat,
+    ingest,
+    parse_chunk,
+    parse_time,
+    split_archive,
+)
+
+LINES = [
+    '@time=2021-06-01T12:00:00.000Z;account=kylef '
+    ':kylef!kyle@example.com PRIVMSG #irctk :Hello World',
+    ':doe!d@example.com JOIN #irctk',
+    '',
+    'PING :irc.example.com',
+    ':irc.example.com 001 kylef :Welcome',
+] + [':user{}!u@example.com PRIVMSG #irctk :{}'.format(i, i) for i in range(50)]
+
+
+@pytest.fixture
+def archive(tmp_path) -> str:
+    path = tmp_path / 'irctk.log'
+    path.write_text('\r\n'.join(LINES) + '\r\n')
+    return str(path)
+
+
+def test_parse_time() -> None:
+    assert parse_time('2021-06-01T12:00:00.000Z') == 1622548800.0
+    assert parse_time('yesterday') is None
+    assert parse_time(None) is None
+
+
+def test_parse_chunk(archive: str) -> None:
+    columns = parse_chunk(split_archive(archive)[0], ['account'])
+
+    assert list(columns) == [
+        'time',
+        'command',
+        'nick',
+        'target',
+        'text',
+        'tag_account',
+    ]
+    assert len(columns['command']) == 54
+
+    assert columns['time'][:2] == [1622548800.0, None]
+    assert columns['command'][:4] == ['PRIVMSG', 'JOIN', 'PING', '001']
+    assert columns['nick'][:4] == ['kylef', 'doe', None, 'irc.example.com']
+    assert columns['target'][:4] == ['#irctk', None, None, 'kylef']
+    assert columns['text'][:4] == [
+        'Hello World',
+        '#irctk',
+        'irc.example.com',
+        'Welcome',
+    ]
+    assert columns['tag_account'][:2] == ['kylef', None]
+
+
+def test_split_archive_chunks_lines_once(archive: str) -> None:
+    chunks = split_archive(archive, chunk_size=64)
+    assert len(chunks) > 10
+
+    whole = parse_chunk(Chunk(archive, 0, chunks[-1].end))
+    assert concat(parse_chunk(chunk) for chunk in chunks) == whole
+
+
+def test_split_compressed_archive(tmp_path) -> None:
+    path = str(tmp_path / 'irctk.log.gz')
+    with gzip.open(path, 'wt') as fp:
+        fp.write('\n'.join(LINES))
+
+    chunks = split_archive(path, chunk_size=64)
+    assert chunks == [Chunk(path, 0, None)]
+    assert len(parse_chunk(chunks[0])['command']) == 54
+
+
+def test_ingest(archive: str) -> None:
+    batches = list(
+        ingest([archive, archive], tags=['account'], processes=2, chunk_size=512)
+    )
+
+    columns = concat(batches)
+    assert len(columns['command']) == 108
+    assert columns['tag_account'].count('kylef') == 2
+
+
+def test_to_numpy(archive: str) -> None:
+    pytest.importorskip('numpy')
+    from irctk.ingest import to_numpy
+
+    array = to_numpy(parse_chunk(split_archive(archive)[0]))
+    assert array['command'][0] == 'PRIVMSG'
+    assert array['time'][0] == 1622548800.0
@@ -37,6 +37,10 @@ def test_default_bot_mode(isupport: ISupport) -> None:
     assert isupport.bot_mode is None
 
 
+def test_default_whox(isupport: ISupport) -> None:
+    assert not isupport.whox
+
+
 # Is channel
 
 
@@ -130,6 +134,33 @@ def test_can_parse_bot_mode(isupport: ISupport) -> None:
     assert isupport.bot_mode is None
 
 
+def test_can_parse_whox(isupport: ISupport) -> None:
+    isupport.parse('WHOX')
+    assert isupport.whox
+
+
+def test_can_parse_chanlimit(isupport: ISupport) -> None:
+    isupport.parse('CHANLIMIT=#&:100,+:')
+    assert isupport.channel_limits == {'#&': 100, '+': None}
+
+
+def test_parsed_prefix_is_shared(isupport: ISupport) -> None:
+    other = ISupport()
+    isupport.parse('PREFIX=(ov)@+ CHANMODES=b,k,l,imnpst')
+    other.parse('PREFIX=(ov)@+ CHANMODES=b,k,l,imnpst')
+
+    assert isupport['prefix'] is other['prefix']
+    assert isupport['chanmodes'] is other['chanmodes']
+
+    with pytest.raises(TypeError):
+        isupport['prefix']['q'] = '~'
+
+    with pytest.raises(TypeError):
+        isupport['chanmodes']['q'] = list
+
+    assert other['prefix'] == {'o': '@', 'v': '+'}
+
+
 # Test construction
 
 
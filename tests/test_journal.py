@@ -0,0 +1,117 @@
+import asyncio
+import os
+
+from irctk.journal import JournalReader, JournalWriter
+from irctk.trace import RECEIVED, SENT
+
+SECOND = 1000000000
+
+
+def write_journal(directory: str, count: int, **options) -> JournalWriter:
+    journal = JournalWriter(directory, fsync=False, **options)
+    for index in range(count):
+        journal.append(
+            RECEIVED if index % 2 == 0 else SENT,
+            'PRIVMSG #irctk :{}'.format(index).encode(),
+            timestamp=(1000 + index) * SECOND,
+        )
+    journal.close()
+    return journal
+
+
+def test_journal_round_trip(tmp_path) -> None:
+    write_journal(str(tmp_path), 3)
+
+    records = list(JournalReader(str(tmp_path)))
+    assert [(record.direction, record.line) for record in records] == [
+        (RECEIVED, b'PRIVMSG #irctk :0'),
+        (SENT, b'PRIVMSG #irctk :1'),
+        (RECEIVED, b'PRIVMSG #irctk :2'),
+    ]
+    assert records[1].time == 1001.0
+
+
+def test_journal_group_commit(tmp_path) -> None:
+    journal = JournalWriter(str(tmp_path), commit_bytes=100, fsync=False)
+    journal.append(RECEIVED, b'PING :irc')
+    assert list(JournalReader(str(tmp_path))) == []
+
+    journal.append(RECEIVED, b'PRIVMSG #irctk :' + b'x' * 100)
+    assert len(list(JournalReader(str(tmp_path)))) == 2
+
+    journal.append(RECEIVED, b'PING :irc')
+    journal.close()
+    assert len(list(JournalReader(str(tmp_path)))) == 3
+
+
+def test_journal_commits_after_interval(tmp_path) -> None:
+    async def append() -> None:
+        journal = JournalWriter(str(tmp_path), commit_interval=0.01, fsync=False)
+        journal.append(RECEIVED, b'PING :irc')
+        assert journal.commit_timer
+        await asyncio.sleep(0.05)
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(append())
+    finally:
+        loop.close()
+
+    assert len(list(JournalReader(str(tmp_path)))) == 1
+
+
+def test_journal_syncs_in_executor_from_event_loop(tmp_path) -> None:
+    async def append() -> JournalWriter:
+        journal = JournalWriter(str(tmp_path), max_segment_bytes=64)
+        journal.append(RECEIVED, b'PRIVMSG #irctk :' + b'x' * 32)
+        journal.commit()
+        journal.append(RECEIVED, b'PRIVMSG #irctk :' + b'y' * 32)
+        journal.commit()
+        return journal
+
+    loop = asyncio.new_event_loop()
+    try:
+        journal = loop.run_until_complete(append())
+    finally:
+        loop.close()
+
+    assert journal.executor
+    journal.close()
+    assert journal.executor is None
+
+    reader = JournalReader(str(tmp_path))
+    assert len(reader.segments) == 2
+    assert len(list(reader)) == 2
+
+
+def test_journal_rotation(tmp_path) -> None:
+    write_journal(str(tmp_path), 100, max_segment_bytes=512, index_interval=128)
+
+    reader = JournalReader(str(tmp_path))
+    segments = len(reader.segments)
+    assert segments > 1
+    assert os.path.exists(str(tmp_path / 'journal-00000000.journal.index'))
+    assert len(reader.read_index(0)) > 1
+
+    records = list(reader)
+    assert len(records) == 100
+    assert records[-1].line == b'PRIVMSG #irctk :99'
+
+    # A new writer continues with a new segment
+    write_journal(str(tmp_path), 1)
+    assert len(reader.segments) == segments + 1
+
+
+def test_journal_seek(tmp_path) -> None:
+    write_journal(str(tmp_path), 100, max_segment_bytes=512, index_interval=128)
+    reader = JournalReader(str(tmp_path))
+
+    records = list(reader.seek_time(1050.5))
+    assert len(records) == 49
+    assert records[0].line == b'PRIVMSG #irctk :51'
+
+    assert len(list(reader.seek_time(0))) == 100
+    assert list(reader.seek_time(2000)) == []
+
+    record = records[10]
+    assert next(reader.records(record.segment, record.offset)) == record
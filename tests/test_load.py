@@ -0,0 +1,23 @@
+import asyncio
+
+from benchmarks.load import SCENARIOS, run
+
+
+def test_load_scenarios() -> None:
+    loop = asyncio.new_event_loop()
+    try:
+        results = loop.run_until_complete(run(list(SCENARIOS), 200, 300))
+    finally:
+        loop.close()
+
+    assert results['flood']['messages'] == 200
+    assert results['flood']['latency_p99_ms'] is not None
+    # JOIN and NAMES, followed by a WHOX reply for each member within a
+    # labeled batch
+    assert results['names']['messages'] == 8 + 303
+    assert results['netsplit']['messages'] == 202
+    assert results['chathistory']['messages'] == 202
+
+    # A reply for each of the members remaining after the netsplit, within
+    # a labeled batch
+    assert results['whox']['messages'] == 103
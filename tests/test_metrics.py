@@ -0,0 +1,92 @@
+import asyncio
+import math
+
+from irctk.channel import Membership
+from irctk.metrics import Histogram, Metrics, render_prometheus, serve_metrics
+from irctk.nick import Nick
+from tests.mock_client import MockClient as Client
+
+
+def test_histogram_observe() -> None:
+    histogram = Histogram(buckets=(0.1, 1.0, math.inf))
+    histogram.observe(0.1)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    assert histogram.counts == [1, 1, 1]
+    assert histogram.count == 3
+    assert histogram.sum == 5.6
+    assert histogram.cumulative_counts() == [(0.1, 1), (1.0, 2), (math.inf, 3)]
+
+
+def test_metrics_record_sent_command() -> None:
+    metrics = Metrics()
+    metrics.record_sent('@label=1 :kylef PRIVMSG #irctk :Hello', 40)
+    metrics.record_sent('privmsg #irctk :Hello', 23)
+    metrics.record_sent('QUIT', 6)
+
+    assert metrics.lines_sent == {'PRIVMSG': 2, 'QUIT': 1}
+    assert metrics.bytes_sent == {'PRIVMSG': 63, 'QUIT': 6}
+
+
+def test_render_prometheus() -> None:
+    client = Client()
+    client.metrics = Metrics()
+    client.metrics.record_received('PRIVMSG', 30)
+    client.metrics.record_handler('Bot.irc_channel_message', 0.002)
+    channel = client.add_channel('#irctk')
+    channel.members.append(Membership(Nick('kylef')))
+    client.process_line(':irc.example.com BATCH +tag chathistory #irctk')
+    client.lag.observe(0.25)
+
+    text = render_prometheus({'bot': client, 'disabled': Client()})
+
+    assert '# TYPE irctk_lines_received_total counter' in text
+    assert 'irctk_lines_received_total{client="bot",command="PRIVMSG"} 1' in text
+    assert 'irctk_bytes_received_total{client="bot",command="PRIVMSG"} 30' in text
+    assert (
+        'irctk_handler_seconds_bucket{client="bot",'
+        'handler="Bot.irc_channel_message",le="0.005"} 1'
+    ) in text
+    assert (
+        'irctk_handler_seconds_bucket{client="bot",'
+        'handler="Bot.irc_channel_message",le="+Inf"} 1'
+    ) in text
+    assert 'irctk_parse_seconds_count{client="bot"} 0' in text
+    assert 'irctk_channels{client="bot"} 1' in text
+    assert 'irctk_members{client="bot"} 1' in text
+    assert 'irctk_members{client="disabled"} 0' in text
+    assert 'irctk_open_batches{client="bot"} 1' in text
+    assert 'irctk_batch_buffer_bytes{client="bot"} 41' in text
+    assert 'client="disabled",command' not in text
+    assert 'irctk_lag_seconds{client="bot"} 0.25' in text
+    assert 'irctk_lag_seconds{client="disabled"}' not in text
+
+
+def test_serve_metrics() -> None:
+    client = Client()
+    client.metrics = Metrics()
+
+    async def scrape(path: str) -> bytes:
+        server = await serve_metrics({'bot': client}, port=0)
+        port = server.sockets[0].getsockname()[1]
+
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write('GET {} HTTP/1.1\r\nHost: localhost\r\n\r\n'.format(path).encode())
+        response = await reader.read()
+        writer.close()
+
+        server.close()
+        await server.wait_closed()
+        return response
+
+    loop = asyncio.new_event_loop()
+    try:
+        response = loop.run_until_complete(scrape('/metrics'))
+        missing = loop.run_until_complete(scrape('/'))
+    finally:
+        loop.close()
+
+    assert response.startswith(b'HTTP/1.1 200 OK\r\n')
+    assert b'irctk_channels{client="bot"} 0\n' in response
+    assert missing.startswith(b'HTTP/1.1 404 Not Found\r\n')
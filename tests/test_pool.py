@@ -0,0 +1,66 @@
+import asyncio
+from typing import List
+
+from irctk.client import Server
+from irctk.pool import ClientPool
+from tests.mock_client import MockClient
+
+
+class SupervisedClient(MockClient):
+    def __init__(self, *args, **kwargs):
+        self.supervised: List = []
+        super(SupervisedClient, self).__init__(*args, **kwargs)
+
+    async def supervise(self, servers, initial_delay=1.0, maximum_delay=300.0):
+        self.supervised.append(servers)
+        self.is_supervised = True
+        self.is_connected = True
+
+        while self.is_supervised:
+            await asyncio.sleep(0)
+
+        self.is_connected = False
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_pool_starts_and_stops_clients() -> None:
+    pool = ClientPool(connections_per_second=1000)
+    clients = [SupervisedClient() for _ in range(3)]
+    for client in clients:
+        pool.add(client, [Server('irc.example.com')], network='example')
+
+    async def lifecycle() -> None:
+        await pool.start()
+        assert pool.stats['connected'] == 3
+        await pool.stop()
+
+    run(lifecycle())
+
+    for client in clients:
+        assert client.supervised == [[Server('irc.example.com')]]
+        assert client.sent_lines == ['QUIT Disconnected']
+
+    assert pool.tasks == {}
+
+
+def test_pool_stats() -> None:
+    pool = ClientPool()
+    client = SupervisedClient()
+    client.nick.nick = 'kylef'
+    pool.add(client, [Server('irc.example.com')], network='example')
+    client.process_line(':kylef!kyle@kyle JOIN #test')
+    client.process_line(':doe!doe@doe JOIN #test')
+
+    stats = pool.stats
+    assert len(pool) == 1
+    assert stats['clients'] == 1
+    assert stats['channels'] == 1
+    assert stats['members'] == 2
+    assert stats['networks']['example']['members'] == 2
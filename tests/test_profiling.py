@@ -0,0 +1,75 @@
+from irctk.profiling import Profiler
+from tests.mock_client import MockClient as Client
+
+
+def test_profiler_records_nested_steps() -> None:
+    profiler = Profiler()
+
+    def inner() -> str:
+        return 'inner'
+
+    def outer() -> str:
+        return profiler.call('inner', inner) + ' outer'
+
+    assert profiler.call('outer', outer) == 'inner outer'
+    profiler.call('inner', inner)
+
+    assert set(profiler.stacks) == {('outer',), ('outer', 'inner'), ('inner',)}
+    assert profiler.stacks[('outer', 'inner')]['calls'] == 1
+
+    outer_stats = profiler.stacks[('outer',)]
+    inner_stats = profiler.stacks[('outer', 'inner')]
+    assert outer_stats['wall'] >= inner_stats['wall']
+    assert outer_stats['self_wall'] <= outer_stats['wall'] - inner_stats['wall'] + 1e-9
+
+    assert profiler.handlers['inner']['calls'] == 2
+    assert profiler.handlers['outer']['calls'] == 1
+
+
+def test_profiler_sampling_skips_nested_steps() -> None:
+    profiler = Profiler(sample_rate=0)
+
+    def outer() -> None:
+        profiler.call('inner', lambda: None)
+
+    profiler.call('outer', outer)
+
+    assert profiler.stacks == {}
+    assert profiler.skipped_depth == 0
+
+
+def test_profiler_report_and_collapsed() -> None:
+    profiler = Profiler()
+    profiler.record(('process_privmsg',), 0.003, 0.002, 0.001, 0.001, 10)
+    profiler.record(('process_privmsg', 'Bot.irc_message'), 0.001, 0.001, 0, 0, 4)
+    profiler.record(('parse',), 0.0005, 0.0005, 0, 0, 2)
+
+    report = profiler.report(limit=2).splitlines()
+    assert report[0].split()[:2] == ['handler', 'calls']
+    assert report[1].split()[:3] == ['process_privmsg', '1', '3.000']
+    assert report[2].split()[0] == 'Bot.irc_message'
+    assert len(report) == 3
+
+    assert profiler.collapsed() == '\n'.join(
+        [
+            'parse 500',
+            'process_privmsg 2000',
+            'process_privmsg;Bot.irc_message 1000',
+        ]
+    )
+    assert profiler.collapsed('allocations').splitlines()[1] == 'process_privmsg 10'
+
+
+def test_client_profiles_process_and_module_handlers() -> None:
+    class Bot:
+        def irc_private_message(self, client, nick, message) -> None:
+            pass
+
+    client = Client()
+    client.nick.nick = 'irctk'
+    client.modules.append(Bot())
+    client.profiler = Profiler()
+
+    client.process_line(':doe!d@d PRIVMSG irctk :Hello')
+
+    assert ('process_privmsg', 'Bot.irc_private_message') in client.profiler.stacks
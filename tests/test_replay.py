@@ -0,0 +1,82 @@
+import asyncio
+
+from irctk.client import Client
+from irctk.journal import JournalWriter
+from irctk.replay import Replay, load_records
+from irctk.trace import RECEIVED, SENT, TraceRecord, WireTrace
+
+CAPTURE = [
+    TraceRecord(100.0, SENT, 'NICK kylef'),
+    TraceRecord(100.1, RECEIVED, ':irc.example.com 001 kylef :Welcome'),
+    TraceRecord(100.2, RECEIVED, ':kylef!kyle@example.com JOIN #irctk'),
+    TraceRecord(100.3, RECEIVED, ':irc.example.com 353 kylef = #irctk :kylef doe'),
+    TraceRecord(100.4, RECEIVED, ':irc.example.com 366 kylef #irctk :End'),
+    TraceRecord(100.5, RECEIVED, 'PING :irc.example.com'),
+    TraceRecord(100.6, RECEIVED, '@batch=1 :irc BATCH +1 netsplit a.net b.net'),
+    TraceRecord(160.6, RECEIVED, ':doe!d@example.com PRIVMSG #irctk :Hi'),
+]
+
+
+def replay(records, speed=None):
+    client = Client()
+    loop = asyncio.new_event_loop()
+    try:
+        stats = loop.run_until_complete(Replay(client, speed).run(records))
+    finally:
+        loop.close()
+
+    return client, stats
+
+
+def test_replay_drives_client_state() -> None:
+    client, stats = replay(CAPTURE)
+
+    assert client.is_registered
+    channel = client.find_channel('#irctk')
+    assert channel
+    assert [member.nick.nick for member in channel.members] == ['kylef', 'doe']
+
+    assert stats.lines == 7
+    assert stats.duration == 60.5
+    # WHO after registering and PONG are suppressed
+    assert stats.suppressed_lines == 2
+
+
+def test_replay_uses_virtual_clock() -> None:
+    client, _ = replay(CAPTURE)
+
+    batch = client.batches['1']
+    assert batch.created_at == 100.6
+    assert client.clock() == 160.6
+
+
+def test_replay_paced() -> None:
+    records = [
+        TraceRecord(0.0, RECEIVED, 'PING :1'),
+        TraceRecord(0.05, RECEIVED, 'PING :2'),
+    ]
+
+    _, stats = replay(records, speed=1)
+
+    assert stats.elapsed >= 0.05
+
+
+def test_replay_journal(tmp_path) -> None:
+    journal = JournalWriter(str(tmp_path), fsync=False)
+    journal.append(RECEIVED, b':irc.example.com 001 kylef :Welcome', 1 * 10**9)
+    journal.close()
+
+    client, stats = replay(load_records(str(tmp_path)))
+
+    assert client.is_registered
+    assert stats.lines == 1
+
+
+def test_replay_capture(tmp_path) -> None:
+    path = str(tmp_path / 'capture.jsonl')
+    trace = WireTrace(capture=path)
+    trace.record_received(':irc.example.com 001 kylef :Welcome')
+    trace.close()
+
+    client, _ = replay(load_records(path))
+    assert client.nick.nick == 'kylef'
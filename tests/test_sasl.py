@@ -0,0 +1,48 @@
+import pytest
+
+from irctk.sasl import External, Plain, SASLError, ScramSHA256
+
+
+def test_plain() -> None:
+    assert Plain('kyle', 'sekret').respond(b'') == b'\0kyle\0sekret'
+
+
+def test_external() -> None:
+    assert External().respond(b'') == b''
+
+
+def test_scram_sha256() -> None:
+    # Example from RFC 7677
+    scram = ScramSHA256('user', 'pencil')
+    scram.nonce = 'rOprNGfwEbeRWgbNEkqO'
+
+    assert scram.respond(b'') == b'n,,n=user,r=rOprNGfwEbeRWgbNEkqO'
+    assert scram.respond(
+        b'r=rOprNGfwEbeRWgbNEkqO%hvYDpWUa2RaTCAfuxFIlj)hNlF$k0,'
+        b's=W22ZaJ0SNY7soEsUEjb6gQ==,i=4096'
+    ) == (
+        b'c=biws,r=rOprNGfwEbeRWgbNEkqO%hvYDpWUa2RaTCAfuxFIlj)hNlF$k0,'
+        b'p=dHzbZapWIk4jUhN+Ute9ytag9zjfMHgsqmmiz7AndVQ='
+    )
+    assert scram.respond(b'v=6rriTRBi23WpRR/wtup+mMhUZUn/dB5nLTJRsjl95G4=') == b''
+
+
+def test_scram_sha256_rejects_invalid_server_signature() -> None:
+    scram = ScramSHA256('user', 'pencil')
+    scram.nonce = 'rOprNGfwEbeRWgbNEkqO'
+    scram.respond(b'')
+    scram.respond(
+        b'r=rOprNGfwEbeRWgbNEkqO%hvYDpWUa2RaTCAfuxFIlj)hNlF$k0,'
+        b's=W22ZaJ0SNY7soEsUEjb6gQ==,i=4096'
+    )
+
+    with pytest.raises(SASLError):
+        scram.respond(b'v=AAAA')
+
+
+def test_scram_sha256_rejects_invalid_server_nonce() -> None:
+    scram = ScramSHA256('user', 'pencil')
+    scram.respond(b'')
+
+    with pytest.raises(SASLError):
+        scram.respond(b'r=other,s=W22ZaJ0SNY7soEsUEjb6gQ==,i=4096')
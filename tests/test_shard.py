@@ -0,0 +1,141 @@
+import asyncio
+import multiprocessing
+from typing import List
+
+from irctk.client import Client, Server
+from irctk.shard import (
+    ClientSpec,
+    Event,
+    Shard,
+    ShardCommand,
+    ShardedRunner,
+    create_client,
+)
+from tests.mock_client import MockClient
+
+
+class RegisteringClient(MockClient):
+    async def supervise(self, servers, initial_delay=1.0, maximum_delay=300.0):
+        self.is_supervised = True
+        self.is_connected = True
+        self.process_line(':server 001 {} :Welcome'.format(self.nickname))
+
+        while self.is_supervised:
+            await asyncio.sleep(0.01)
+
+        self.is_connected = False
+
+
+def create_registering_client(spec: ClientSpec) -> Client:
+    return RegisteringClient(**(spec.options or {}))
+
+
+def specs(count: int) -> List[ClientSpec]:
+    return [
+        ClientSpec(
+            'client{}'.format(i),
+            [Server('irc.example.com')],
+            options={'nickname': 'bot{}'.format(i)},
+        )
+        for i in range(count)
+    ]
+
+
+def test_shard_publishes_events_and_handles_commands() -> None:
+    connection, shard_connection = multiprocessing.Pipe()
+    shard = Shard(0, specs(2), shard_connection, create_registering_client)
+
+    async def run() -> None:
+        task = asyncio.ensure_future(shard.run())
+        await asyncio.sleep(0.5)
+
+        connection.send(ShardCommand('client1', 'PRIVMSG #test :Hello'))
+        await asyncio.sleep(0.05)
+        connection.send(ShardCommand(None))
+        await task
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(run())
+    finally:
+        loop.close()
+
+    items = []
+    try:
+        while connection.poll():
+            items.append(connection.recv())
+    except EOFError:
+        pass
+
+    events = [item for item in items if isinstance(item, Event)]
+    assert [(event.client_id, event.type) for event in events] == [
+        ('client0', 'registered'),
+        ('client1', 'registered'),
+    ]
+    assert events[1].data == {'nick': 'bot1'}
+
+    client = shard.clients['client1']
+    assert isinstance(client, RegisteringClient)
+    assert 'PRIVMSG #test :Hello' in client.sent_lines
+    assert items[-1].connected == 0
+
+
+def test_shard_drops_events_when_coordinator_is_not_reading() -> None:
+    connection, shard_connection = multiprocessing.Pipe()
+    shard = Shard(0, specs(1), shard_connection, max_pending_events=2)
+
+    for index in range(3):
+        shard.publish(Event(0, 'client0', 'private_message', {'text': index}))
+
+    assert shard.events == 3
+    assert shard.dropped_events == 1
+    assert shard.report().dropped_events == 1
+
+    shard.start_writer()
+    shard.stop_writer()
+
+    received = []
+    while connection.poll():
+        received.append(connection.recv().data['text'])
+
+    assert received == [0, 1]
+
+
+def test_client_spec_options_are_not_shared() -> None:
+    spec = ClientSpec('client0', [Server('irc.example.com')])
+
+    assert spec.options is None
+    assert create_client(spec).nickname == 'irctk'
+
+
+def test_runner_spreads_clients_across_shards() -> None:
+    runner = ShardedRunner(
+        specs(4), shards=2, factory=create_registering_client, report_interval=0.05
+    )
+
+    async def run() -> List[Event]:
+        runner.start()
+        events = []
+
+        async for event in runner.events():
+            events.append(event)
+            if len(events) == 4:
+                await runner.stop()
+
+        return events
+
+    loop = asyncio.new_event_loop()
+    try:
+        events = loop.run_until_complete(run())
+    finally:
+        loop.close()
+
+    assert runner.routes == {'client0': 0, 'client1': 1, 'client2': 0, 'client3': 1}
+    assert sorted((event.shard, event.client_id) for event in events) == [
+        (0, 'client0'),
+        (0, 'client2'),
+        (1, 'client1'),
+        (1, 'client3'),
+    ]
+    assert set(runner.health) == {0, 1}
+    assert not any(shard['alive'] for shard in runner.health.values())
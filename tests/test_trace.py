@@ -0,0 +1,70 @@
+import logging
+
+import pytest
+
+from irctk.trace import RECEIVED, SENT, WireTrace, read_capture
+
+
+def test_wire_trace_keeps_recent_lines() -> None:
+    trace = WireTrace(size=2)
+    trace.record_received('PING :1')
+    trace.record_sent('PONG :1')
+    trace.record_received('PING :2')
+    trace.record_received('PING :3')
+
+    assert [record.line for record in trace.received] == ['PING :2', 'PING :3']
+    assert sorted(record.line for record in trace.records) == [
+        'PING :2',
+        'PING :3',
+        'PONG :1',
+    ]
+    assert ' C: PONG :1' in trace.format()
+
+
+@pytest.mark.parametrize('capture_format', ['jsonl', 'binary'])
+def test_wire_trace_capture(tmp_path, capture_format: str) -> None:
+    path = str(tmp_path / 'capture')
+
+    trace = WireTrace(capture=path, capture_format=capture_format)
+    trace.record_received('@time=x :irc PRIVMSG #irctk :Hello ☃')
+    trace.record_sent('PRIVMSG #irctk :Hi')
+    trace.close()
+
+    # Appending to an existing capture
+    trace = WireTrace(capture=path, capture_format=capture_format)
+    trace.record_received('PING :irc')
+    trace.close()
+
+    records = list(read_capture(path))
+    assert [(record.direction, record.line) for record in records] == [
+        (RECEIVED, '@time=x :irc PRIVMSG #irctk :Hello ☃'),
+        (SENT, 'PRIVMSG #irctk :Hi'),
+        (RECEIVED, 'PING :irc'),
+    ]
+    assert records[0].time <= records[2].time
+
+
+def test_wire_trace_unknown_capture_format() -> None:
+    with pytest.raises(ValueError):
+        WireTrace(capture_format='pcap')
+
+
+def test_wire_trace_dump_to_path(tmp_path) -> None:
+    path = tmp_path / 'dump.txt'
+    trace = WireTrace(dump_path=str(path))
+    trace.record_received('PING :irc')
+    trace.dump('Disconnected')
+
+    lines = path.read_text().splitlines()
+    assert lines[0] == '# Disconnected'
+    assert lines[1].endswith(' S: PING :irc')
+
+
+def test_wire_trace_dump_to_logger(caplog) -> None:
+    trace = WireTrace()
+    trace.record_sent('QUIT')
+
+    with caplog.at_level(logging.WARNING, logger='irctk.trace'):
+        trace.dump('Disconnected')
+
+    assert 'C: QUIT' in caplog.text